@@ -33,12 +33,9 @@ spec = importlib.util.spec_from_file_location(
 generate_repo_map = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(generate_repo_map)
 
-extract_symbols_from_cpp = generate_repo_map.extract_symbols_from_cpp
-extract_symbols_from_python = generate_repo_map.extract_symbols_from_python
-extract_symbols_from_rust = generate_repo_map.extract_symbols_from_rust
-find_cpp_files = generate_repo_map.find_cpp_files
-find_python_files = generate_repo_map.find_python_files
-find_rust_files = generate_repo_map.find_rust_files
+discover_source_files = generate_repo_map.discover_source_files
+open_source = generate_repo_map.open_source
+EXTRACTORS = generate_repo_map.EXTRACTORS
 
 
 def get_process_memory_mb() -> float:
@@ -47,7 +44,7 @@ def get_process_memory_mb() -> float:
     return process.memory_info().rss / 1024 / 1024
 
 
-def analyze_files(files: list[Path], extractor, language: str, root: Path):
+def analyze_files(files: list, extractor, language: str):
     """Analyze memory usage for a list of files."""
     print(f"\n{'='*60}")
     print(f"Analyzing {len(files)} {language} files")
@@ -58,13 +55,12 @@ def analyze_files(files: list[Path], extractor, language: str, root: Path):
         return
 
     # Sort by size to find largest files
-    files_with_size = [(f, f.stat().st_size) for f in files]
-    files_with_size.sort(key=lambda x: x[1], reverse=True)
+    files_by_size = sorted(files, key=lambda f: f.size, reverse=True)
 
     # Show top 10 largest files
     print(f"\nTop 10 largest {language} files:")
-    for f, size in files_with_size[:10]:
-        print(f"  {size/1024:.1f} KB - {f.relative_to(root)}")
+    for f in files_by_size[:10]:
+        print(f"  {f.size/1024:.1f} KB - {f.rel_path}")
 
     # Parse files and track memory
     print(f"\nParsing files and tracking memory...")
@@ -78,24 +74,25 @@ def analyze_files(files: list[Path], extractor, language: str, root: Path):
     max_mem_file = None
 
     # Parse top 50 largest files
-    test_files = [f for f, _ in files_with_size[:50]]
+    test_files = files_by_size[:50]
 
-    for i, file_path in enumerate(test_files):
+    for i, source_file in enumerate(test_files):
         gc.collect()
         before_mem = get_process_memory_mb()
 
         try:
-            symbols = extractor(file_path, root)
+            with open_source(source_file.path, source_file.size) as source:
+                symbols, _ = extractor(source, source_file.rel_path)
             total_symbols += len(symbols)
         except Exception as e:
-            print(f"  Error parsing {file_path}: {e}")
+            print(f"  Error parsing {source_file.rel_path}: {e}")
             continue
 
         after_mem = get_process_memory_mb()
 
         if after_mem > max_mem:
             max_mem = after_mem
-            max_mem_file = file_path
+            max_mem_file = source_file.rel_path
 
         # Report every 10 files or if memory spike
         if (i + 1) % 10 == 0 or (after_mem - before_mem) > 10:
@@ -114,7 +111,7 @@ def analyze_files(files: list[Path], extractor, language: str, root: Path):
     print(f"  Final memory: {final_mem:.1f} MB")
     print(f"  Memory growth: {final_mem - initial_mem:.1f} MB")
     if max_mem_file:
-        print(f"  Peak at: {max_mem_file.relative_to(root)}")
+        print(f"  Peak at: {max_mem_file}")
 
 
 def main():
@@ -125,9 +122,10 @@ def main():
 
     # Find all files
     print("\nFinding source files...")
-    python_files = find_python_files(root)
-    cpp_files = find_cpp_files(root)
-    rust_files = find_rust_files(root)
+    source_files = discover_source_files(root)
+    python_files = [f for f in source_files if f.language == "python"]
+    cpp_files = [f for f in source_files if f.language == "cpp"]
+    rust_files = [f for f in source_files if f.language == "rust"]
 
     print(f"  Python: {len(python_files)} files")
     print(f"  C++: {len(cpp_files)} files")
@@ -135,13 +133,13 @@ def main():
 
     # Analyze each language
     if cpp_files:
-        analyze_files(cpp_files, extract_symbols_from_cpp, "C++", root)
+        analyze_files(cpp_files, EXTRACTORS["cpp"], "C++")
 
     if rust_files:
-        analyze_files(rust_files, extract_symbols_from_rust, "Rust", root)
+        analyze_files(rust_files, EXTRACTORS["rust"], "Rust")
 
     if python_files:
-        analyze_files(python_files, extract_symbols_from_python, "Python", root)
+        analyze_files(python_files, EXTRACTORS["python"], "Python")
 
     # Final summary
     gc.collect()
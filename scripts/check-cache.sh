@@ -7,15 +7,44 @@ set -euo pipefail
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="${PWD}"
 CLAUDE_DIR="${PROJECT_ROOT}/.claude"
-CACHE_FILE="${CLAUDE_DIR}/repo-map-cache.json"
+CACHE_FILE="${CLAUDE_DIR}/repo-map-cache.db"
 REPO_MAP="${CLAUDE_DIR}/repo-map.md"
 LAST_CHECK="${CLAUDE_DIR}/.last-cache-check"
 
 # Throttle: only check every 30 seconds to avoid slowdown on large codebases
 CHECK_INTERVAL=30
 
-# Skip if already indexing (check running processes)
-if pgrep -f "generate-repo-map.py.*${PROJECT_ROOT}" >/dev/null 2>&1; then
+# The MCP server's warm indexer worker (generate-repo-map.py --worker) has no
+# project on its command line; it runs in the project directory instead
+worker_pids() {
+    local pid cwd
+    for pid in $(pgrep -f "generate-repo-map[.]py --worker" 2>/dev/null); do
+        cwd=$(readlink "/proc/${pid}/cwd" 2>/dev/null || lsof -a -d cwd -p "${pid}" -Fn 2>/dev/null | sed -n 's/^n//p' || true)
+        if [[ "${cwd}" == "$(pwd -P)" ]]; then
+            echo "${pid}"
+        fi
+    done
+}
+
+# The status the indexer last recorded in repo-map.db ("indexing" while a job runs)
+index_status() {
+    python3 -c "
+import sqlite3, sys
+conn = sqlite3.connect(f'file:{sys.argv[1]}?mode=ro', uri=True)
+print(conn.execute(\"SELECT value FROM metadata WHERE key = 'status'\").fetchone()[0])
+" "${CLAUDE_DIR}/repo-map.db" 2>/dev/null || true
+}
+
+# Whether this project is being indexed (check running processes): by a run
+# given its path, or by the worker - which idles between jobs, so only while
+# the index says it is indexing
+is_running() {
+    pgrep -f "generate-repo-map.py.*${PROJECT_ROOT}" >/dev/null 2>&1 && return 0
+    [[ -n "$(worker_pids)" && "$(index_status)" == "indexing" ]]
+}
+
+# Skip if already indexing
+if is_running; then
     exit 0
 fi
 
@@ -37,11 +66,11 @@ NEEDS_REINDEX=false
 REASON=""
 
 # Expected cache version - must match CACHE_VERSION in generate-repo-map.py
-EXPECTED_CACHE_VERSION=3
+EXPECTED_CACHE_VERSION=10
 
 # Check 1: Cache version mismatch
 if [[ -f "${CACHE_FILE}" ]]; then
-    CACHE_VERSION=$(python3 -c "import json; print(json.load(open('${CACHE_FILE}')).get('version', 0))" 2>/dev/null || echo "0")
+    CACHE_VERSION=$(python3 -c "import sqlite3; print(sqlite3.connect('file:${CACHE_FILE}?mode=ro', uri=True).execute(\"SELECT value FROM meta WHERE key = 'version'\").fetchone()[0])" 2>/dev/null || echo "0")
     if [[ "${CACHE_VERSION}" != "${EXPECTED_CACHE_VERSION}" ]]; then
         NEEDS_REINDEX=true
         REASON="cache version mismatch (${CACHE_VERSION} != ${EXPECTED_CACHE_VERSION})"
@@ -51,7 +80,7 @@ fi
 # Check 2: File count changed (quick check)
 if [[ "${NEEDS_REINDEX}" == "false" && -f "${CACHE_FILE}" ]]; then
     # Count cached files
-    CACHED_COUNT=$(python3 -c "import json; print(len(json.load(open('${CACHE_FILE}')).get('files', {})))" 2>/dev/null || echo "0")
+    CACHED_COUNT=$(python3 -c "import sqlite3; print(sqlite3.connect('file:${CACHE_FILE}?mode=ro', uri=True).execute('SELECT COUNT(*) FROM files').fetchone()[0])" 2>/dev/null || echo "0")
 
     # Count current source files (excluding common non-source dirs)
     # This is fast because find exits early and we just count
@@ -91,7 +120,7 @@ touch "${LAST_CHECK}"
 # Trigger reindex if needed
 if [[ "${NEEDS_REINDEX}" == "true" ]]; then
     # Delete stale cache/map
-    rm -f "${CACHE_FILE}" "${REPO_MAP}"
+    rm -f "${CACHE_FILE}" "${CACHE_FILE}-wal" "${CACHE_FILE}-shm" "${REPO_MAP}"
 
     # Start background reindex
     (
@@ -13,40 +13,138 @@ Helps Claude Code understand what already exists before implementing new feature
 Supports Python, C++, and Rust.
 
 Usage:
-    uv run generate-repo-map.py [directory]
+    uv run generate-repo-map.py [directory] [--workers=PERCENT] [--engine=threads|processes]
+                                [--doc-similarity=ratio|tfidf] [--similar-candidates=exact|ngram]
+    uv run generate-repo-map.py [directory] --files=PATH[,PATH...]   # Just these (see reindex_files())
+    uv run generate-repo-map.py --worker    # Warm indexer, jobs on stdin (see serve_worker())
+
+--doc-similarity=tfidf needs NumPy: uv run --with numpy generate-repo-map.py ...
 """
 
 import ast
+import bisect
+import ctypes
+import errno
 import hashlib
+import io
 import json
+import math
+import mmap
 import os
+import queue
+import re
+import resource
+import select
 import sqlite3
+import stat
+import struct
 import sys
+import threading
 import time
+import tokenize
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field, replace
 from difflib import SequenceMatcher
-from collections import defaultdict
-from multiprocessing import cpu_count
+from operator import attrgetter
+from typing import TextIO
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Callable, Collection, Iterable, Iterator
+from multiprocessing import Pool, cpu_count
 
 import tree_sitter_cpp as tscpp
 import tree_sitter_rust as tsrust
-from tree_sitter import Language, Parser, Node
+from tree_sitter import Language, Parser, Node, Tree
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only the tfidf docstring similarity engine needs it
+    np = None
 
 
 # Cache format version - bump when Symbol structure or file selection changes
-CACHE_VERSION = 5  # v5: Added FTS5 table for text search
+CACHE_VERSION = 10  # v10: Rendered repo-map.md section cached per file
 
 # Database schema version - bump when SQLite schema changes
-DB_VERSION = 1  # v1: Initial versioned schema
+DB_VERSION = 7  # v7: name_tokens, symbol_tokens, token_grams (fuzzy symbol search)
 
 # Default to 50% of available cores for parsing, max 8 workers
 # Using threads (not processes) to avoid memory duplication
 DEFAULT_WORKERS_PERCENT = 50
 MAX_WORKERS = 8
 
+# Parsing engines selectable with --engine=
+# - threads: shared memory, but ast parsing holds the GIL (~1 core)
+# - processes: one interpreter per worker, scales with cores for cold indexes
+PARSE_ENGINES = ("threads", "processes")
+DEFAULT_ENGINE = "threads"
+
+# Process engine: files are sent to workers in batches, and each worker is
+# recycled after N batches to bound tree-sitter grammar/arena memory
+PROCESS_BATCH_SIZE = 32
+PROCESS_MAX_TASKS_PER_CHILD = 64
+
+# Files at least this large are memory-mapped instead of read into a bytes
+# object. Either way each file is read once: the same buffer is hashed,
+# parsed and sliced for node text.
+MMAP_THRESHOLD = 1024 * 1024  # 1MB
+
+# Parse results are streamed to SQLite by a writer thread: the queue bounds
+# how many files' symbols are in flight, rows are inserted in batches
+WRITE_QUEUE_SIZE = 64
+WRITE_BATCH_SIZE = 5000
+
+# Text search: string literals shorter than this are noise ("r", "utf-8"),
+# and any element longer than MAX_TEXT_LENGTH is truncated
+MIN_STRING_LITERAL_LENGTH = 5
+MAX_TEXT_LENGTH = 1000
+
+# Similar-symbol detection only scores candidate pairs, selected with
+# --similar-candidates=
+# - exact: pairs whose character counts allow the threshold (the
+#   SequenceMatcher.quick_ratio() bound), so no similar pair is missed. Most
+#   docstrings of similar length pass it, so this is quadratic in docstrings
+# - ngram: names or docstrings whose character n-gram sets overlap (Jaccard)
+#   at least NAME/DOC_MIN_OVERLAP. Far faster on large trees, but similar
+#   pairs that share few n-grams (transposed letters, reworded docstrings)
+#   are missed
+SIMILAR_CANDIDATE_FILTERS = ("exact", "ngram")
+DEFAULT_SIMILAR_CANDIDATES = "exact"
+NAME_NGRAM_SIZE = 3
+NAME_MIN_OVERLAP = 0.15
+DOC_NGRAM_SIZE = 5
+DOC_MIN_OVERLAP = 0.2
+
+# Docstring similarity engines selectable with --doc-similarity=
+# - ratio: SequenceMatcher ratio of candidate pairs (see above)
+# - tfidf: cosine of character n-gram TF-IDF vectors, computed with NumPy
+DOC_SIMILARITY_ENGINES = ("ratio", "tfidf")
+DEFAULT_DOC_SIMILARITY = "ratio"
+
+# TF-IDF engine: the sparse product is reduced in row blocks of about
+# TFIDF_BLOCK_SIZE partial products (a few MB of temporaries each). The most
+# common n-grams are dropped like stop words, as many as needed to keep the
+# product within TFIDF_WORK_PER_TEXT partial products per docstring
+TFIDF_BLOCK_SIZE = 1 << 20
+TFIDF_WORK_PER_TEXT = 1000
+
+# repo-map.md is streamed to disk section by section through a write buffer
+# of this size; the map itself is never held in memory. The documentation
+# opportunities section lists this many undocumented symbols of each kind
+REPO_MAP_BUFFER_SIZE = 1024 * 1024
+UNDOCUMENTED_EXAMPLES = 10
+
+# The warm worker keeps recently parsed C++/Rust trees for incremental
+# reparsing, up to this much source in total
+TREE_CACHE_BYTES = 16 * 1024 * 1024
+
+# A directory modified this close to when it was listed may have changed again
+# within the same mtime tick (coarse on some filesystems), so its mtime isn't
+# trusted by the staleness check and it is listed again every time instead
+RACY_MTIME_NS = 2 * 10**9
+
 
 @dataclass
 class Symbol:
@@ -77,6 +175,17 @@ class Symbol:
         """Create from dictionary."""
         return cls(**d)
 
+    def to_tuple(self) -> tuple:
+        """Convert to a compact tuple (file_path omitted) for cheap pickling."""
+        return (self.name, self.kind, self.signature, self.docstring,
+                self.line_number, self.end_line_number, self.parent)
+
+    @classmethod
+    def from_tuple(cls, t: tuple, file_path: str) -> "Symbol":
+        """Create from a compact tuple produced by to_tuple()."""
+        name, kind, signature, docstring, line_number, end_line_number, parent = t
+        return cls(name, kind, signature, docstring, file_path, line_number, end_line_number, parent)
+
 
 @dataclass
 class TextElement:
@@ -86,165 +195,387 @@ class TextElement:
     element_type: str  # "comment", "docstring", "string_literal"
     content: str
     symbol_name: str | None = None  # Symbol name if this is a docstring
+    joins_run: bool = field(default=False, compare=False, repr=False)  # A // comment; see join_comment_runs()
+
+    def to_tuple(self) -> tuple:
+        """Convert to a compact tuple (file_path omitted) for cheap pickling."""
+        return (self.line_number, self.element_type, self.content, self.symbol_name)
+
+    @classmethod
+    def from_tuple(cls, t: tuple, file_path: str) -> "TextElement":
+        """Create from a compact tuple produced by to_tuple()."""
+        line_number, element_type, content, symbol_name = t
+        return cls(file_path, line_number, element_type, content, symbol_name)
+
+
+@dataclass
+class SourceFile:
+    """A discovered source file, with the stat data later stages need."""
+    path: Path
+    rel_path: str
+    language: str
+    size: int
+    mtime_ns: int
+    inode: int = 0
+    ctime_ns: int = 0
+
+    @property
+    def fingerprint(self) -> tuple[int, int, int, int]:
+        """Stat fingerprint; if it is unchanged the file is assumed unchanged."""
+        return (self.size, self.mtime_ns, self.inode, self.ctime_ns)
 
 
 @dataclass
 class FileCache:
     """Cache entry for a single file."""
-    mtime: float
+    fingerprint: tuple[int, int, int, int]  # See SourceFile.fingerprint
     content_hash: str
-    symbols: list[Symbol]
-
-    def to_dict(self) -> dict:
-        return {
-            "mtime": self.mtime,
-            "content_hash": self.content_hash,
-            "symbols": [s.to_dict() for s in self.symbols],
-        }
-
-    @classmethod
-    def from_dict(cls, d: dict) -> "FileCache":
-        return cls(
-            mtime=d["mtime"],
-            content_hash=d["content_hash"],
-            symbols=[Symbol.from_dict(s) for s in d["symbols"]],
-        )
+    symbols: list[Symbol] | None  # None until loaded from the cache database
+    texts: list[TextElement] | None = field(default_factory=list)  # Likewise
+    section: str | None = ""  # Rendered Code Structure section; likewise
+    coverage: dict | None = None  # analyze_documentation_coverage() of the file; likewise
 
 
 class SymbolCache:
-    """Persistent cache for extracted symbols."""
+    """
+    Persistent cache for extracted symbols and text elements, stored in its
+    own SQLite file.
+
+    Only fingerprints and content hashes are loaded up front; a file's symbols
+    and text elements stay on disk until they are asked for. New and changed entries are
+    written as per-file rows in batches, never as a rewrite of the whole cache.
+    Each row also holds the file's rendered repo-map.md section and its
+    documentation coverage, so the map is assembled from stored fragments and
+    only changed files are re-rendered.
+    """
 
-    # Save cache every N new files parsed
-    SAVE_INTERVAL = 50
+    # Flush pending writes every N changed entries
+    SAVE_INTERVAL = 256
 
     def __init__(self, cache_path: Path):
         self.cache_path = cache_path
         self.files: dict[str, FileCache] = {}
-        self._dirty_count = 0
+        self._upserts: set[str] = set()  # Parsed since the last flush
+        self._touched: set[str] = set()  # New fingerprint, same content
+        self._removed: set[str] = set()
+        self._conn = self._connect()
+        self._inode = self.cache_path.stat().st_ino
         self._load()
 
-    def _load(self) -> None:
-        """Load cache from disk."""
-        if not self.cache_path.exists():
-            return
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache database, starting over if it is corrupt or from another version."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.cache_path, timeout=30.0)
         try:
-            data = json.loads(self.cache_path.read_text())
-            if data.get("version") != CACHE_VERSION:
-                return  # Invalidate cache on version mismatch
-            for file_path, entry in data.get("files", {}).items():
-                self.files[file_path] = FileCache.from_dict(entry)
-        except (json.JSONDecodeError, KeyError, TypeError):
-            pass  # Ignore corrupt cache
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.DatabaseError:  # No meta table, or not a database at all
+            version = None
+        if version != (str(CACHE_VERSION),):
+            # Invalidate cache on version mismatch or corruption
+            conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.cache_path}{suffix}").unlink(missing_ok=True)
+            conn = sqlite3.connect(self.cache_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("""
+                CREATE TABLE files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    ctime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    symbols TEXT NOT NULL,
+                    texts TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    classes INTEGER NOT NULL,
+                    documented_classes INTEGER NOT NULL,
+                    functions INTEGER NOT NULL,
+                    documented_functions INTEGER NOT NULL,
+                    methods INTEGER NOT NULL,
+                    documented_methods INTEGER NOT NULL,
+                    undocumented TEXT NOT NULL
+                )
+            """)
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", [str(CACHE_VERSION)])
+            conn.commit()
+        # Losing the last batch on power failure only costs a re-parse
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _load(self) -> None:
+        """Load fingerprints and content hashes (not symbols) from disk."""
+        # Changes when another connection commits; see refresh()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        for path, size, mtime_ns, inode, ctime_ns, content_hash in self._conn.execute(
+            "SELECT path, size, mtime_ns, inode, ctime_ns, content_hash FROM files"
+        ):
+            self.files[path] = FileCache((size, mtime_ns, inode, ctime_ns), content_hash, None, None, None, None)
 
     def save(self) -> None:
-        """Save cache to disk atomically."""
-        data = {
-            "version": CACHE_VERSION,
-            "files": {fp: fc.to_dict() for fp, fc in self.files.items()},
-        }
-        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
-        # Write to temp file then rename for atomicity
-        tmp_path = self.cache_path.with_suffix(".tmp")
-        tmp_path.write_text(json.dumps(data))
-        tmp_path.rename(self.cache_path)
-        self._dirty_count = 0
+        """Write pending per-file changes in one transaction."""
+        if not (self._upserts or self._touched or self._removed):
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(path, *entry.fingerprint, entry.content_hash,
+                  json.dumps([s.to_tuple() for s in entry.symbols], separators=(",", ":")),
+                  json.dumps([t.to_tuple() for t in entry.texts], separators=(",", ":")),
+                  entry.section,
+                  *(count for stats in entry.coverage.values() for count in (stats["total"], stats["documented"])),
+                  json.dumps({kind: [s.to_tuple() for s in stats["undocumented"]]
+                              for kind, stats in entry.coverage.items() if stats["undocumented"]},
+                             separators=(",", ":")))
+                 for path in self._upserts for entry in [self.files[path]]]
+            )
+            self._conn.executemany(
+                "UPDATE files SET size = ?, mtime_ns = ?, inode = ?, ctime_ns = ? WHERE path = ?",
+                [(*self.files[path].fingerprint, path) for path in self._touched - self._upserts]
+            )
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in self._removed])
+        # Written entries are reloaded on demand rather than kept in memory
+        for path in self._upserts:
+            self.files[path].symbols = None
+            self.files[path].texts = None
+            self.files[path].section = None
+            self.files[path].coverage = None
+        self._upserts.clear()
+        self._touched.clear()
+        self._removed.clear()
+
+    def refresh(self) -> None:
+        """
+        Reload fingerprints if another process changed or replaced the cache
+        file since they were loaded, as can happen while a warm cache sits
+        between index runs. Pending changes are saved first.
+        """
+        self.save()
+        try:
+            inode = self.cache_path.stat().st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self._conn.close()
+            self._conn = self._connect()
+            self._inode = self.cache_path.stat().st_ino
+        elif self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return
+        self.files.clear()
+        self._load()
 
     def save_if_needed(self) -> None:
         """Save cache if enough new entries have been added."""
-        if self._dirty_count >= self.SAVE_INTERVAL:
+        if len(self._upserts) + len(self._touched) + len(self._removed) >= self.SAVE_INTERVAL:
             self.save()
 
-    def get_symbols(self, file_path: Path, rel_path: str) -> tuple[list[Symbol], bool]:
+    def close(self) -> None:
+        """Save pending changes and close the cache database."""
+        self.save()
+        self._conn.close()
+
+    def load_symbols(self, rel_path: str) -> list[Symbol]:
+        """Symbols of a cached file, read from disk unless still pending."""
+        entry = self.files[rel_path]
+        if entry.symbols is not None:
+            return entry.symbols
+        row = self._conn.execute("SELECT symbols FROM files WHERE path = ?", [rel_path]).fetchone()
+        return [Symbol.from_tuple(t, rel_path) for t in json.loads(row[0])] if row else []
+
+    def load(self, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+        """Symbols and text elements of a cached file."""
+        entry = self.files[rel_path]
+        if entry.symbols is not None:
+            return entry.symbols, entry.texts
+        row = self._conn.execute("SELECT symbols, texts FROM files WHERE path = ?", [rel_path]).fetchone()
+        if not row:
+            return [], []
+        return ([Symbol.from_tuple(t, rel_path) for t in json.loads(row[0])],
+                [TextElement.from_tuple(t, rel_path) for t in json.loads(row[1])])
+
+    def sections(self) -> Iterator[str]:
+        """Rendered Code Structure sections of all files, in path order. Saves pending changes first."""
+        self.save()
+        for (section,) in self._conn.execute("SELECT section FROM files WHERE section != '' ORDER BY path"):
+            yield section
+
+    def documentation_coverage(self) -> dict:
         """
-        Get symbols for a file, using cache if valid.
-        Returns (symbols, was_cached).
+        Docstring coverage of all files, summed from the stored per-file counts
+        (same shape as analyze_documentation_coverage()). Saves pending changes first.
         """
-        cached = self.files.get(rel_path)
-
-        # Check if file still exists
-        if not file_path.exists():
-            if cached:
-                del self.files[rel_path]
-            return [], False
-
-        current_mtime = file_path.stat().st_mtime
-
-        # Fast path: mtime unchanged
-        if cached and cached.mtime == current_mtime:
-            return cached.symbols, True
-
-        # mtime changed - check content hash
-        try:
-            content = file_path.read_bytes()
-            current_hash = hashlib.sha256(content).hexdigest()
-        except IOError:
-            return [], False
-
-        # Content unchanged - just update mtime in cache
-        if cached and cached.content_hash == current_hash:
-            cached.mtime = current_mtime
-            return cached.symbols, True
+        self.save()
+        kinds = ("classes", "functions", "methods")
+        counts = self._conn.execute(
+            "SELECT " + ", ".join(f"COALESCE(SUM({kind}), 0), COALESCE(SUM(documented_{kind}), 0)" for kind in kinds)
+            + " FROM files"
+        ).fetchone()
+        stats = {kind: {"total": counts[2 * i], "documented": counts[2 * i + 1], "undocumented": []}
+                 for i, kind in enumerate(kinds)}
+
+        # Examples in path order; usually the first few files with gaps are enough
+        wanted = {kind: min(UNDOCUMENTED_EXAMPLES, stats[kind]["total"] - stats[kind]["documented"]) for kind in kinds}
+        rows = self._conn.execute("SELECT path, undocumented FROM files WHERE undocumented != '{}' ORDER BY path")
+        for path, undocumented in rows:
+            if all(len(stats[kind]["undocumented"]) >= wanted[kind] for kind in kinds):
+                break
+            for kind, tuples in json.loads(undocumented).items():
+                examples = stats[kind]["undocumented"]
+                examples.extend(Symbol.from_tuple(t, path) for t in tuples[:wanted[kind] - len(examples)])
+        return stats
+
+    def is_fresh(self, source: SourceFile) -> bool:
+        """Whether a discovered file's fingerprint matches its cache entry."""
+        cached = self.files.get(source.rel_path)
+        return cached is not None and cached.fingerprint == source.fingerprint
+
+    def get_symbols(self, source: SourceFile) -> tuple[list[Symbol], bool]:
+        """
+        Get symbols for a discovered file if its fingerprint is unchanged.
+        Uses the stat data from discovery, so the file is not stat'ed again.
+        Returns (symbols, was_cached).
 
-        # Content changed - need to reparse
+        When the fingerprint changed the file is NOT read here: the parse
+        worker reads it once and compares against known_hash() before parsing.
+        """
+        if self.is_fresh(source):
+            return self.load_symbols(source.rel_path), True
         return [], False
 
-    def update(self, rel_path: str, mtime: float, content_hash: str, symbols: list[Symbol]) -> None:
-        """Update cache with newly parsed symbols."""
-        self.files[rel_path] = FileCache(mtime=mtime, content_hash=content_hash, symbols=symbols)
-        self._dirty_count += 1
+    def known_hash(self, rel_path: str) -> str | None:
+        """Content hash of the cached entry, if any."""
+        cached = self.files.get(rel_path)
+        return cached.content_hash if cached else None
+
+    def touch(self, rel_path: str, fingerprint: tuple) -> None:
+        """Record a new fingerprint for a file whose content is unchanged."""
+        self.files[rel_path].fingerprint = fingerprint
+        self._touched.add(rel_path)
+
+    def update(self, rel_path: str, fingerprint: tuple, content_hash: str, symbols: list[Symbol],
+               texts: list[TextElement] = ()) -> None:
+        """Update cache with newly parsed symbols and text elements, rendering the file's section."""
+        self.files[rel_path] = FileCache(fingerprint, content_hash, symbols, list(texts),
+                                         render_file_section(rel_path, symbols),
+                                         analyze_documentation_coverage(symbols))
+        self._upserts.add(rel_path)
+        self._removed.discard(rel_path)
+
+    def remove(self, rel_path: str) -> None:
+        """Drop a file's entry."""
+        if self.files.pop(rel_path, None) is not None:
+            self._upserts.discard(rel_path)
+            self._touched.discard(rel_path)
+            self._removed.add(rel_path)
 
     def remove_stale(self, valid_paths: set[str]) -> None:
         """Remove entries for files that no longer exist."""
         stale = [fp for fp in self.files if fp not in valid_paths]
         for fp in stale:
-            del self.files[fp]
+            self.remove(fp)
+
+
+@contextmanager
+def open_source(path: Path, size: int):
+    """
+    Read a file exactly once, yielding its bytes.
+    Files of MMAP_THRESHOLD bytes or more are memory-mapped rather than copied.
+    """
+    if size < MMAP_THRESHOLD:
+        yield path.read_bytes()
+        return
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Truncated to empty since discovery
+            yield b""
+            return
+        with buf:
+            yield buf
 
 
-def compute_file_hash(file_path: Path) -> str:
-    """Compute SHA256 hash of file contents."""
-    return hashlib.sha256(file_path.read_bytes()).hexdigest()
+def content_digest(data) -> str:
+    """
+    Hash file contents (bytes or mmap).
+    Only called when a file's stat fingerprint changed, to tell a touch from
+    an edit. sha256 is kept over blake2b: OpenSSL uses the CPU's SHA
+    extensions where present, which makes it the faster of the two there.
+    """
+    return hashlib.sha256(data).hexdigest()
 
 
-def get_worker_count(percent: int = DEFAULT_WORKERS_PERCENT) -> int:
-    """Calculate number of worker threads based on CPU count, capped at MAX_WORKERS."""
+def extract_file(
+    path: Path, rel_path: str, language: str, size: int, known_hash: str | None = None,
+) -> tuple[str, list[Symbol] | None, list[TextElement] | None]:
+    """
+    Read a file once, hash it, and extract its symbols and text elements from
+    the same buffer. Returns (content_hash, symbols, texts). If the hash equals
+    known_hash the content is unchanged and parsing is skipped (symbols and
+    texts are None).
+    Raises OSError if the file can't be read.
+    """
+    with open_source(path, size) as source:
+        content_hash = content_digest(source)
+        if content_hash == known_hash:
+            return content_hash, None, None
+        extractor = EXTRACTORS.get(language)
+        symbols, texts = extractor(source, rel_path) if extractor else ([], [])
+    return content_hash, symbols, texts
+
+
+def get_worker_count(percent: int = DEFAULT_WORKERS_PERCENT, cap: int | None = MAX_WORKERS) -> int:
+    """Calculate number of workers based on CPU count, optionally capped (default MAX_WORKERS)."""
     cores = cpu_count()
     workers = max(1, int(cores * percent / 100))
-    return min(workers, MAX_WORKERS)
+    return min(workers, cap) if cap else workers
 
 
-def parse_file_worker(args: tuple) -> tuple[str, float, str, list[dict], str]:
+def parse_file_worker(args: tuple) -> tuple[str, tuple | None, str, list[Symbol] | None, list[TextElement] | None]:
     """
     Worker function for parallel parsing.
-    Takes (file_path_str, root_str, language) tuple.
-    Returns (rel_path, mtime, content_hash, symbols_as_dicts, language).
-
-    Note: Returns dicts instead of Symbol objects for pickling.
+    Takes (file_path_str, rel_path, language, fingerprint, known_hash); the
+    fingerprint comes from discovery so the file is not stat'ed again.
+    Returns (rel_path, fingerprint, content_hash, symbols, texts). symbols and
+    texts are None when the content hash equals known_hash (touched but
+    unchanged); fingerprint is None when the file couldn't be read.
     """
-    file_path_str, root_str, language = args
-    file_path = Path(file_path_str)
-    root = Path(root_str)
-    rel_path = str(file_path.relative_to(root))
-
+    file_path_str, rel_path, language, fingerprint, known_hash = args
+    size = fingerprint[0]
     try:
-        mtime = file_path.stat().st_mtime
-        content = file_path.read_bytes()
-        content_hash = hashlib.sha256(content).hexdigest()
+        content_hash, symbols, texts = extract_file(Path(file_path_str), rel_path, language, size, known_hash)
     except IOError:
-        return (rel_path, 0, "", [], language)
-
-    # Parse based on language
-    if language == "python":
-        symbols = extract_symbols_from_python(file_path, root)
-    elif language == "cpp":
-        symbols = extract_symbols_from_cpp(file_path, root)
-    elif language == "rust":
-        symbols = extract_symbols_from_rust(file_path, root)
-    else:
-        symbols = []
+        return (rel_path, None, "", [], [])
+    return (rel_path, fingerprint, content_hash, symbols, texts)
 
-    # Convert to dicts for pickling
-    symbol_dicts = [s.to_dict() for s in symbols]
-    return (rel_path, mtime, content_hash, symbol_dicts, language)
+
+def parse_batch_worker(batch: list[tuple]) -> list[tuple]:
+    """
+    Worker function for the process engine.
+    Takes a list of parse_file_worker() argument tuples.
+    Returns a list of (rel_path, fingerprint, content_hash, symbol_tuples, text_tuples).
+
+    Each worker process keeps its own lazily-created tree-sitter parsers
+    (module globals), so they are reused across every file in every batch.
+    Symbols and text elements are returned as compact tuples (see
+    Symbol.to_tuple) because pickling dicts dominates transfer cost for
+    large batches.
+    """
+    results = []
+    for args in batch:
+        # One bad file must not take down the rest of the batch
+        try:
+            rel_path, fingerprint, content_hash, symbols, texts = parse_file_worker(args)
+        except Exception as e:
+            print(f"  Error parsing {args[1]}: {e}")
+            results.append((args[1], None, "", [], []))
+            continue
+        if symbols is None:
+            results.append((rel_path, fingerprint, content_hash, None, None))
+        else:
+            results.append((rel_path, fingerprint, content_hash,
+                            [s.to_tuple() for s in symbols], [t.to_tuple() for t in texts]))
+    return results
 
 
 def get_function_signature(node: ast.FunctionDef | ast.AsyncFunctionDef) -> str:
@@ -282,17 +613,139 @@ def get_first_line_of_docstring(docstring: str | None) -> str | None:
     return first_line[:97] + "..." if len(first_line) > 100 else first_line
 
 
-def extract_symbols_from_python(file_path: Path, relative_to: Path) -> list[Symbol]:
-    """Extract all functions and classes from a Python file."""
+def text_element(rel_path: str, line_number: int, element_type: str, content: str,
+                 symbol_name: str | None = None) -> TextElement | None:
+    """Build a searchable text element, or None if there is nothing worth indexing."""
+    content = content.strip()
+    if not content or (element_type == "string_literal" and len(content) < MIN_STRING_LITERAL_LENGTH):
+        return None
+    return TextElement(rel_path, line_number, element_type, content[:MAX_TEXT_LENGTH], symbol_name)
+
+
+def python_comments(source: bytes, literal_spans: list[tuple[int, int, int, int]]) -> Iterator[tuple[int, str, bool]]:
+    """
+    (line, comment, own_line) for each comment of Python source that ast has
+    parsed, given every string literal's (lineno, col_offset, end_lineno,
+    end_col_offset). Any "#" outside the literals starts a comment, so the
+    file isn't tokenized a second time; only a literal spanning lines with a
+    "#" in it is, since implicitly concatenated pieces can have comments
+    between them.
+    """
+    line_starts = [0] + [m.end() for m in re.finditer(rb"\r\n?|\n", source)]
+    head = source[:line_starts[2]] if len(line_starts) > 2 else source[:]
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(head).readline)
+    if encoding != "utf-8":  # AST columns are offsets into the UTF-8 text, after any BOM
+        source = source[:].decode(encoding).encode()
+        line_starts = [0] + [m.end() for m in re.finditer(rb"\r\n?|\n", source)]
+
+    # (start, end, spans_lines) in source order; f-strings contain their parts, so nested spans merge
+    literals: list[tuple[int, int, bool]] = []
+    for lineno, col_offset, end_lineno, end_col_offset in sorted(literal_spans):
+        start, end = line_starts[lineno - 1] + col_offset, line_starts[end_lineno - 1] + end_col_offset
+        if literals and start < literals[-1][1]:
+            previous_start, previous_end, spans_lines = literals[-1]
+            literals[-1] = (previous_start, max(end, previous_end), spans_lines or end_lineno > lineno)
+        else:
+            literals.append((start, end, end_lineno > lineno))
+    starts = [start for start, _, _ in literals]
+
+    position = source.find(b"#")
+    while position != -1:
+        k = bisect.bisect_right(starts, position) - 1
+        if k >= 0 and position < literals[k][1]:
+            start, end, spans_lines = literals[k]
+            if spans_lines:
+                first_line = bisect.bisect_right(line_starts, start)
+                segment = "(" + source[start:end].decode("utf-8", "replace") + ")"
+                try:
+                    for tok in tokenize.generate_tokens(io.StringIO(segment).readline):
+                        if tok.type == tokenize.COMMENT:
+                            own_line = tok.start[0] > 1 and tok.line[:tok.start[1]].strip() == ""
+                            yield first_line + tok.start[0] - 1, tok.string, own_line
+                except (tokenize.TokenError, SyntaxError):
+                    pass
+            position = source.find(b"#", end)
+            continue
+        line = bisect.bisect_right(line_starts, position)
+        end = line_starts[line] if line < len(line_starts) else len(source)
+        comment = source[position:end].rstrip(b"\r\n").decode("utf-8", "replace")
+        yield line, comment, source[line_starts[line - 1]:position].strip() == b""
+        position = source.find(b"#", end)
+
+
+def extract_python_texts(tree: ast.Module, source: bytes, rel_path: str) -> list[TextElement]:
+    """Docstrings, string literals and (with python_comments()) comments, all from one AST walk."""
+    texts = []
+    docstring_nodes = set()
+    fstring_parts = set()
+
+    # Docstrings, with qualified names of their class/function
+    stack: list[tuple[ast.AST, str | None]] = [(tree, None)]
+    while stack:
+        node, qualname = stack.pop()
+        body = getattr(node, "body", None)
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and body:
+            first = body[0]
+            if (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+                    and isinstance(first.value.value, str)):
+                docstring_nodes.add(id(first.value))
+                element = text_element(rel_path, first.lineno, "docstring", ast.get_docstring(node) or "", qualname)
+                if element:
+                    texts.append(element)
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                stack.append((child, f"{qualname}.{child.name}" if qualname else child.name))
+            else:
+                stack.append((child, qualname))
+
+    # String literals; f-strings are indexed whole with {} for each field. Every literal's span is
+    # kept (docstrings and bytes too) to tell comments from a "#" inside a string
+    literal_spans = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr) or (isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes))):
+            literal_spans.append((node.lineno, node.col_offset, node.end_lineno, node.end_col_offset))
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                fstring_parts.add(id(value))
+                parts.append(value.value if isinstance(value, ast.Constant) else "{}")
+            element = text_element(rel_path, node.lineno, "string_literal", "".join(parts))
+        elif (isinstance(node, ast.Constant) and isinstance(node.value, str)
+              and id(node) not in docstring_nodes and id(node) not in fstring_parts):
+            element = text_element(rel_path, node.lineno, "string_literal", node.value)
+        else:
+            continue
+        if element:
+            texts.append(element)
+
+    # Comments - consecutive full-line comments are merged into one element
+    if b"#" in source:
+        previous_line = -1
+        for line, text, own_line in python_comments(source, literal_spans):
+            if line == 1 and text.startswith("#!"):
+                continue  # Shebang
+            comment = text[1:].strip()
+            if own_line and line == previous_line + 1 and texts and texts[-1].element_type == "comment":
+                merged = f"{texts[-1].content}\n{comment}"
+                texts[-1].content = merged[:MAX_TEXT_LENGTH]
+            else:
+                element = text_element(rel_path, line, "comment", comment)
+                if element:
+                    texts.append(element)
+            previous_line = line if own_line else -1
+
+    return texts
+
+
+def extract_symbols_from_python(source: bytes, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+    """Extract functions and classes, plus searchable text, from Python source bytes."""
     symbols = []
 
     try:
-        source = file_path.read_text(encoding='utf-8')
-        tree = ast.parse(source, filename=str(file_path))
-    except (SyntaxError, UnicodeDecodeError):
-        return []
-
-    rel_path = str(file_path.relative_to(relative_to))
+        # ast decodes the bytes itself (honouring PEP 263 coding cookies)
+        tree = ast.parse(source, filename=rel_path)
+    except (SyntaxError, ValueError, UnicodeDecodeError):
+        return [], []
 
     for node in ast.walk(tree):
         if isinstance(node, ast.ClassDef):
@@ -330,7 +783,9 @@ def extract_symbols_from_python(file_path: Path, relative_to: Path) -> list[Symb
                 end_line_number=node.end_lineno,
             ))
 
-    return symbols
+    texts = extract_python_texts(tree, source, rel_path)
+    texts.sort(key=lambda t: t.line_number)
+    return symbols, texts
 
 
 # Tree-sitter parsers (initialized lazily)
@@ -389,26 +844,290 @@ def node_text(node: Node | None, source: bytes) -> str:
     return source[node.start_byte:node.end_byte].decode("utf-8")
 
 
-def extract_symbols_from_cpp(file_path: Path, relative_to: Path) -> list[Symbol]:
-    """Extract classes, structs, and functions from a C++ file."""
-    symbols = []
+# Tree-sitter node types indexed for text search (C++ and Rust grammars)
+TS_TEXT_TYPES = frozenset(("comment", "line_comment", "block_comment", "string_literal", "raw_string_literal"))
+DOC_COMMENT_PREFIXES = ("///", "//!", "/**", "/*!")
+
+
+def clean_comment(text: str) -> str:
+    """Strip comment markers (//, ///, //!, /* */, leading *) from a C++/Rust comment."""
+    if text.startswith("/*"):
+        text = text[2:-2] if text.endswith("*/") else text[2:]
+        lines = (line.strip().lstrip("*!").strip() for line in text.splitlines())
+    else:
+        lines = (line.strip().lstrip("/!").strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def add_ts_text(texts: list[TextElement], node: Node, source: bytes, rel_path: str) -> None:
+    """Append a tree-sitter comment or string literal node as a text element."""
+    text = source[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
+    line_number = node.start_point[0] + 1
+
+    if "comment" in node.type:
+        element_type = "docstring" if text.startswith(DOC_COMMENT_PREFIXES) else "comment"
+        element = text_element(rel_path, line_number, element_type, clean_comment(text))
+        if element:
+            element.joins_run = text.startswith("//")
+    else:
+        # String literal: keep what's between the quotes (and a C++ raw string's delimiters)
+        start, end = text.find('"'), text.rfind('"')
+        content = text[start + 1:end] if 0 <= start < end else text
+        if start > 0 and text[start - 1] == "R":
+            open_paren, close_paren = content.find("("), content.rfind(")")
+            if 0 <= open_paren < close_paren:
+                content = content[open_paren + 1:close_paren]
+        element = text_element(rel_path, line_number, "string_literal", content)
+
+    if element:
+        texts.append(element)
+
+
+def join_comment_runs(texts: list[TextElement]) -> list[TextElement]:
+    """Join each run of // comments on consecutive lines into one element, once a whole file is walked."""
+    joined = []
+    for element in texts:
+        previous = joined[-1] if joined else None
+        if (element.joins_run and previous and previous.element_type == element.element_type
+                and previous.line_number + previous.content.count("\n") + 1 == element.line_number):
+            joined[-1] = replace(previous, content=f"{previous.content}\n{element.content}"[:MAX_TEXT_LENGTH])
+        else:
+            joined.append(element)
+    return joined
+
+
+# Nodes that hold no symbols of their own: incremental extraction looks through
+# them to the declarations inside ("units"), so one edit inside a namespace or
+# module doesn't mean walking all of it again
+TS_CONTAINER_TYPES = frozenset((
+    "translation_unit", "namespace_definition", "linkage_specification",  # C++
+    "preproc_if", "preproc_ifdef", "preproc_elif", "preproc_else",  # C++ include guards and #if blocks
+    "source_file", "mod_item",  # Rust
+    "declaration_list",  # Body of a namespace, extern "C" block or module (impl blocks are units)
+))
+TS_COMMENT_TYPES = frozenset(("comment", "line_comment", "block_comment"))
+
+
+@dataclass
+class ParsedFile:
+    """A parsed C++/Rust file kept for incremental reparsing, with each unit's results by start byte."""
+    source: bytes
+    tree: Tree
+    units: dict[int, tuple[str, tuple[int, ...], list[Symbol], list[TextElement]]]  # start -> (type, bounds, symbols, texts)
+
+
+class TreeCache:
+    """
+    Recently parsed C++/Rust files, bounded by total source bytes (trees take
+    several times that). Entries are taken out while a file is reparsed, so
+    parse threads never share a tree.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._files: OrderedDict[str, ParsedFile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> ParsedFile | None:
+        """Remove and return a file's entry, if cached."""
+        with self._lock:
+            parsed = self._files.pop(key, None)
+            if parsed is not None:
+                self.total_bytes -= len(parsed.source)
+            return parsed
+
+    def put(self, key: str, parsed: ParsedFile) -> None:
+        """Cache a file's entry as the most recently used, evicting the least recently used over max_bytes."""
+        with self._lock:
+            old = self._files.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old.source)
+            self._files[key] = parsed
+            self.total_bytes += len(parsed.source)
+            while self.total_bytes > self.max_bytes and len(self._files) > 1:
+                _, evicted = self._files.popitem(last=False)
+                self.total_bytes -= len(evicted.source)
+
+
+# Set by enable_tree_cache() in long-lived processes; None parses from scratch
+_tree_cache: TreeCache | None = None
+
+
+def enable_tree_cache(max_bytes: int = TREE_CACHE_BYTES) -> None:
+    """Keep parse trees of recently parsed C++/Rust files so edits to them are reparsed incrementally."""
+    global _tree_cache
+    _tree_cache = TreeCache(max_bytes)
+
+
+def byte_edit(old: bytes, new: bytes) -> tuple[int, int, int] | None:
+    """The single edit turning old into new, as (start, old_end, new_end) byte offsets; None if equal."""
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+    # Common prefix, then the common suffix of what's left, in shrinking steps
+    start = 0
+    step = 4096
+    while step:
+        while start + step <= limit and old[start:start + step] == new[start:start + step]:
+            start += step
+        step //= 8
+    old_end, new_end = len(old), len(new)
+    step = 4096
+    while step:
+        while old_end - step >= start and new_end - step >= start and old[old_end - step:old_end] == new[new_end - step:new_end]:
+            old_end -= step
+            new_end -= step
+        step //= 8
+    return start, old_end, new_end
+
+
+def byte_point(source: bytes, offset: int) -> tuple[int, int]:
+    """(row, column) of a byte offset, as tree-sitter counts them."""
+    row = source.count(b"\n", 0, offset)
+    return row, offset - (source.rfind(b"\n", 0, offset) + 1)
+
+
+def tree_units(node: Node, context: tuple[int, int] = (-1, -1)) -> Iterator[tuple[Node, tuple[int, int]]]:
+    """
+    The top-level declarations under node, in source order, looking through
+    containers. Each comes with the byte range of its container's own doc
+    comments, which a C++ class or struct directly inside it takes as its own.
+    """
+    for child in node.children:
+        if child.type in TS_CONTAINER_TYPES:
+            yield from tree_units(child, (unit_lead_start(child), child.start_byte))
+        else:
+            yield child, context
+
 
+def unit_lead_start(node: Node) -> int:
+    """Where the source a unit's results depend on begins: its doc comments are looked up before it."""
+    prev = node.prev_named_sibling
+    while prev is not None and prev.type in TS_COMMENT_TYPES:
+        prev = prev.prev_named_sibling
+    if prev is not None:
+        return prev.end_byte
+    return node.parent.start_byte if node.parent is not None else node.start_byte
+
+
+def extract_with_tree_sitter(
+    source_bytes: bytes, rel_path: str, language: str, parser: Parser,
+    walk: Callable[[Node, bytes, str, list, list], None],
+) -> tuple[list[Symbol], list[TextElement]]:
+    """
+    Parse source and walk the tree for symbols and text elements.
+
+    With a tree cache enabled, the file's previous tree is edited with the
+    byte diff and reparsed, so tree-sitter reuses unchanged subtrees, and
+    only units touching the edit or the syntax changes it caused are walked
+    again; the others keep their previous results, moved by the lines the
+    edit added or removed.
+    """
+    if _tree_cache is None:
+        symbols, texts = [], []
+        walk(parser.parse(source_bytes).root_node, source_bytes, rel_path, symbols, texts)
+        return symbols, join_comment_runs(texts)
+
+    source_bytes = bytes(source_bytes)  # Kept, so not a view of an mmap about to close
+    key = f"{language}:{rel_path}"
+    previous = _tree_cache.take(key)
+    edit = byte_edit(previous.source, source_bytes) if previous is not None else None
+    start = old_end = new_end = line_shift = 0
+    dirty = []
+    if previous is None:
+        tree = parser.parse(source_bytes)
+    elif edit is None:
+        tree = previous.tree
+    else:
+        start, old_end, new_end = edit
+        dirty.append((start, new_end))
+        old_tree = previous.tree
+        # Error recovery can go differently than in a fresh parse, and results
+        # mustn't depend on a file's edit history: files with syntax errors
+        # (often just macros tree-sitter can't expand) are parsed from scratch
+        tree = None
+        if not old_tree.root_node.has_error:
+            old_tree.edit(
+                start_byte=start, old_end_byte=old_end, new_end_byte=new_end,
+                start_point=byte_point(previous.source, start),
+                old_end_point=byte_point(previous.source, old_end),
+                new_end_point=byte_point(source_bytes, new_end),
+            )
+            tree = parser.parse(source_bytes, old_tree)
+            if tree.root_node.has_error:
+                tree = None
+            else:
+                dirty.extend((r.start_byte, r.end_byte) for r in old_tree.changed_ranges(tree))
+        if tree is None:
+            tree = parser.parse(source_bytes)
+        line_shift = source_bytes.count(b"\n", start, new_end) - previous.source.count(b"\n", start, old_end)
+    byte_shift = new_end - old_end
+
+    symbols, texts = [], []
+    units = {}
+    for node, context in tree_units(tree.root_node):
+        # Everything the unit's results depend on: its own source and doc
+        # comments, and its container's doc comments
+        bounds = (unit_lead_start(node), node.end_byte, *context)
+        reused = None
+        if previous is not None and not any(
+            a <= bounds[1] and bounds[0] <= b or a <= bounds[3] and bounds[2] <= b for a, b in dirty
+        ):
+            moved = edit is not None and node.start_byte >= new_end
+            old_unit = previous.units.get(node.start_byte - byte_shift if moved else node.start_byte)
+            # Same bounds before the edit, too: a unit's doc comments can end up
+            # after a different sibling without being edited themselves
+            if old_unit and old_unit[0] == node.type and bounds == tuple(
+                offset + byte_shift if offset >= old_end else offset if offset < start else None
+                for offset in old_unit[1]
+            ):
+                reused = old_unit[2:]
+                if moved and line_shift:
+                    reused = (
+                        [replace(s, line_number=s.line_number + line_shift,
+                                 end_line_number=s.end_line_number and s.end_line_number + line_shift)
+                         for s in reused[0]],
+                        [replace(t, line_number=t.line_number + line_shift) for t in reused[1]],
+                    )
+        if reused is None:
+            reused = ([], [])
+            walk(node, source_bytes, rel_path, *reused)
+        unit_symbols, unit_texts = reused
+        units[node.start_byte] = (node.type, bounds, unit_symbols, unit_texts)
+        symbols.extend(unit_symbols)
+        texts.extend(unit_texts)
+
+    _tree_cache.put(key, ParsedFile(source_bytes, tree, units))
+    return symbols, join_comment_runs(texts)
+
+
+def extract_symbols_from_cpp(source: bytes, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+    """Extract classes, structs, and functions, plus searchable text, from C++ source bytes."""
     try:
-        source = file_path.read_text(encoding='utf-8')
-        source_bytes = source.encode()
-    except (UnicodeDecodeError, IOError):
-        return []
+        return _extract_cpp(source, rel_path)
+    except UnicodeDecodeError:
+        return [], []  # Not UTF-8 - skip the file, as when it was read as text
 
-    parser = get_cpp_parser()
-    tree = parser.parse(source_bytes)
-    rel_path = str(file_path.relative_to(relative_to))
 
+def _extract_cpp(source_bytes: bytes, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+    """Parse C++ source (incrementally, if a tree cache is enabled) and walk the tree."""
+    return extract_with_tree_sitter(source_bytes, rel_path, "cpp", get_cpp_parser(), _walk_cpp)
+
+
+def _walk_cpp(root: Node, source_bytes: bytes, rel_path: str, symbols: list[Symbol], texts: list[TextElement]) -> None:
+    """Walk a C++ subtree, appending its symbols and text elements; node text is sliced from the source buffer."""
     # Use iterative traversal to avoid recursion limit
-    stack: list[tuple[Node, str | None]] = [(tree.root_node, None)]
+    stack: list[tuple[Node, str | None]] = [(root, None)]
 
     while stack:
         node, class_context = stack.pop()
 
+        # Comments and string literals (not descended into)
+        if node.type in TS_TEXT_TYPES:
+            add_ts_text(texts, node, source_bytes, rel_path)
+            continue
+
         # Class definition
         if node.type == "class_specifier":
             name_node = node.child_by_field_name("name")
@@ -502,8 +1221,6 @@ def extract_symbols_from_cpp(file_path: Path, relative_to: Path) -> list[Symbol]
         for child in reversed(node.children):
             stack.append((child, class_context))
 
-    return symbols
-
 
 def extract_cpp_func_name(declarator: Node, source: bytes) -> str:
     """Extract function name from a C++ declarator."""
@@ -518,26 +1235,32 @@ def extract_cpp_func_name(declarator: Node, source: bytes) -> str:
     return node_text(declarator, source)
 
 
-def extract_symbols_from_rust(file_path: Path, relative_to: Path) -> list[Symbol]:
-    """Extract structs, enums, and functions from a Rust file."""
-    symbols = []
-
+def extract_symbols_from_rust(source: bytes, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+    """Extract structs, enums, and functions, plus searchable text, from Rust source bytes."""
     try:
-        source = file_path.read_text(encoding='utf-8')
-        source_bytes = source.encode()
-    except (UnicodeDecodeError, IOError):
-        return []
+        return _extract_rust(source, rel_path)
+    except UnicodeDecodeError:
+        return [], []  # Not UTF-8 - skip the file, as when it was read as text
 
-    parser = get_rust_parser()
-    tree = parser.parse(source_bytes)
-    rel_path = str(file_path.relative_to(relative_to))
 
+def _extract_rust(source_bytes: bytes, rel_path: str) -> tuple[list[Symbol], list[TextElement]]:
+    """Parse Rust source (incrementally, if a tree cache is enabled) and walk the tree."""
+    return extract_with_tree_sitter(source_bytes, rel_path, "rust", get_rust_parser(), _walk_rust)
+
+
+def _walk_rust(root: Node, source_bytes: bytes, rel_path: str, symbols: list[Symbol], texts: list[TextElement]) -> None:
+    """Walk a Rust subtree, appending its symbols and text elements; node text is sliced from the source buffer."""
     # Use iterative traversal to avoid recursion limit
-    stack: list[tuple[Node, str | None]] = [(tree.root_node, None)]
+    stack: list[tuple[Node, str | None]] = [(root, None)]
 
     while stack:
         node, impl_context = stack.pop()
 
+        # Comments and string literals (not descended into)
+        if node.type in TS_TEXT_TYPES:
+            add_ts_text(texts, node, source_bytes, rel_path)
+            continue
+
         # Struct
         if node.type == "struct_item":
             name_node = node.child_by_field_name("name")
@@ -618,126 +1341,378 @@ def extract_symbols_from_rust(file_path: Path, relative_to: Path) -> list[Symbol
         for child in reversed(node.children):
             stack.append((child, impl_context))
 
-    return symbols
+
+# Extractor per language: (source bytes, rel_path) -> (symbols, text elements)
+EXTRACTORS = {
+    "python": extract_symbols_from_python,
+    "cpp": extract_symbols_from_cpp,
+    "rust": extract_symbols_from_rust,
+}
 
 
 def get_language(file_path: str) -> str:
     """Get language from file extension."""
-    ext = Path(file_path).suffix.lower()
-    if ext == ".py":
-        return "python"
-    elif ext == ".rs":
-        return "rust"
-    elif ext in (".cpp", ".cc", ".cxx", ".hpp", ".h", ".hxx"):
-        return "cpp"
-    return "unknown"
+    return LANGUAGE_EXTENSIONS.get(Path(file_path).suffix.lower(), "unknown")
 
 
-def same_language(sym1: Symbol, sym2: Symbol) -> bool:
-    """Check if two symbols are from the same programming language."""
-    return get_language(sym1.file_path) == get_language(sym2.file_path)
+def normalize_for_similarity(text: str) -> str:
+    """Case- and underscore-insensitive form compared by similarity()."""
+    return text.lower().replace('_', '')
 
 
 def similarity(a: str, b: str) -> float:
     """Calculate similarity ratio between two strings."""
-    return SequenceMatcher(None, a.lower().replace('_', ''), b.lower().replace('_', '')).ratio()
+    return SequenceMatcher(None, normalize_for_similarity(a), normalize_for_similarity(b)).ratio()
 
 
-def find_similar_classes(symbols: list[Symbol], name_threshold: float = 0.75, doc_threshold: float = 0.65) -> list[tuple[Symbol, Symbol, str]]:
-    """Find classes with similar names or docstrings (same language only)."""
-    similar = []
-    classes = [s for s in symbols if s.kind == "class" and not s.name.startswith("Test")]
-    compared = set()
+def ngrams(text: str, size: int) -> set[str]:
+    """Character n-grams of normalized text, padded so short names still have a few."""
+    padded = f"^{text}$"
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
 
-    for i, cls1 in enumerate(classes):
-        for cls2 in classes[i+1:]:
-            if cls1.file_path == cls2.file_path:
-                continue
-            # Skip cross-language comparisons (intentional duplicates for bindings, etc.)
-            if not same_language(cls1, cls2):
-                continue
-            pair_key = tuple(sorted([cls1.location, cls2.location]))
-            if pair_key in compared:
-                continue
-            compared.add(pair_key)
 
-            reasons = []
-            name_sim = similarity(cls1.name, cls2.name)
-            if name_sim >= name_threshold:
-                reasons.append(f"similar names ({name_sim:.0%})")
+def character_counts(text: str) -> set[str]:
+    """Characters of text numbered by occurrence ("a1", "a2", ...), so set overlap is multiset overlap."""
+    seen: Counter[str] = Counter()
+    tokens = set()
+    for char in text:
+        seen[char] += 1
+        tokens.add(f"{char}{seen[char]}")
+    return tokens
 
-            if cls1.docstring and cls2.docstring and len(cls1.docstring) >= 30 and len(cls2.docstring) >= 30:
-                doc_sim = similarity(cls1.docstring, cls2.docstring)
-                if doc_sim >= doc_threshold:
-                    reasons.append(f"similar docstrings ({doc_sim:.0%})")
-
-            if reasons:
-                similar.append((cls1, cls2, ", ".join(reasons)))
-
-    return similar
 
+def overlapping_partners(
+    token_sets: list[set[str]], min_overlap: float, probes: Iterable[int] | None = None,
+) -> Iterator[tuple[int, list[int]]]:
+    """
+    (i, partners) for the token sets with Jaccard similarity of at least
+    min_overlap: each such pair is reported once, under one of its two sets,
+    as soon as it is found, so memory doesn't grow with the number of pairs.
+
+    Prefix filtering: with each set's tokens ordered rarest first, two sets
+    reaching the threshold share a token within the first
+    len - ceil(min_overlap * len) + 1 tokens of both (fewer for the smaller
+    set). Only those prefixes go into the inverted index, and rare tokens
+    have short posting lists, so common n-grams like "get" in get_* are
+    never used to pair symbols up. Pairs found that way are then checked
+    with the full sets.
+
+    With probes, only pairs involving at least one of those sets are found:
+    every set's prefix is indexed but only the probes look theirs up. A pair
+    of two probes is reported under the smaller index.
+    """
+    sizes = [len(tokens) for tokens in token_sets]
+    frequency = Counter(token for tokens in token_sets for token in tokens)
+    index: dict[str, list[int]] = defaultdict(list)
+    # Bounds are rounded down slightly so float error (0.4 * 7 = 2.8000000000000003)
+    # can only make prefixes longer, never drop a pair
+    probe_overlap = min_overlap - 1e-9
+    index_overlap = 2 * min_overlap / (1 + min_overlap) - 1e-9
+
+    def ordered(i: int) -> list[str]:
+        return sorted(token_sets[i], key=lambda token: (frequency[token], token))
+
+    def prefix_length(size: int, overlap: float) -> int:
+        return size - math.ceil(overlap * size) + 1
+
+    def partners(i: int, candidates: Iterable[int]) -> list[int]:
+        tokens, size = token_sets[i], sizes[i]
+        found = []
+        for j in candidates:
+            shared = len(tokens & token_sets[j])
+            if shared / (size + sizes[j] - shared) >= min_overlap:
+                found.append(j)
+        return found
+
+    if probes is not None:
+        probes = set(probes)
+        for j, size in enumerate(sizes):
+            for token in ordered(j)[:prefix_length(size, probe_overlap)]:
+                index[token].append(j)
+        for i in sorted(probes):
+            if sizes[i]:
+                candidates = set()
+                for token in ordered(i)[:prefix_length(sizes[i], probe_overlap)]:
+                    candidates.update(index[token])
+                # The other probe finds the pair too, so only the first one reports it
+                found = partners(i, (j for j in candidates if j > i or j not in probes))
+                if found:
+                    yield i, found
+        return
+
+    # Smallest sets first: every indexed set is no larger than the current one,
+    # so the size filter only needs a lower bound, and posting lists stay
+    # sorted by size
+    for i in sorted(range(len(token_sets)), key=sizes.__getitem__):
+        size = sizes[i]
+        if not size:
+            continue
+        tokens = ordered(i)
+        min_size = probe_overlap * size
+        candidates = set()
+        for token in tokens[:prefix_length(size, probe_overlap)]:
+            postings = index[token]
+            # Sets too small for this one are too small for every later one
+            stale = 0
+            while stale < len(postings) and sizes[postings[stale]] < min_size:
+                stale += 1
+            if stale:
+                del postings[:stale]
+            candidates.update(postings)
+        found = partners(i, candidates)
+        if found:
+            yield i, found
+        for token in tokens[:prefix_length(size, index_overlap)]:
+            index[token].append(i)
+
+
+
+def tfidf_similar_pairs(
+    texts: list[str], threshold: float, ngram_size: int, probes: Iterable[int] | None = None,
+) -> dict[tuple[int, int], float]:
+    """
+    {(i, j): cosine similarity} for every i < j whose character n-gram TF-IDF
+    vectors reach threshold; with probes, only pairs involving one of them.
+    Needs NumPy. N-grams are taken over UTF-8 bytes (ngram_size <= 7).
+
+    The sparse product X @ X.T is formed in row blocks of about
+    TFIDF_BLOCK_SIZE partial products, each summed per pair and thresholded
+    before the next block, so memory doesn't grow with the number of texts.
+    Every partial product of a pair (i, j) comes from row min(i, j) (or from
+    the probe), so each block's sums are complete.
+    """
+    count = len(texts)
+    encoded = [f"^{text}$".encode() for text in texts]
+    sizes = np.array([len(data) for data in encoded], dtype=np.int64)
+    windows = np.maximum(sizes - ngram_size + 1, 0)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.int64)
+    starts = np.repeat(np.cumsum(sizes) - sizes - np.cumsum(windows) + windows, windows) + np.arange(windows.sum())
+    grams = np.zeros(len(starts), dtype=np.int64)
+    for offset in range(ngram_size):
+        grams |= data[starts + offset] << (8 * offset)
+
+    # Term counts per (text, n-gram), rows in text order
+    vocabulary, gram_ids = np.unique(grams, return_inverse=True)
+    keys, counts = np.unique(np.repeat(np.arange(count), windows) * len(vocabulary) + gram_ids, return_counts=True)
+    docs, features = np.divmod(keys, len(vocabulary))
+    df = np.bincount(features, minlength=len(vocabulary))
+
+    # Stop n-grams: the most common ones, until the rest fit the work budget
+    by_frequency = np.sort(df)
+    affordable = np.searchsorted(np.cumsum(by_frequency.astype(np.float64) ** 2),
+                                 TFIDF_WORK_PER_TEXT * count, side="right")
+    max_df = by_frequency[affordable] - 1 if affordable < len(by_frequency) else count
+    kept = df[features] <= max_df
+    docs, features = docs[kept], features[kept]
+    weights = counts[kept] * (np.log((1 + count) / (1 + df)) + 1)[features]
+    weights /= np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=count))[docs]
+
+    # Postings: entries ordered by (n-gram, text)
+    order = np.lexsort((docs, features))
+    posting_docs, posting_weights = docs[order], weights[order]
+    postings_end = np.cumsum(np.bincount(features, minlength=len(vocabulary)))
+    if probes is None:
+        # Pair each entry with the later texts sharing its n-gram
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        first = position + 1
+    else:
+        # Pair the probes' entries with every text sharing the n-gram
+        is_probe = np.zeros(count, dtype=bool)
+        is_probe[list(probes)] = True
+        rows = is_probe[docs]
+        docs, features, weights = docs[rows], features[rows], weights[rows]
+        first = np.concatenate(([0], postings_end[:-1]))[features]
+    spans = postings_end[features] - first
+
+    pairs = {}
+    limit = threshold - 1e-9  # Float error must not drop a pair at exactly the threshold
+    cumulative = np.cumsum(spans)
+    start = 0
+    while start < len(docs):
+        end = int(np.searchsorted(cumulative, cumulative[start] - spans[start] + TFIDF_BLOCK_SIZE, side="right"))
+        end = int(np.searchsorted(docs, docs[max(end, start + 1) - 1], side="right"))  # Whole rows only
+        block_spans = spans[start:end]
+        total = int(block_spans.sum())
+        if total:
+            entries = np.repeat(np.arange(start, end), block_spans)
+            others = (np.repeat(first[start:end] - np.cumsum(block_spans) + block_spans, block_spans)
+                      + np.arange(total))
+            left, right = docs[entries], posting_docs[others]
+            products = weights[entries] * posting_weights[others]
+            if probes is not None:
+                # Pairs of two probes are summed from the smaller one's row
+                wanted = (right != left) & (~is_probe[right] | (right > left))
+                left, right, products = left[wanted], right[wanted], products[wanted]
+            pair_keys, pair_index = np.unique(left * count + right, return_inverse=True)
+            sums = np.bincount(pair_index, weights=products)
+            hits = sums >= limit
+            for key, score in zip(pair_keys[hits].tolist(), sums[hits].tolist()):
+                i, j = divmod(key, count)
+                pairs[(i, j) if i < j else (j, i)] = min(score, 1.0)
+        start = end
+    return pairs
+
+
+def similar_text_pairs(
+    texts: list[str | None], threshold: float, ngram_size: int, min_overlap: float,
+    changed: set[int] | None = None, engine: str = "ratio", candidates: str = DEFAULT_SIMILAR_CANDIDATES,
+) -> dict[tuple[int, int], float]:
+    """
+    {(i, j): similarity} for every i < j whose texts reach threshold, or only
+    those where i or j is in changed.
+
+    Each distinct normalized text is scored once however many symbols share it
+    (identical texts are 100% similar). With the ratio engine, only distinct
+    candidate pairs (SIMILAR_CANDIDATE_FILTERS, found with overlapping_partners())
+    get the SequenceMatcher ratio; the tfidf engine scores by cosine
+    (tfidf_similar_pairs()).
+    """
+    positions: dict[str, list[int]] = defaultdict(list)
+    for i, text in enumerate(texts):
+        if text:
+            positions[normalize_for_similarity(text)].append(i)
+    distinct = list(positions)
+    probes = None
+    if changed is not None:
+        probes = [k for k, text in enumerate(distinct) if not changed.isdisjoint(positions[text])]
+
+    scored = [(distinct[k], distinct[k], 1.0) for k in (range(len(distinct)) if probes is None else probes)
+              if len(positions[distinct[k]]) > 1]
+    if engine == "tfidf":
+        scored.extend((distinct[a], distinct[b], cosine) for (a, b), cosine
+                      in tfidf_similar_pairs(distinct, threshold, ngram_size, probes).items())
+    else:
+        if candidates == "exact":
+            # 2 * shared / (len(a) + len(b)) >= threshold, i.e. quick_ratio(), as a Jaccard overlap of
+            # the character multisets; lowered slightly so float error can't drop a pair at the bound
+            token_sets = [character_counts(text) for text in distinct]
+            min_overlap = threshold / (2 - threshold) - 1e-9
+        else:
+            token_sets = [ngrams(text, ngram_size) for text in distinct]
+        matcher = SequenceMatcher()
+
+        def score(a: int, b: int) -> None:
+            # Length and character-count upper bounds reject most candidates cheaply
+            if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+                ratio = matcher.ratio()
+                if ratio >= threshold:
+                    scored.append((distinct[a], distinct[b], ratio))
+
+        # Candidates are scored as they are found. The earlier text is always the first sequence
+        # (ratio() isn't symmetric); SequenceMatcher caches its index of the second one
+        for k, partners in overlapping_partners(token_sets, min_overlap, probes):
+            matcher.set_seq2(distinct[k])
+            for j in partners:
+                if j < k:
+                    matcher.set_seq1(distinct[j])
+                    score(j, k)
+            matcher.set_seq1(distinct[k])
+            for j in partners:
+                if j > k:
+                    matcher.set_seq2(distinct[j])
+                    score(k, j)
+
+    pairs = {}
+    for a, b, ratio in scored:
+        for i in positions[a]:
+            for j in positions[b]:
+                if i != j and (changed is None or i in changed or j in changed):
+                    pairs[(i, j) if i < j else (j, i)] = ratio
+    return pairs
+
+
+def find_similar_pairs(
+    symbols: list[Symbol], min_doc_length: int, name_threshold: float, doc_threshold: float,
+    changed_files: Collection[str] | None = None, doc_similarity: str = DEFAULT_DOC_SIMILARITY,
+    candidates: str = DEFAULT_SIMILAR_CANDIDATES,
+) -> list[tuple[Symbol, Symbol, str]]:
+    """
+    Pairs of symbols in different files (same language only) with similar names
+    or docstrings, in the order of an all-pairs scan over symbols. With
+    changed_files, only pairs with at least one symbol in those files.
+    doc_similarity is the docstring engine (DOC_SIMILARITY_ENGINES), candidates
+    the candidate pair filter (SIMILAR_CANDIDATE_FILTERS).
+    """
+    # Cross-language pairs are never compared (intentional duplicates for bindings, etc.)
+    by_language: dict[str, list[int]] = defaultdict(list)
+    for position, symbol in enumerate(symbols):
+        by_language[get_language(symbol.file_path)].append(position)
+
+    name_sims: dict[tuple[int, int], float] = {}
+    doc_sims: dict[tuple[int, int], float] = {}
+    for positions in by_language.values():
+        group = [symbols[p] for p in positions]
+        names = [s.name for s in group]
+        docs = [s.docstring if s.docstring and len(s.docstring) >= min_doc_length else None for s in group]
+        changed = None
+        if changed_files is not None:
+            changed = {k for k, s in enumerate(group) if s.file_path in changed_files}
+            if not changed:
+                continue
+        for sims, pairs in (
+            (name_sims, similar_text_pairs(names, name_threshold, NAME_NGRAM_SIZE, NAME_MIN_OVERLAP, changed,
+                                           candidates=candidates)),
+            (doc_sims, similar_text_pairs(docs, doc_threshold, DOC_NGRAM_SIZE, DOC_MIN_OVERLAP, changed,
+                                          doc_similarity, candidates)),
+        ):
+            sims.update(((positions[i], positions[j]), ratio) for (i, j), ratio in pairs.items())
 
-def find_similar_functions(symbols: list[Symbol], name_threshold: float = 0.75, doc_threshold: float = 0.65) -> list[tuple[Symbol, Symbol, str]]:
-    """Find top-level functions with similar names or docstrings (same language only)."""
     similar = []
-    functions = [s for s in symbols if s.kind == "function" and not s.name.startswith('_') and not s.name.startswith('test_')]
-    compared = set()
+    for pair in sorted(name_sims.keys() | doc_sims.keys()):
+        sym1, sym2 = symbols[pair[0]], symbols[pair[1]]
+        if sym1.file_path == sym2.file_path:
+            continue
+        reasons = []
+        if pair in name_sims:
+            reasons.append(f"similar names ({name_sims[pair]:.0%})")
+        if pair in doc_sims:
+            reasons.append(f"similar docstrings ({doc_sims[pair]:.0%})")
+        similar.append((sym1, sym2, ", ".join(reasons)))
 
-    for i, fn1 in enumerate(functions):
-        for fn2 in functions[i+1:]:
-            if fn1.file_path == fn2.file_path:
-                continue
-            # Skip cross-language comparisons (intentional duplicates for bindings, etc.)
-            if not same_language(fn1, fn2):
-                continue
-            pair_key = tuple(sorted([fn1.location, fn2.location]))
-            if pair_key in compared:
-                continue
-            compared.add(pair_key)
+    return similar
 
-            reasons = []
-            name_sim = similarity(fn1.name, fn2.name)
-            if name_sim >= name_threshold:
-                reasons.append(f"similar names ({name_sim:.0%})")
 
-            if fn1.docstring and fn2.docstring and len(fn1.docstring) >= 20 and len(fn2.docstring) >= 20:
-                doc_sim = similarity(fn1.docstring, fn2.docstring)
-                if doc_sim >= doc_threshold:
-                    reasons.append(f"similar docstrings ({doc_sim:.0%})")
+def find_similar_classes(symbols: Iterable[Symbol], name_threshold: float = 0.75, doc_threshold: float = 0.65,
+                         changed_files: Collection[str] | None = None,
+                         doc_similarity: str = DEFAULT_DOC_SIMILARITY,
+                         candidates: str = DEFAULT_SIMILAR_CANDIDATES) -> list[tuple[Symbol, Symbol, str]]:
+    """Find classes with similar names or docstrings (same language only)."""
+    classes = [s for s in symbols if s.kind == "class" and not s.name.startswith("Test")]
+    return find_similar_pairs(classes, 30, name_threshold, doc_threshold, changed_files, doc_similarity, candidates)
 
-            if reasons:
-                similar.append((fn1, fn2, ", ".join(reasons)))
 
-    return similar
+def find_similar_functions(symbols: Iterable[Symbol], name_threshold: float = 0.75, doc_threshold: float = 0.65,
+                           changed_files: Collection[str] | None = None,
+                           doc_similarity: str = DEFAULT_DOC_SIMILARITY,
+                           candidates: str = DEFAULT_SIMILAR_CANDIDATES) -> list[tuple[Symbol, Symbol, str]]:
+    """Find top-level functions with similar names or docstrings (same language only)."""
+    functions = [s for s in symbols if s.kind == "function" and not s.name.startswith('_') and not s.name.startswith('test_')]
+    return find_similar_pairs(functions, 20, name_threshold, doc_threshold, changed_files, doc_similarity, candidates)
 
 
-def analyze_documentation_coverage(symbols: list[Symbol]) -> dict:
-    """Analyze docstring coverage and identify documentation gaps."""
+def analyze_documentation_coverage(symbols: Iterable[Symbol]) -> dict:
+    """
+    Analyze docstring coverage and identify documentation gaps.
+    Only the first UNDOCUMENTED_EXAMPLES undocumented symbols of each kind are
+    kept; the rest are implied by total - documented.
+    """
     stats = {
         "classes": {"total": 0, "documented": 0, "undocumented": []},
         "functions": {"total": 0, "documented": 0, "undocumented": []},
         "methods": {"total": 0, "documented": 0, "undocumented": []},
     }
+    kinds = {"class": "classes", "function": "functions", "method": "methods"}
 
     for sym in symbols:
-        if sym.kind == "class":
-            stats["classes"]["total"] += 1
-            if sym.docstring:
-                stats["classes"]["documented"] += 1
-            else:
-                stats["classes"]["undocumented"].append(sym)
-        elif sym.kind == "function" and not sym.name.startswith('_'):
-            stats["functions"]["total"] += 1
-            if sym.docstring:
-                stats["functions"]["documented"] += 1
-            else:
-                stats["functions"]["undocumented"].append(sym)
-        elif sym.kind == "method" and not sym.name.startswith('_'):
-            stats["methods"]["total"] += 1
-            if sym.docstring:
-                stats["methods"]["documented"] += 1
-            else:
-                stats["methods"]["undocumented"].append(sym)
+        kind = kinds.get(sym.kind)
+        if kind is None or (kind != "classes" and sym.name.startswith('_')):
+            continue
+        stats[kind]["total"] += 1
+        if sym.docstring:
+            stats[kind]["documented"] += 1
+        elif len(stats[kind]["undocumented"]) < UNDOCUMENTED_EXAMPLES:
+            stats[kind]["undocumented"].append(sym)
 
     return stats
 
@@ -747,12 +1722,37 @@ def set_metadata(conn: sqlite3.Connection, key: str, value: str) -> None:
     conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", [key, value])
 
 
-def write_symbols_to_sqlite(symbols: list[Symbol], db_path: Path) -> None:
-    """Write symbols to SQLite database for MCP server queries."""
-    # Connect directly - SQLite WAL mode + transactions handle atomicity and concurrency
-    conn = sqlite3.connect(db_path, timeout=30.0)
-    conn.execute("PRAGMA journal_mode=WAL")
+def get_metadata(conn: sqlite3.Connection, key: str) -> str | None:
+    """Get a metadata value, or None if unset."""
+    row = conn.execute("SELECT value FROM metadata WHERE key = ?", [key]).fetchone()
+    return row[0] if row else None
+
 
+IDENTIFIER_WORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def split_identifier(name: str) -> list[str]:
+    """
+    The lowercase words of an identifier, split at non-alphanumerics and
+    camelCase boundaries, in order and without repeats:
+    "parse_HTTPConfig2" -> ["parse", "http", "config", "2"].
+    """
+    return list(dict.fromkeys(word.lower() for word in IDENTIFIER_WORD.findall(name)))
+
+
+def token_bigrams(token: str) -> set[str]:
+    """The bigrams of a token padded with ^ and $, so its first and last letters count too."""
+    padded = f"^{token}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def qualified_name_sql(row: str = "") -> str:
+    """SQL for a symbols row's qualified name - parent.name, or just name at top level - with row the table prefix."""
+    return f"CASE WHEN coalesce({row}parent, '') = '' THEN {row}name ELSE {row}parent || '.' || {row}name END"
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the database schema, dropping index tables from an older DB_VERSION."""
     # Create tables outside transaction (DDL)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS metadata (
@@ -761,6 +1761,13 @@ def write_symbols_to_sqlite(symbols: list[Symbol], db_path: Path) -> None:
         )
     """)
 
+    if get_metadata(conn, 'db_version') != str(DB_VERSION):
+        # Old or unversioned layout - rebuild the index tables from scratch
+        for table in ("symbol_names_fts", "symbol_tokens", "name_tokens", "token_grams", "symbols", "files",
+                      "code_text_fts", "code_text", "similar_pairs", "dirs"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute("DELETE FROM metadata WHERE key IN ('similar_pairs_generation', 'dir_summary')")
+
     conn.execute("""
         CREATE TABLE IF NOT EXISTS symbols (
             id INTEGER PRIMARY KEY,
@@ -779,7 +1786,79 @@ def write_symbols_to_sqlite(symbols: list[Symbol], db_path: Path) -> None:
     conn.execute("CREATE INDEX IF NOT EXISTS idx_file ON symbols(file_path)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_kind ON symbols(kind)")
 
-    # Create FTS5 virtual table for full-text search (v5+)
+    # Trigram index of symbol names and qualified names (parent.name), for
+    # glob and substring search_symbols patterns idx_name can't serve.
+    # Contentless - it only finds rowids. SymbolWriter adds each batch of new
+    # symbols in one statement (several times faster than a per-row trigger);
+    # a trigger removes deleted ones
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS symbol_names_fts USING fts5(
+            name,
+            qualified,
+            content='',
+            tokenize='trigram'
+        )
+    """)
+
+    # Word tokens of symbol names (see split_identifier()) for fuzzy
+    # search_symbols: symbol_tokens maps each token to the symbols using it,
+    # name_tokens lists the distinct tokens and token_grams their bigrams
+    # (see token_bigrams()), to find tokens near a misspelled one. SymbolWriter
+    # adds rows with each batch of symbols and drops tokens no symbol uses
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_tokens (
+            token TEXT NOT NULL,
+            symbol_id INTEGER NOT NULL,
+            PRIMARY KEY (token, symbol_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tokens_symbol ON symbol_tokens(symbol_id)")
+    conn.execute("CREATE TABLE IF NOT EXISTS name_tokens (token TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS token_grams (
+            gram TEXT NOT NULL,
+            token TEXT NOT NULL,
+            PRIMARY KEY (gram, token)
+        ) WITHOUT ROWID
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS symbols_ad AFTER DELETE ON symbols BEGIN
+            INSERT INTO symbol_names_fts(symbol_names_fts, rowid, name, qualified)
+            VALUES ('delete', old.id, old.name, {qualified_name_sql("old.")});
+            DELETE FROM symbol_tokens WHERE symbol_id = old.id;
+        END
+    """)
+
+    # One row per indexed file; generation is the index generation that last
+    # rewrote the file's rows (metadata 'generation' is the current one)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            ctime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            generation INTEGER NOT NULL
+        )
+    """)
+
+    # Comments, docstrings and string literals for search_text. Rows are
+    # deleted per file through idx_text_file; triggers keep the external-content
+    # FTS5 index in step, so no full-table scan is needed to replace a file
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS code_text (
+            id INTEGER PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            line_number INTEGER NOT NULL,
+            element_type TEXT NOT NULL,
+            symbol_name TEXT,
+            content TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_text_file ON code_text(file_path)")
+
     conn.execute("""
         CREATE VIRTUAL TABLE IF NOT EXISTS code_text_fts USING fts5(
             file_path UNINDEXED,
@@ -787,135 +1866,514 @@ def write_symbols_to_sqlite(symbols: list[Symbol], db_path: Path) -> None:
             element_type UNINDEXED,
             symbol_name UNINDEXED,
             content,
+            content='code_text',
+            content_rowid='id',
             tokenize='unicode61 remove_diacritics 2'
         )
     """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS code_text_ai AFTER INSERT ON code_text BEGIN
+            INSERT INTO code_text_fts(rowid, file_path, line_number, element_type, symbol_name, content)
+            VALUES (new.id, new.file_path, new.line_number, new.element_type, new.symbol_name, new.content);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS code_text_ad AFTER DELETE ON code_text BEGIN
+            INSERT INTO code_text_fts(code_text_fts, rowid, file_path, line_number, element_type, symbol_name, content)
+            VALUES ('delete', old.id, old.file_path, old.line_number, old.element_type, old.symbol_name, old.content);
+        END
+    """)
 
-    # Use explicit transaction for all writes - prevents partial state on crash
-    conn.execute("BEGIN IMMEDIATE")
-    try:
-        # Clear existing data and insert new
-        conn.execute("DELETE FROM symbols")
-        conn.execute("DELETE FROM code_text_fts")  # Clear FTS table too
-
-        conn.executemany(
-            """INSERT INTO symbols (name, kind, signature, docstring, file_path, line_number, end_line_number, parent)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            [(s.name, s.kind, s.signature, s.docstring, s.file_path, s.line_number, s.end_line_number, s.parent) for s in symbols]
+    # Similar classes/functions, keyed by both symbols' (file, line, name).
+    # Maintained by update_similar_pairs(); file1/line1 sorts before file2/line2
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS similar_pairs (
+            kind TEXT NOT NULL,
+            file1 TEXT NOT NULL,
+            line1 INTEGER NOT NULL,
+            name1 TEXT NOT NULL,
+            file2 TEXT NOT NULL,
+            line2 INTEGER NOT NULL,
+            name2 TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            PRIMARY KEY (kind, file1, line1, file2, line2, name1, name2)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pairs_file1 ON similar_pairs(file1)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pairs_file2 ON similar_pairs(file2)")
+
+    # One row per directory discovery walked: its mtime when listed, the
+    # source files found in it ("\n"-separated names) and a digest of their
+    # and its ignore files' fingerprints (see dir_digest()). Read by
+    # find_tree_changes(); metadata 'dir_summary' is set once a full walk
+    # has filled it, as paths-only reindexes just update the rows they touch
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            names TEXT NOT NULL,
+            digest TEXT NOT NULL
         )
+    """)
+
+
+class SymbolWriter:
+    """
+    Streams per-file symbol and text rows into the query database on a background thread.
+
+    Files are submitted as they are parsed (or found in the cache). Only files
+    that were added or changed since the last index (content hash differs from
+    the files table) have their rows deleted and re-inserted, in batches of
+    WRITE_BATCH_SIZE rows; files never submitted are removed by finish().
+    A bounded queue applies back-pressure, so at most WRITE_QUEUE_SIZE files'
+    symbols are held in memory. Everything happens in one BEGIN IMMEDIATE
+    transaction, committed by finish(), so readers never see a partial index.
+
+    Given paths, the writer only updates those files (see reindex_files()):
+    finish() removes just those of them never submitted, and the rest of the
+    database - including the metadata saying which versions wrote it - is
+    left as it is.
+    """
+
+    def __init__(self, db_path: Path, paths: Collection[str] | None = None):
+        # Connect directly - SQLite WAL mode + transactions handle atomicity and concurrency
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            ensure_schema(conn)
+            conn.commit()
+            query = "SELECT path, content_hash, size, mtime_ns, inode, ctime_ns FROM files"
+            if paths is None:
+                rows = conn.execute(query)
+            else:
+                rows = (row for path in paths for row in conn.execute(f"{query} WHERE path = ?", [path]))
+            self._stored = {row[0]: (row[1], tuple(row[2:])) for row in rows}
+            # Extractor output may differ between cache versions even for identical content
+            self._rewrite_all = get_metadata(conn, 'extractor_version') != str(CACHE_VERSION)
+            self._generation = int(get_metadata(conn, 'generation') or 0)
+        finally:
+            conn.close()
+
+        self.db_path = db_path
+        self._partial = paths is not None
+        self._submitted: set[str] = set()
+        self._queue: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._error: BaseException | None = None
+        self._ended = False  # The finish or abort message has been taken off the queue
+        self._result = (0, 0)
+        self._thread = threading.Thread(target=self._run, name="symbol-writer", daemon=True)
+        self._thread.start()
+
+    def needs_symbols(self, rel_path: str, content_hash: str) -> bool:
+        """Whether a file's rows must be (re)written, i.e. submit() needs its symbols and texts."""
+        stored = self._stored.get(rel_path)
+        return self._rewrite_all or stored is None or stored[0] != content_hash
+
+    def submit(self, rel_path: str, fingerprint: tuple, content_hash: str,
+               symbols: list[Symbol] | None = None, texts: list[TextElement] | None = None) -> None:
+        """Record an indexed file. Blocks while the queue is full."""
+        self._submitted.add(rel_path)
+        if self.needs_symbols(rel_path, content_hash):
+            self._put(("write", rel_path, fingerprint, content_hash, symbols, texts or []))
+        elif self._stored[rel_path][1] != fingerprint:
+            self._put(("touch", rel_path, fingerprint))
+
+    def update_dirs(self, rows: list[tuple], complete: bool, dropped: Iterable[str] = (),
+                    refreshed: list[tuple] = ()) -> None:
+        """
+        Record the directory summary (rows of the dirs table) with the files.
+        complete: rows cover every directory walked, replacing the table;
+        otherwise directories under the dropped prefixes are removed first,
+        and refreshed rows only update directories already in the table.
+        """
+        self._put(("dirs", rows, complete, list(dropped), refreshed))
+
+    def finish(self) -> tuple[int, int]:
+        """Remove files that weren't submitted and commit. Returns (files_written, files_removed)."""
+        removed = [path for path in self._stored if path not in self._submitted]
+        self._queue.put(("finish", removed))
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self._result
+
+    def abort(self) -> None:
+        """Roll back everything written so far."""
+        self._queue.put(("abort",))
+        self._thread.join()
+
+    def _put(self, item: tuple) -> None:
+        if self._error:
+            raise self._error
+        self._queue.put(item)
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        try:
+            self._write_all(conn)
+        except BaseException as e:
+            self._error = e
+            try:
+                conn.rollback()
+            finally:
+                # Keep consuming so producers blocked on put() can finish, unless
+                # the error came after the last message (e.g. the commit failed)
+                while not self._ended:
+                    self._ended = self._queue.get()[0] in ("finish", "abort")
+        finally:
+            conn.close()
+
+    def _write_all(self, conn: sqlite3.Connection) -> None:
+        # Use explicit transaction for all writes - prevents partial state on crash
+        conn.execute("BEGIN IMMEDIATE")
+        rows: list[tuple] = []
+        text_rows: list[tuple] = []
+        rewritten: list[str] = []
+        known_tokens = {token for (token,) in conn.execute("SELECT token FROM name_tokens")}
+        dropped_tokens: set[str] = set()  # Of deleted symbols: removed at the end if nothing else uses them
+
+        def drop_file_symbols(path: str):
+            for (name,) in conn.execute("SELECT name FROM symbols WHERE file_path = ?", [path]):
+                dropped_tokens.update(split_identifier(name))
+            conn.execute("DELETE FROM symbols WHERE file_path = ?", [path])
+
+        def flush_rows():
+            # New rows get ids above the current largest
+            last_id = conn.execute("SELECT coalesce(max(id), 0) FROM symbols").fetchone()[0]
+            conn.executemany(
+                """INSERT INTO symbols (name, kind, signature, docstring, file_path, line_number, end_line_number, parent)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            conn.execute(
+                f"""INSERT INTO symbol_names_fts (rowid, name, qualified)
+                    SELECT id, name, {qualified_name_sql()} FROM symbols WHERE id > ?""",
+                [last_id]
+            )
+            token_rows = [(token, symbol_id)
+                          for symbol_id, name in conn.execute("SELECT id, name FROM symbols WHERE id > ?", [last_id])
+                          for token in split_identifier(name)]
+            conn.executemany("INSERT INTO symbol_tokens VALUES (?, ?)", token_rows)
+            new_tokens = {token for token, _ in token_rows} - known_tokens
+            conn.executemany("INSERT INTO name_tokens VALUES (?)", ((token,) for token in new_tokens))
+            conn.executemany("INSERT INTO token_grams VALUES (?, ?)",
+                             ((gram, token) for token in new_tokens for gram in token_bigrams(token)))
+            known_tokens.update(new_tokens)
+            conn.executemany(
+                """INSERT INTO code_text (file_path, line_number, element_type, symbol_name, content)
+                   VALUES (?, ?, ?, ?, ?)""",
+                text_rows
+            )
+            rows.clear()
+            text_rows.clear()
+
+        while True:
+            item = self._queue.get()
+            self._ended = item[0] in ("finish", "abort")
+            if item[0] == "write":
+                _, path, fingerprint, content_hash, symbols, texts = item
+                if path in self._stored:
+                    drop_file_symbols(path)
+                    conn.execute("DELETE FROM code_text WHERE file_path = ?", [path])
+                conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [path, *fingerprint, content_hash, self._generation + 1]
+                )
+                rewritten.append(path)
+                rows.extend((s.name, s.kind, s.signature, s.docstring, s.file_path, s.line_number,
+                             s.end_line_number, s.parent) for s in symbols)
+                text_rows.extend((t.file_path, t.line_number, t.element_type, t.symbol_name, t.content)
+                                 for t in texts)
+                if len(rows) + len(text_rows) >= WRITE_BATCH_SIZE:
+                    flush_rows()
+            elif item[0] == "touch":
+                _, path, fingerprint = item
+                conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ?, inode = ?, ctime_ns = ? WHERE path = ?",
+                    [*fingerprint, path]
+                )
+            elif item[0] == "dirs":
+                _, dir_rows, complete, dropped, refreshed = item
+                if complete:
+                    conn.execute("DELETE FROM dirs")
+                    set_metadata(conn, 'dir_summary', 'complete')
+                for prefix in dropped:
+                    conn.execute("DELETE FROM dirs WHERE substr(path, 1, ?) = ?", [len(prefix), prefix])
+                conn.executemany("UPDATE dirs SET mtime_ns = ?, names = ?, digest = ? WHERE path = ?",
+                                 [(mtime_ns, names, digest, path) for path, mtime_ns, names, digest in refreshed])
+                conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", dir_rows)
+            elif item[0] == "abort":
+                conn.rollback()
+                return
+            else:  # finish
+                removed = item[1]
+                break
+
+        flush_rows()
+        for path in removed:
+            drop_file_symbols(path)
+        stale = [(path,) for path in removed]
+        conn.executemany("DELETE FROM code_text WHERE file_path = ?", stale)
+        conn.executemany("DELETE FROM files WHERE path = ?", stale)
+        unused = [(token,) for token in dropped_tokens
+                  if conn.execute("SELECT 1 FROM symbol_tokens WHERE token = ?", [token]).fetchone() is None]
+        conn.executemany("DELETE FROM name_tokens WHERE token = ?", unused)
+        conn.executemany("DELETE FROM token_grams WHERE gram = ? AND token = ?",
+                         ((gram, token) for (token,) in unused for gram in token_bigrams(token)))
+        if rewritten or removed:
+            self._generation += 1
 
         # Set metadata to indicate successful indexing completion
-        set_metadata(conn, 'status', 'completed')
-        set_metadata(conn, 'db_version', str(DB_VERSION))
+        if not self._partial:
+            set_metadata(conn, 'status', 'completed')
+            set_metadata(conn, 'db_version', str(DB_VERSION))
+            set_metadata(conn, 'extractor_version', str(CACHE_VERSION))
+        set_metadata(conn, 'generation', str(self._generation))
         set_metadata(conn, 'last_indexed', datetime.now().isoformat())
-        set_metadata(conn, 'symbol_count', str(len(symbols)))
+        set_metadata(conn, 'symbol_count', str(conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]))
 
         # Single commit for entire transaction - all or nothing
         conn.commit()
-    except Exception:
-        conn.rollback()
+        self._result = (len(rewritten), len(removed))
+
+
+def write_symbols_to_sqlite(
+    files: dict[str, FileCache], db_path: Path,
+    load: Callable[[str], tuple[list[Symbol], list[TextElement]]] | None = None,
+) -> tuple[int, int]:
+    """
+    Sync the database used for MCP server queries with a complete set of files.
+
+    files maps each indexed rel_path to its cache entry; only added, changed
+    and removed files are written (see SymbolWriter). Entries whose symbols
+    aren't in memory are read with load (e.g. SymbolCache.load).
+    Returns (files_written, files_removed).
+    """
+    writer = SymbolWriter(db_path)
+    try:
+        for path, entry in files.items():
+            symbols, texts = entry.symbols, entry.texts
+            if symbols is None and writer.needs_symbols(path, entry.content_hash):
+                symbols, texts = load(path)
+            writer.submit(path, entry.fingerprint, entry.content_hash, symbols, texts)
+    except BaseException:
+        writer.abort()
         raise
+    return writer.finish()
+
+
+def count_symbols(db_path: Path) -> int:
+    """Number of symbols in the database."""
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
     finally:
         conn.close()
 
 
-def format_repo_map(symbols: list[Symbol], similar_classes: list, similar_functions: list, doc_coverage: dict, root: Path) -> str:
-    """Format symbols as a hierarchical repo map with analysis."""
-    output = [
-        "# Repository Map", "",
-        f"Generated from: {root}",
-        f"Total symbols: {len(symbols)}", "",
-        "## Documentation Coverage", ""
-    ]
+def read_symbols(db_path: Path, kind: str | None = None) -> Iterator[Symbol]:
+    """Stream symbols back from the database, ordered by file then line."""
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        query = ("SELECT name, kind, signature, docstring, file_path, line_number, end_line_number, parent "
+                 "FROM symbols")
+        params = []
+        if kind:
+            query += " WHERE kind = ?"
+            params.append(kind)
+        for row in conn.execute(query + " ORDER BY file_path, line_number", params):
+            yield Symbol(*row)
+    finally:
+        conn.close()
+
+
+def update_similar_pairs(db_path: Path, doc_similarity: str = DEFAULT_DOC_SIMILARITY,
+                         similar_candidates: str = DEFAULT_SIMILAR_CANDIDATES) -> int:
+    """
+    Bring the similar_pairs table up to date with the symbols table.
+
+    A pair only depends on its two symbols, so only pairs involving files
+    rewritten since the last update (files.generation above metadata
+    'similar_pairs_generation') are deleted and recomputed, against every
+    symbol; pairs involving removed files are dropped. Without a previous
+    update, or when the docstring engine or candidate filter changed, all
+    pairs are computed.
+    Returns the number of files whose pairs were recomputed.
+    """
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        generation = int(get_metadata(conn, 'generation') or 0)
+        updated = get_metadata(conn, 'similar_pairs_generation')
+        if (get_metadata(conn, 'doc_similarity'), get_metadata(conn, 'similar_candidates')) != (
+                doc_similarity, similar_candidates):
+            updated = None
+        elif updated == str(generation):
+            conn.rollback()
+            return 0
+
+        changed = None
+        if updated is not None:
+            changed = {path for (path,) in conn.execute("SELECT path FROM files WHERE generation > ?", [int(updated)])}
+            for column in ("file1", "file2"):
+                conn.executemany(f"DELETE FROM similar_pairs WHERE {column} = ?", [(path,) for path in changed])
+                conn.execute(f"DELETE FROM similar_pairs WHERE {column} NOT IN (SELECT path FROM files)")
+        else:
+            conn.execute("DELETE FROM similar_pairs")
+
+        for kind, find_similar in (("class", find_similar_classes), ("function", find_similar_functions)):
+            pairs = find_similar(read_symbols(db_path, kind), changed_files=changed, doc_similarity=doc_similarity,
+                                 candidates=similar_candidates)
+            conn.executemany(
+                "INSERT OR IGNORE INTO similar_pairs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((kind, a.file_path, a.line_number, a.name, b.file_path, b.line_number, b.name, reason)
+                 for a, b, reason in pairs)
+            )
+
+        set_metadata(conn, 'similar_pairs_generation', str(generation))
+        set_metadata(conn, 'doc_similarity', doc_similarity)
+        set_metadata(conn, 'similar_candidates', similar_candidates)
+        conn.commit()
+        if changed is None:
+            return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return len(changed)
+    finally:
+        conn.close()
+
 
+def read_similar_pairs(db_path: Path, kind: str) -> list[tuple[Symbol, Symbol, str]]:
+    """Stored similar pairs of one kind ("class" or "function") with both symbols, in scan order."""
+    columns = ("name", "kind", "signature", "docstring", "file_path", "line_number", "end_line_number", "parent")
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        rows = conn.execute(f"""
+            SELECT {", ".join(f"s1.{column}" for column in columns)},
+                   {", ".join(f"s2.{column}" for column in columns)},
+                   p.reason
+            FROM similar_pairs p
+            JOIN symbols s1 ON s1.file_path = p.file1 AND s1.line_number = p.line1
+                           AND s1.name = p.name1 AND s1.kind = p.kind
+            JOIN symbols s2 ON s2.file_path = p.file2 AND s2.line_number = p.line2
+                           AND s2.name = p.name2 AND s2.kind = p.kind
+            WHERE p.kind = ?
+            ORDER BY p.file1, p.line1, p.file2, p.line2
+        """, [kind]).fetchall()
+        return [(Symbol(*row[:8]), Symbol(*row[8:16]), row[16]) for row in rows]
+    finally:
+        conn.close()
+
+
+def render_file_section(file_path: str, symbols: list[Symbol]) -> str:
+    """
+    Render one file's Code Structure section: classes with their public
+    methods, then public functions, each in line order ("" for no symbols).
+    Symbols are bucketed in a single pass rather than rescanned per class.
+    """
+    if not symbols:
+        return ""
+    classes, functions = [], []
+    methods = defaultdict(list)
+    for sym in symbols:
+        if sym.kind == "class":
+            classes.append(sym)
+        elif sym.name.startswith('_'):
+            continue
+        elif sym.kind == "method":
+            methods[sym.parent].append(sym)
+        elif sym.kind == "function":
+            functions.append(sym)
+
+    parts = [f"### {file_path}\n\n"]
+    line_order = attrgetter("line_number")
+    for cls in sorted(classes, key=line_order):
+        doc_marker = "" if cls.docstring else " ❌"
+        parts.append(f"**class {cls.signature}**{doc_marker}\n")
+        if cls.docstring:
+            parts.append(f"  {cls.docstring}\n")
+        for method in sorted(methods.get(cls.name, ()), key=line_order):
+            doc_marker = "" if method.docstring else " ❌"
+            parts.append(f"  - {method.signature}{doc_marker}\n")
+            if method.docstring:
+                parts.append(f"      {method.docstring}\n")
+        parts.append("\n")
+
+    for func in sorted(functions, key=line_order):
+        doc_marker = "" if func.docstring else " ❌"
+        parts.append(f"**{func.signature}**{doc_marker}\n")
+        if func.docstring:
+            parts.append(f"  {func.docstring}\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+def write_repo_map(
+    out: TextIO, sections: Iterable[str], similar_classes: list, similar_functions: list, doc_coverage: dict,
+    root: Path, symbol_count: int,
+) -> None:
+    """
+    Stream the repo map with analysis to out, one section at a time.
+    The global sections are written from the analysis results; sections are
+    the per-file Code Structure fragments (see render_file_section()) in
+    path order, as SymbolCache.sections() yields them.
+    """
+    out.write(
+        "# Repository Map\n\n"
+        f"Generated from: {root}\n"
+        f"Total symbols: {symbol_count}\n\n"
+        "## Documentation Coverage\n\n"
+    )
     for kind in ["classes", "functions", "methods"]:
         stats = doc_coverage[kind]
         if stats["total"] > 0:
             pct = stats["documented"] / stats["total"] * 100
-            output.append(f"- **{kind.title()}**: {stats['documented']}/{stats['total']} ({pct:.0f}% documented)")
-    output.append("")
+            out.write(f"- **{kind.title()}**: {stats['documented']}/{stats['total']} ({pct:.0f}% documented)\n")
+    out.write("\n")
 
     if similar_classes:
-        output.extend(["## ⚠️ Potentially Similar Classes", "", "These classes may have overlapping responsibilities:", ""])
+        out.write("## ⚠️ Potentially Similar Classes\n\nThese classes may have overlapping responsibilities:\n\n")
         for cls1, cls2, reason in similar_classes:
-            output.extend([
-                f"- **{cls1.name}** ({cls1.file_path})",
-                f"  ↔ **{cls2.name}** ({cls2.file_path})",
-                f"  Reason: {reason}",
-            ])
+            out.write(
+                f"- **{cls1.name}** ({cls1.file_path})\n"
+                f"  ↔ **{cls2.name}** ({cls2.file_path})\n"
+                f"  Reason: {reason}\n"
+            )
             if cls1.docstring:
-                output.append(f"  Doc 1: {cls1.docstring}")
+                out.write(f"  Doc 1: {cls1.docstring}\n")
             if cls2.docstring:
-                output.append(f"  Doc 2: {cls2.docstring}")
-            output.append("")
+                out.write(f"  Doc 2: {cls2.docstring}\n")
+            out.write("\n")
 
     if similar_functions:
-        output.extend(["## ⚠️ Potentially Similar Functions", "", "These functions may be duplicates:", ""])
+        out.write("## ⚠️ Potentially Similar Functions\n\nThese functions may be duplicates:\n\n")
         for fn1, fn2, reason in similar_functions:
-            output.extend([
-                f"- **{fn1.name}** ({fn1.file_path}:{fn1.line_number})",
-                f"  ↔ **{fn2.name}** ({fn2.file_path}:{fn2.line_number})",
-                f"  Reason: {reason}",
-            ])
+            out.write(
+                f"- **{fn1.name}** ({fn1.file_path}:{fn1.line_number})\n"
+                f"  ↔ **{fn2.name}** ({fn2.file_path}:{fn2.line_number})\n"
+                f"  Reason: {reason}\n"
+            )
             if fn1.docstring:
-                output.append(f"  Doc 1: {fn1.docstring}")
+                out.write(f"  Doc 1: {fn1.docstring}\n")
             if fn2.docstring:
-                output.append(f"  Doc 2: {fn2.docstring}")
-            output.append("")
-
-    undoc_classes = doc_coverage["classes"]["undocumented"]
-    undoc_functions = doc_coverage["functions"]["undocumented"]
-    if undoc_classes or undoc_functions:
-        output.extend(["## 📝 Documentation Opportunities", "", "Adding docstrings helps both humans and AI understand your code:", ""])
-        if undoc_classes:
-            output.append("**Undocumented classes:**")
-            for sym in undoc_classes[:10]:
-                output.append(f"- {sym.name} ({sym.file_path}:{sym.line_number})")
-            if len(undoc_classes) > 10:
-                output.append(f"- ... and {len(undoc_classes) - 10} more")
-            output.append("")
-        if undoc_functions:
-            output.append("**Undocumented functions:**")
-            for sym in undoc_functions[:10]:
-                output.append(f"- {sym.name} ({sym.file_path}:{sym.line_number})")
-            if len(undoc_functions) > 10:
-                output.append(f"- ... and {len(undoc_functions) - 10} more")
-            output.append("")
-
-    output.extend(["## Code Structure", ""])
-
-    by_file: dict[str, list[Symbol]] = defaultdict(list)
-    for sym in symbols:
-        by_file[sym.file_path].append(sym)
-
-    for file_path in sorted(by_file.keys()):
-        file_symbols = by_file[file_path]
-        output.extend([f"### {file_path}", ""])
-
-        for cls in sorted([s for s in file_symbols if s.kind == "class"], key=lambda s: s.line_number):
-            doc_marker = "" if cls.docstring else " ❌"
-            output.append(f"**class {cls.signature}**{doc_marker}")
-            if cls.docstring:
-                output.append(f"  {cls.docstring}")
-            for method in sorted([s for s in file_symbols if s.kind == "method" and s.parent == cls.name], key=lambda s: s.line_number):
-                if method.name.startswith('_'):
-                    continue
-                doc_marker = "" if method.docstring else " ❌"
-                output.append(f"  - {method.signature}{doc_marker}")
-                if method.docstring:
-                    output.append(f"      {method.docstring}")
-            output.append("")
-
-        for func in sorted([s for s in file_symbols if s.kind == "function"], key=lambda s: s.line_number):
-            if func.name.startswith('_'):
-                continue
-            doc_marker = "" if func.docstring else " ❌"
-            output.append(f"**{func.signature}**{doc_marker}")
-            if func.docstring:
-                output.append(f"  {func.docstring}")
-            output.append("")
+                out.write(f"  Doc 2: {fn2.docstring}\n")
+            out.write("\n")
+
+    # Coverage keeps only the first few undocumented symbols; the rest are counted
+    gaps = [kind for kind in ("classes", "functions") if doc_coverage[kind]["undocumented"]]
+    if gaps:
+        out.write("## 📝 Documentation Opportunities\n\n"
+                  "Adding docstrings helps both humans and AI understand your code:\n\n")
+        for kind in gaps:
+            stats = doc_coverage[kind]
+            out.write(f"**Undocumented {kind}:**\n")
+            for sym in stats["undocumented"]:
+                out.write(f"- {sym.name} ({sym.file_path}:{sym.line_number})\n")
+            more = stats["total"] - stats["documented"] - len(stats["undocumented"])
+            if more > 0:
+                out.write(f"- ... and {more} more\n")
+            out.write("\n")
 
-    return "\n".join(output)
+    out.write("## Code Structure\n\n")
+    out.writelines(sections)
 
 
 EXCLUDE_DIRS = {
@@ -925,75 +2383,738 @@ EXCLUDE_DIRS = {
 }
 # Note: "vendor" is intentionally NOT excluded - we want to index vendored code
 
+# Source file extensions and their language (matched case-sensitively, like
+# the per-extension globs discovery used to run)
+LANGUAGE_EXTENSIONS = {
+    ".py": "python",
+    ".cpp": "cpp", ".cc": "cpp", ".cxx": "cpp", ".hpp": "cpp", ".h": "cpp", ".hxx": "cpp",
+    ".rs": "rust",
+}
+
 
-def find_files(root: Path, extensions: set[str]) -> list[Path]:
-    """Find all files with given extensions, excluding common non-source directories."""
+# Project-level ignore file (gitignore syntax) for paths that should stay out
+# of the repo map without being ignored by git
+PROJECT_IGNORE_FILE = ".repomapignore"
+
+
+def _gitignore_pattern_to_regex(line: str) -> tuple[str, bool] | None:
+    """
+    Translate one gitignore line into (regex, negated), or None if it's blank/a comment.
+
+    The regex matches paths relative to the ignore file's directory, with
+    directories given a trailing "/" so dir-only patterns ("build/") can be
+    told apart. It contains no capturing groups.
+    """
+    line = line.rstrip("\n\r")
+    if not line or line.startswith("#"):
+        return None
+    # Trailing spaces are ignored unless escaped
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # A slash anywhere but the end anchors the pattern to the ignore file's directory
+    anchored = "/" in line
+    line = line.lstrip("/")
+
+    out = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c == "*":
+            if line.startswith("**", i) and (i == 0 or line[i - 1] == "/"):
+                if line[i + 2:i + 3] == "/":
+                    out.append("(?:.*/)?")  # "**/": zero or more directories
+                    i += 3
+                    continue
+                if i + 2 == n:
+                    out.append(".+")  # trailing "/**": everything inside, not the directory itself
+                    i += 2
+                    continue
+            while i < n and line[i] == "*":
+                i += 1
+            out.append("[^/]*")
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and line[j] in "!^":
+                j += 1
+            if j < n and line[j] == "]":
+                j += 1
+            while j < n and line[j] != "]":
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))  # Unterminated class is a literal "["
+            else:
+                body = line[i + 1:j].replace("\\", "\\\\")
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(line[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/" if dir_only else "/?"
+    return prefix + "".join(out) + suffix, negated
+
+
+class IgnoreMatcher:
+    """
+    All gitignore patterns from one directory, compiled into a single regex.
+
+    Alternatives are added in reverse file order, so the first one to match
+    is the last matching pattern in the file - gitignore's "last match wins"
+    rule - and m.lastindex says whether it was a negation.
+    """
+
+    def __init__(self, lines: list[str]):
+        self.negated: list[bool] = []
+        alternatives = []
+        for line in reversed(lines):
+            translated = _gitignore_pattern_to_regex(line)
+            if translated is None:
+                continue
+            regex, negated = translated
+            alternatives.append(f"({regex})")
+            self.negated.append(negated)
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def match(self, rel_path: str, is_dir: bool) -> bool | None:
+        """Return True if ignored, False if re-included by "!", None if no pattern matches."""
+        if self.regex is None:
+            return None
+        m = self.regex.fullmatch(f"{rel_path}/" if is_dir else rel_path)
+        if m is None:
+            return None
+        return not self.negated[m.lastindex - 1]
+
+
+def _read_ignore_lines(path: Path) -> list[str]:
+    """Read an ignore file's lines, or [] if it can't be read."""
+    try:
+        return path.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+
+
+def _git_dir(root: Path) -> Path:
+    """Locate the git directory, following a worktree/submodule ".git" file."""
+    git_path = root / ".git"
+    if git_path.is_file():
+        for line in _read_ignore_lines(git_path):
+            if line.startswith("gitdir:"):
+                return (root / line[len("gitdir:"):].strip()).resolve()
+    return git_path
+
+
+def load_root_ignore_matcher(root: Path) -> IgnoreMatcher:
+    """
+    Compile the root-level ignore sources into one matcher, lowest precedence
+    first: .git/info/exclude, then .gitignore, then PROJECT_IGNORE_FILE.
+    Works without git installed and in directories that aren't repositories.
+    """
+    lines = _read_ignore_lines(_git_dir(root) / "info" / "exclude")
+    lines += _read_ignore_lines(root / ".gitignore")
+    lines += _read_ignore_lines(root / PROJECT_IGNORE_FILE)
+    return IgnoreMatcher(lines)
+
+
+def _is_ignored(matchers: tuple[tuple[str, IgnoreMatcher], ...], rel_path: str, is_dir: bool) -> bool:
+    """Check a path against the active matchers, deepest .gitignore first."""
+    for base, matcher in reversed(matchers):
+        result = matcher.match(rel_path[len(base):], is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def _matchers_for(root: Path, rel_dir: str,
+                  respect_ignore_files: bool = True) -> tuple[tuple[str, IgnoreMatcher], ...] | None:
+    """
+    The ignore matchers that apply to rel_dir's entries ("" for root, else with
+    a trailing "/"), as a walk from root would have collected them; None if
+    rel_dir is excluded, ignored or not a real directory, so a walk would
+    never reach it.
+    """
+    matchers: tuple[tuple[str, IgnoreMatcher], ...] = ()
+    if respect_ignore_files:
+        matchers = (("", load_root_ignore_matcher(root)),)
+    path = ""
+    for name in rel_dir.split("/")[:-1]:
+        path += name
+        try:
+            if not stat.S_ISDIR(os.lstat(root / path).st_mode):
+                return None
+        except OSError:
+            return None
+        if name in EXCLUDE_DIRS or _is_ignored(matchers, path, True):
+            return None
+        path += "/"
+        if respect_ignore_files and (root / path / ".gitignore").is_file():
+            matchers = matchers + ((path, IgnoreMatcher(_read_ignore_lines(root / path / ".gitignore"))),)
+    return matchers
+
+
+def walk_source_tree(root: Path, respect_ignore_files: bool = True,
+                     start: str = "") -> Iterator[tuple[str, int, list[str], list[os.DirEntry], tuple]]:
+    """
+    Walk the directories discovery descends into, from rel_dir start (""
+    for root, else with a trailing "/"), yielding (rel_dir, its mtime_ns
+    from just before it was listed, the subdirectories walked next, entries
+    that aren't directories, active ignore matchers) for each.
+
+    Excluded directories - EXCLUDE_DIRS plus anything matched by .gitignore
+    files, .git/info/exclude or PROJECT_IGNORE_FILE - are pruned before
+    descending, and symlinked directories are not followed.
+    """
+    matchers = _matchers_for(root, start, respect_ignore_files)
+    if matchers is None:
+        return
+    # (rel_dir with trailing "/", abs_dir, active ignore matchers)
+    stack = [(start, str(root / start) if start else str(root), matchers)]
+
+    while stack:
+        rel_dir, abs_dir, matchers = stack.pop()
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+            with os.scandir(abs_dir) as it:
+                entries = list(it)
+        except OSError:
+            continue  # Unreadable or vanished directory
+
+        # Nested .gitignore applies to this directory and everything below it
+        # (start's own is already in the matchers)
+        if respect_ignore_files and rel_dir != start and any(e.name == ".gitignore" for e in entries):
+            lines = _read_ignore_lines(Path(abs_dir) / ".gitignore")
+            matchers = matchers + ((rel_dir, IgnoreMatcher(lines)),)
+
+        subdirs = []
+        others = []
+        for entry in entries:
+            name = entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in EXCLUDE_DIRS and not _is_ignored(matchers, rel_dir + name, True):
+                        subdirs.append(f"{rel_dir}{name}/")
+                        stack.append((subdirs[-1], entry.path, matchers))
+                    continue
+            except OSError:
+                continue  # Vanished
+            others.append(entry)
+        yield rel_dir, mtime_ns, subdirs, others, matchers
+
+
+def _source_file(entry: os.DirEntry, rel_dir: str, matchers: tuple) -> SourceFile | None:
+    """The SourceFile for a walked directory entry, or None if discovery skips it."""
+    name = entry.name
+    language = LANGUAGE_EXTENSIONS.get(os.path.splitext(name)[1])
+    if language is None or _is_ignored(matchers, rel_dir + name, False):
+        return None
+    try:
+        st = entry.stat()
+    except OSError:
+        return None  # Vanished or dangling symlink
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return SourceFile(
+        path=Path(entry.path),
+        rel_path=rel_dir + name,
+        language=language,
+        size=st.st_size,
+        mtime_ns=st.st_mtime_ns,
+        inode=st.st_ino,
+        ctime_ns=st.st_ctime_ns,
+    )
+
+
+def discover_source_files(root: Path, respect_ignore_files: bool = True, start: str = "",
+                          dirs: dict[str, tuple[int, list[str]]] | None = None) -> list[SourceFile]:
+    """
+    Find all source files in a single pass over the tree (or the part of it
+    under rel_dir start), pruned as described in walk_source_tree().
+
+    Each file's stat result is captured once so later stages never need to
+    stat it again. Returns files sorted by relative path. If dirs is given,
+    each directory walked is added to it as rel_dir -> (mtime_ns, names of
+    the source files in it), for summarize_dirs().
+    """
     files = []
-    for ext in extensions:
-        for path in root.rglob(f"*{ext}"):
-            if not any(ex in path.parts for ex in EXCLUDE_DIRS):
-                files.append(path)
-    return sorted(files)
+    for rel_dir, mtime_ns, _, entries, matchers in walk_source_tree(root, respect_ignore_files, start):
+        found = [source for source in (_source_file(entry, rel_dir, matchers) for entry in entries) if source]
+        files.extend(found)
+        if dirs is not None:
+            dirs[rel_dir] = (mtime_ns, sorted(source.rel_path[len(rel_dir):] for source in found))
+
+    files.sort(key=lambda f: f.rel_path)
+    return files
+
 
+def needs_full_discovery(changed: Iterable[str]) -> bool:
+    """Whether changed paths (see rediscover_source_files()) can change what every directory holds."""
+    return any(rel_path.strip("/") == "" or os.path.basename(rel_path.rstrip("/")) in (".gitignore", PROJECT_IGNORE_FILE)
+               for rel_path in changed)
 
-def find_python_files(root: Path) -> list[Path]:
-    """Find all Python files."""
-    return find_files(root, {".py"})
 
+def rediscover_source_files(root: Path, cached: dict[str, FileCache], changed: Iterable[str],
+                            dirs: dict[str, tuple[int, list[str]]] | None = None) -> list[SourceFile]:
+    """
+    The current source files, given the cached ones and the paths (files or
+    directories, relative to root) changed since, as a file watcher reports
+    them - without walking the whole tree. Cached files keep their cached
+    fingerprints, so only the changed ones are parsed again; changed files
+    are stat'ed and changed directories walked again. A changed ignore file
+    means a full discovery (see needs_full_discovery()). Directories walked
+    are added to dirs as in discover_source_files().
+    """
+    changed = {rel_path.strip("/") for rel_path in changed}
+    if needs_full_discovery(changed):
+        return discover_source_files(root, dirs=dirs)
 
-def find_cpp_files(root: Path) -> list[Path]:
-    """Find all C++ files."""
-    return find_files(root, {".cpp", ".cc", ".cxx", ".hpp", ".h", ".hxx"})
+    files = {}
+    for rel_path, entry in cached.items():
+        language = LANGUAGE_EXTENSIONS.get(os.path.splitext(rel_path)[1])
+        if language is not None and not is_under(rel_path, changed):
+            size, mtime_ns, inode, ctime_ns = entry.fingerprint
+            files[rel_path] = SourceFile(root / rel_path, rel_path, language, size, mtime_ns, inode, ctime_ns)
+    files.update(discover_changed_files(root, changed, dirs))
+    return sorted(files.values(), key=lambda f: f.rel_path)
 
 
-def find_rust_files(root: Path) -> list[Path]:
-    """Find all Rust files."""
-    return find_files(root, {".rs"})
+def is_under(rel_path: str, prefixes: Collection[str]) -> bool:
+    """Whether rel_path is one of the paths in prefixes or inside one of them."""
+    return any(rel_path == prefix or rel_path.startswith(f"{prefix}/") for prefix in prefixes)
 
 
-def extract_with_cache(
-    file_path: Path,
-    root: Path,
-    cache: SymbolCache,
-    extractor: callable,
-) -> tuple[list[Symbol], bool]:
+def discover_changed_files(root: Path, changed: Iterable[str],
+                           dirs: dict[str, tuple[int, list[str]]] | None = None) -> dict[str, SourceFile]:
     """
-    Extract symbols from a file, using cache if available.
-    Returns (symbols, was_cached).
+    The source files discovery would find at or under the given paths
+    (relative to root, without trailing "/"), by rel_path: files are stat'ed
+    and directories walked. Ignored and deleted paths yield nothing.
+    """
+    files = {}
+    for rel_path in sorted(changed):
+        path = root / rel_path
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue  # Deleted
+        if stat.S_ISDIR(st.st_mode):
+            files.update((f.rel_path, f) for f in discover_source_files(root, start=f"{rel_path}/", dirs=dirs))
+            continue
+        rel_dir, name = os.path.split(rel_path)
+        language = LANGUAGE_EXTENSIONS.get(os.path.splitext(name)[1])
+        matchers = _matchers_for(root, f"{rel_dir}/" if rel_dir else "") if language else None
+        if matchers is None or _is_ignored(matchers, rel_path, False):
+            continue
+        try:
+            st = path.stat()  # Symlinks to files are indexed, as in discovery
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            files[rel_path] = SourceFile(path, rel_path, language, st.st_size, st.st_mtime_ns, st.st_ino,
+                                         st.st_ctime_ns)
+    return files
+
+
+def _ignore_file_paths(root: Path, rel_dir: str) -> list[str]:
+    """The ignore files that decide what discovery finds in rel_dir, whether they exist or not."""
+    if rel_dir:
+        return [f"{root}/{rel_dir}.gitignore"]
+    return [str(_git_dir(root) / "info" / "exclude"), f"{root}/.gitignore", f"{root}/{PROJECT_IGNORE_FILE}"]
+
+
+def _stat_fingerprint(path: str) -> tuple[int, int, int, int] | None:
+    """A path's fingerprint as in SourceFile.fingerprint, or None if it can't be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+
+
+def dir_digest(root: Path, rel_dir: str, names: list[str], fingerprints: Iterable[tuple | None]) -> str:
+    """Digest of a directory's source file names and fingerprints and its ignore files' fingerprints."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, fingerprint in zip(names, fingerprints):
+        digest.update(f"{name}\0{fingerprint}\n".encode())
+    for path in _ignore_file_paths(root, rel_dir):
+        digest.update(f"{_stat_fingerprint(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def summarize_dirs(root: Path, dirs: dict[str, tuple[int, list[str]]],
+                   files: dict[str, SourceFile]) -> list[tuple[str, int, str, str]]:
     """
-    rel_path = str(file_path.relative_to(root))
+    Rows of the dirs table (see ensure_schema()) for directories collected
+    by discover_source_files(), given the discovered files by rel_path.
+    An mtime within RACY_MTIME_NS of now is stored as 0, never to be trusted.
+    """
+    racy = time.time_ns() - RACY_MTIME_NS
+    rows = []
+    for rel_dir, (mtime_ns, names) in dirs.items():
+        fingerprints = [files[rel_dir + name].fingerprint for name in names]
+        rows.append((rel_dir, mtime_ns if mtime_ns < racy else 0, "\n".join(names),
+                     dir_digest(root, rel_dir, names, fingerprints)))
+    return rows
+
 
+def find_tree_changes(root: Path, db_path: Path) -> str | None:
+    """
+    Compare root with the directory summary stored by the last index, and
+    return why it is stale - a directory whose files or subdirectories
+    changed, or a source or ignore file that changed - or None if discovery
+    would find exactly the files that were indexed, unchanged.
+
+    Exact, but without listing the tree: editing a file in place doesn't
+    touch its directory's mtime, so every known file is stat'ed, but only
+    directories whose mtime changed are listed again and matched against
+    the ignore rules, to find added, removed and newly ignored entries.
+    """
+    try:
+        conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True, timeout=5.0)
+        try:
+            if get_metadata(conn, 'dir_summary') != 'complete':
+                return "no directory summary"
+            rows = conn.execute("SELECT path, mtime_ns, names, digest FROM dirs").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return "no directory summary"
+
+    subdirs = None  # rel_dir -> stored subdirectories, built on the first listing
+    for rel_dir, mtime_ns, names, digest in rows:
+        abs_dir = f"{root}/{rel_dir}"
+        try:
+            dir_mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            return f"directory removed: {rel_dir or '.'}"
+        names = names.split("\n") if names else []
+        if dir_mtime_ns != mtime_ns:
+            if subdirs is None:
+                subdirs = defaultdict(list)
+                for (path, *_) in rows:
+                    if path:
+                        subdirs[path[:path.rfind("/", 0, -1) + 1]].append(path)
+            listing = None
+            for _, _, walked, entries, matchers in walk_source_tree(root, start=rel_dir):
+                found = (_source_file(entry, rel_dir, matchers) for entry in entries)
+                listing = (sorted(source.rel_path[len(rel_dir):] for source in found if source), sorted(walked))
+                break
+            if listing != (names, sorted(subdirs[rel_dir])):
+                return f"files added or removed in {rel_dir or '.'}"
+        fingerprints = (_stat_fingerprint(abs_dir + name) for name in names)
+        if dir_digest(root, rel_dir, names, fingerprints) != digest:
+            return f"files modified in {rel_dir or '.'}"
+    return None
+
+
+# inotify(7) constants, for TreeWatcher
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+IN_ONLYDIR, IN_DONT_FOLLOW, IN_EXCL_UNLINK = 0x1000000, 0x2000000, 0x4000000
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of NUL-padded name
+
+
+class TreeWatcher:
+    """
+    Collects the paths that change under a project root with inotify (Linux),
+    watching every directory discovery descends into, so a reindex can be
+    handed just those paths (see rediscover_source_files()).
+
+    A changed ignore file is reported as a path (see needs_full_discovery())
+    and the watches below it follow what discovery walks now. A changed
+    .git/info/exclude asks for a full rescan; that directory is only
+    watched if it exists when the watcher starts.
+
+    start() returns False if inotify is unavailable or the watch limit
+    (fs.inotify.max_user_watches) is reached; the watcher is also marked
+    failed if the limit is reached later on, as new directories appear.
+    Either way callers should fall back to polling for staleness.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.failed = False
+        self._fd = -1
+        self._dirs: dict[int, str] = {}  # wd -> rel_dir with trailing "/" ("" for root)
+        self._exclude_wd = -1  # Watch of the directory holding .git/info/exclude
+        self._changed: set[str] = set()
+        self._rescan = False
+        self._lock = threading.Lock()
+        self._stop_read = self._stop_write = -1  # Wakes the reader thread to stop
+
+    def start(self) -> bool:
+        """Watch the tree and start collecting changes in a background thread."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            self._fd = libc.inotify_init1(IN_CLOEXEC)
+        except (AttributeError, OSError):
+            self._fd = -1  # Not Linux
+        if self._fd < 0:
+            self.failed = True
+            return False
+        self._watch_tree("")
+        if self.failed:
+            os.close(self._fd)
+            return False
+        info_dir = _git_dir(self.root) / "info"
+        if info_dir.is_dir():
+            self._exclude_wd = self._add_watch(self._fd, os.fsencode(info_dir), WATCH_MASK)
+        self._stop_read, self._stop_write = os.pipe()
+        threading.Thread(target=self._read_events, daemon=True).start()
+        return True
+
+    def take_changes(self) -> set[str] | None:
+        """The rel paths changed since the last call; None if only a full rescan will do."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            rescan, self._rescan = self._rescan, False
+        return None if rescan else changed
+
+    def add_changes(self, changed: set[str] | None) -> None:
+        """Put back changes that couldn't be handed on (None: ask for a full rescan)."""
+        with self._lock:
+            if changed is None:
+                self._rescan = True
+            else:
+                self._changed |= changed
+
+    def close(self) -> None:
+        """Stop watching; the reader thread closes the descriptors."""
+        with self._lock:
+            if self._stop_write >= 0:
+                os.write(self._stop_write, b"x")
+
+    def _watch_tree(self, start: str) -> set[str]:
+        """
+        Add watches for start (rel_dir with trailing "/") and every directory
+        discovery would walk below it. Returns the directories walked (none
+        if discovery wouldn't walk start at all).
+        """
+        walked = set()
+        for rel_dir, *_ in walk_source_tree(self.root, start=start):
+            walked.add(rel_dir)
+            wd = self._add_watch(self._fd, os.fsencode(self.root / rel_dir), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = rel_dir
+            elif ctypes.get_errno() == errno.ENOSPC:
+                self.failed = True  # Out of watches
+                break
+        return walked
+
+    def _rewatch_tree(self, start: str) -> None:
+        """After an ignore file in start changed: watch the directories discovery walks below it now, and only those."""
+        walked = self._watch_tree(start)
+        for wd, watched in list(self._dirs.items()):
+            if watched.startswith(start) and watched not in walked:
+                self._rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def _unwatch_tree(self, rel_dir: str) -> bool:
+        """Drop the watches under a directory that moved away (their paths are stale). Returns whether any were."""
+        stale = [wd for wd, watched in self._dirs.items() if watched.startswith(rel_dir)]
+        for wd in stale:
+            self._rm_watch(self._fd, wd)
+            del self._dirs[wd]
+        return bool(stale)
+
+    def _read_events(self) -> None:
+        """Turn inotify events into changed paths until closed."""
+        try:
+            while not self.failed:
+                ready, _, _ = select.select([self._fd, self._stop_read], [], [])
+                if self._stop_read in ready:
+                    break
+                data = os.read(self._fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                    name = os.fsdecode(data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0"))
+                    offset += INOTIFY_EVENT.size + length
+                    self._handle_event(wd, mask, name)
+        finally:
+            with self._lock:
+                for fd in (self._fd, self._stop_read, self._stop_write):
+                    os.close(fd)
+                self._stop_write = -1
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        """Record what one event changed."""
+        if mask & IN_Q_OVERFLOW:
+            self.add_changes(None)  # Events were lost
+            return
+        if wd == self._exclude_wd:
+            if name == "exclude":
+                self._rewatch_tree("")
+                self.add_changes(None)
+            return
+        rel_dir = self._dirs.get(wd)
+        if rel_dir is None:
+            return
+        if mask & IN_IGNORED:
+            del self._dirs[wd]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if not rel_dir:
+                self.add_changes(None)  # The root itself went away
+            return  # Otherwise reported by the parent, too
+        rel_path = rel_dir + name
+        if mask & IN_ISDIR:
+            # Only directories discovery walks (or walked) count as changed
+            if mask & IN_MOVED_FROM:
+                if not self._unwatch_tree(f"{rel_path}/"):
+                    return
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                if not self._watch_tree(f"{rel_path}/"):
+                    return
+            elif name in EXCLUDE_DIRS:
+                return
+        elif name in (".gitignore", PROJECT_IGNORE_FILE):
+            if name == ".gitignore" or not rel_dir:  # PROJECT_IGNORE_FILE only counts at the root
+                self._rewatch_tree(rel_dir)
+        elif LANGUAGE_EXTENSIONS.get(os.path.splitext(name)[1]) is None:
+            return
+        self.add_changes({rel_path})
+
+
+def find_files(root: Path, extensions: set[str]) -> list[Path]:
+    """Find all files with given extensions, excluding common non-source directories."""
+    return [f.path for f in discover_source_files(root) if f.path.suffix in extensions]
+
+
+def extract_with_cache(source: SourceFile, cache: SymbolCache) -> tuple[list[Symbol], bool]:
+    """
+    Extract symbols from a file, using cache if available.
+    The file is read at most once. Returns (symbols, was_cached).
+    """
     # Try cache first
-    symbols, was_cached = cache.get_symbols(file_path, rel_path)
+    symbols, was_cached = cache.get_symbols(source)
     if was_cached:
         return symbols, True
 
-    # Need to parse - extract symbols
-    symbols = extractor(file_path, root)
-
-    # Update cache
     try:
-        mtime = file_path.stat().st_mtime
-        content_hash = compute_file_hash(file_path)
-        cache.update(rel_path, mtime, content_hash, symbols)
+        content_hash, symbols, texts = extract_file(
+            source.path, source.rel_path, source.language, source.size,
+            cache.known_hash(source.rel_path),
+        )
     except IOError:
-        pass
+        return [], False
 
+    if symbols is None:  # Touched but unchanged
+        cache.touch(source.rel_path, source.fingerprint)
+        return cache.load_symbols(source.rel_path), True
+    cache.update(source.rel_path, source.fingerprint, content_hash, symbols, texts)
     return symbols, False
 
 
-def main():
-    root = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else Path.cwd()
+def parse_worker_args(source: SourceFile, cache: SymbolCache) -> tuple:
+    """The parse_file_worker() argument tuple for a source file."""
+    return (str(source.path), source.rel_path, source.language, source.fingerprint, cache.known_hash(source.rel_path))
+
+
+def submit_if_cached(cache: SymbolCache, writer: SymbolWriter, source: SourceFile) -> bool:
+    """Submit a file from the cache if it is fresh there; returns whether it was."""
+    if not cache.is_fresh(source):
+        return False
+    entry = cache.files[source.rel_path]
+    # Cached rows are only loaded if the database is missing them
+    symbols, texts = (cache.load(source.rel_path)
+                      if writer.needs_symbols(source.rel_path, entry.content_hash) else (None, None))
+    writer.submit(source.rel_path, entry.fingerprint, entry.content_hash, symbols, texts)
+    return True
+
+
+def record_parse_result(cache: SymbolCache, writer: SymbolWriter, rel_path: str, fingerprint: tuple | None,
+                        content_hash: str, symbols: list[Symbol] | None, texts: list[TextElement] | None) -> int:
+    """Record one parse_file_worker() result in the cache and submit it. Returns the number of symbols parsed."""
+    if fingerprint is None:  # Unreadable - drop any stale entry so its symbols leave the database
+        cache.remove(rel_path)
+        return 0
+    parsed = 0
+    if symbols is None:  # Touched but unchanged - no parse was needed
+        cache.touch(rel_path, fingerprint)
+        if writer.needs_symbols(rel_path, content_hash):
+            symbols, texts = cache.load(rel_path)
+    else:
+        cache.update(rel_path, fingerprint, content_hash, symbols, texts)
+        parsed = len(symbols)
+    writer.submit(rel_path, fingerprint, content_hash, symbols, texts)
+    return parsed
 
-    # Parse command line options
+
+def parse_options(args: list[str]) -> tuple[int, str, str, str]:
+    """
+    Parse --workers, --engine, --doc-similarity and --similar-candidates into
+    (workers_percent, engine, doc_similarity, similar_candidates).
+    """
     workers_percent = DEFAULT_WORKERS_PERCENT
-    for arg in sys.argv[2:]:
+    engine = DEFAULT_ENGINE
+    doc_similarity = DEFAULT_DOC_SIMILARITY
+    similar_candidates = DEFAULT_SIMILAR_CANDIDATES
+    for arg in args:
         if arg.startswith("--workers="):
             try:
                 workers_percent = int(arg.split("=")[1])
             except ValueError:
                 pass
+        elif arg.startswith("--engine="):
+            value = arg.split("=")[1]
+            if value in PARSE_ENGINES:
+                engine = value
+            else:
+                print(f"Unknown engine '{value}', using {engine} (choices: {', '.join(PARSE_ENGINES)})")
+        elif arg.startswith("--doc-similarity="):
+            value = arg.split("=")[1]
+            if value not in DOC_SIMILARITY_ENGINES:
+                print(f"Unknown docstring similarity '{value}', using {doc_similarity} "
+                      f"(choices: {', '.join(DOC_SIMILARITY_ENGINES)})")
+            elif value == "tfidf" and np is None:
+                print(f"--doc-similarity=tfidf needs NumPy (uv run --with numpy ...), using {doc_similarity}")
+            else:
+                doc_similarity = value
+        elif arg.startswith("--similar-candidates="):
+            value = arg.split("=")[1]
+            if value in SIMILAR_CANDIDATE_FILTERS:
+                similar_candidates = value
+            else:
+                print(f"Unknown similar candidate filter '{value}', using {similar_candidates} "
+                      f"(choices: {', '.join(SIMILAR_CANDIDATE_FILTERS)})")
+    return workers_percent, engine, doc_similarity, similar_candidates
+
 
+def index_repo(
+    root: Path, workers_percent: int = DEFAULT_WORKERS_PERCENT, engine: str = DEFAULT_ENGINE,
+    doc_similarity: str = DEFAULT_DOC_SIMILARITY, similar_candidates: str = DEFAULT_SIMILAR_CANDIDATES,
+    cache: SymbolCache | None = None, paths: Iterable[str] | None = None,
+) -> None:
+    """
+    Index root: parse changed files, update the database and write repo-map.md.
+    A warm cache (see serve_worker()) is used and left open if passed; otherwise
+    the cache is opened and closed here. If paths lists everything changed
+    since the last run (see rediscover_source_files()), only those are
+    checked instead of the whole tree.
+    """
     # Ensure .claude directory exists and set indexing status
     claude_dir = root / ".claude"
     claude_dir.mkdir(exist_ok=True)
@@ -1003,6 +3124,7 @@ def main():
     # SQLite with WAL mode + transactions handles concurrent access
     # - Multiple readers can read while one writer writes
     # - SQLite's built-in locking prevents concurrent writers
+    dir_summary = False
     if db_path.exists():
         # Update existing DB
         conn = sqlite3.connect(db_path)
@@ -1013,59 +3135,72 @@ def main():
             )
         """)
         set_metadata(conn, 'status', 'indexing')
-        set_metadata(conn, 'db_version', str(DB_VERSION))
         set_metadata(conn, 'index_start_time', datetime.now().isoformat())
         conn.commit()  # Must commit since set_metadata no longer commits
+        dir_summary = get_metadata(conn, 'dir_summary') == 'complete'
         conn.close()
 
+    writer = None
+    owns_cache = cache is None
     try:
-        # Find all source files
-        python_files = find_python_files(root)
-        cpp_files = find_cpp_files(root)
-        rust_files = find_rust_files(root)
+        # Load symbol cache, or bring a warm one up to date with the disk
+        if owns_cache:
+            cache = SymbolCache(claude_dir / "repo-map-cache.db")
+        else:
+            cache.refresh()
+        (claude_dir / "repo-map-cache.json").unlink(missing_ok=True)  # Pre-SQLite cache
+
+        # Find all source files in one pass over the tree, or from the cache
+        # and the paths known to have changed. The directories walked are
+        # summarized for find_tree_changes(); a partial summary can only be
+        # updated, so the first index after an upgrade walks the whole tree
+        dirs: dict[str, tuple[int, list[str]]] = {}
+        if paths is not None and cache.files and dir_summary:
+            paths = {rel_path.strip("/") for rel_path in paths}
+            source_files = rediscover_source_files(root, cache.files, paths, dirs)
+            full_walk = needs_full_discovery(paths)
+        else:
+            source_files = discover_source_files(root, dirs=dirs)
+            full_walk = True
+        language_counts: dict[str, int] = defaultdict(int)
+        for source in source_files:
+            language_counts[source.language] += 1
 
-        total_files = len(python_files) + len(cpp_files) + len(rust_files)
+        total_files = len(source_files)
         if total_files == 0:
             print(f"No source files found in {root}")
+            if owns_cache:
+                cache.close()
             return
 
-        # Load symbol cache
-        cache = SymbolCache(claude_dir / "repo-map-cache.json")
+        # Parse results stream into the database as they arrive; symbols are
+        # never accumulated for the whole repo
+        writer = SymbolWriter(db_path)
+        symbols_parsed = 0
+
+        files_by_path = {source.rel_path: source for source in source_files}
+        if full_walk:
+            writer.update_dirs(summarize_dirs(root, dirs, files_by_path), complete=True)
+        else:
+            # Directories holding changed paths weren't listed: their files
+            # are updated and their mtimes cleared, so they are listed when checked
+            parents = {rel_path[:rel_path.rfind("/") + 1]: (0, []) for rel_path in paths}
+            for source in source_files:
+                rel_dir = source.rel_path[:source.rel_path.rfind("/") + 1]
+                if rel_dir in parents:
+                    parents[rel_dir][1].append(source.rel_path[len(rel_dir):])
+            writer.update_dirs(summarize_dirs(root, dirs, files_by_path), complete=False,
+                               dropped=[f"{rel_path}/" for rel_path in paths],
+                               refreshed=summarize_dirs(root, parents, files_by_path))
 
         # First pass: check cache and categorize files
-        all_symbols = []
         all_rel_paths = set()
-        files_to_parse = []  # (file_path_str, root_str, language)
-
-        # Check Python files
-        for file_path in python_files:
-            rel_path = str(file_path.relative_to(root))
-            all_rel_paths.add(rel_path)
-            symbols, was_cached = cache.get_symbols(file_path, rel_path)
-            if was_cached:
-                all_symbols.extend(symbols)
-            else:
-                files_to_parse.append((str(file_path), str(root), "python"))
-
-        # Check C++ files
-        for file_path in cpp_files:
-            rel_path = str(file_path.relative_to(root))
-            all_rel_paths.add(rel_path)
-            symbols, was_cached = cache.get_symbols(file_path, rel_path)
-            if was_cached:
-                all_symbols.extend(symbols)
-            else:
-                files_to_parse.append((str(file_path), str(root), "cpp"))
-
-        # Check Rust files
-        for file_path in rust_files:
-            rel_path = str(file_path.relative_to(root))
-            all_rel_paths.add(rel_path)
-            symbols, was_cached = cache.get_symbols(file_path, rel_path)
-            if was_cached:
-                all_symbols.extend(symbols)
-            else:
-                files_to_parse.append((str(file_path), str(root), "rust"))
+        files_to_parse = []  # parse_file_worker() argument tuples
+
+        for source in source_files:
+            all_rel_paths.add(source.rel_path)
+            if not submit_if_cached(cache, writer, source):
+                files_to_parse.append(parse_worker_args(source, cache))
 
         cached_count = total_files - len(files_to_parse)
         parsed_count = len(files_to_parse)
@@ -1089,18 +3224,48 @@ def main():
             except IOError:
                 pass
 
+        def handle_result(*result):
+            """Record one parse result in the cache and stream it to the database."""
+            nonlocal symbols_parsed
+            symbols_parsed += record_parse_result(cache, writer, *result)
+
         # Parallel parse uncached files
         if files_to_parse:
-            num_workers = get_worker_count(workers_percent)
+            # Processes aren't limited by the GIL, so only threads are capped
+            cap = MAX_WORKERS if engine == "threads" else None
+            num_workers = get_worker_count(workers_percent, cap)
             # Use at most as many workers as files to parse
             num_workers = min(num_workers, len(files_to_parse))
 
-            update_progress("parsing", 0, len(files_to_parse), len(all_symbols))
+            update_progress("parsing", 0, len(files_to_parse), symbols_parsed)
 
             # Calculate update interval for ~10% progress updates
             update_interval = max(1, len(files_to_parse) // 20)  # Update ~20 times = every 5%
 
-            if num_workers > 1 and len(files_to_parse) > 10:
+            if engine == "processes" and num_workers > 1 and len(files_to_parse) > PROCESS_BATCH_SIZE:
+                # Parallel parsing with worker processes, in batches
+                batches = [files_to_parse[i:i + PROCESS_BATCH_SIZE]
+                           for i in range(0, len(files_to_parse), PROCESS_BATCH_SIZE)]
+                num_workers = min(num_workers, len(batches))
+                print(f"Parsing {len(files_to_parse)} files with {num_workers} processes...")
+                completed = 0
+                next_update = update_interval
+                with Pool(processes=num_workers, maxtasksperchild=PROCESS_MAX_TASKS_PER_CHILD) as pool:
+                    for batch_results in pool.imap_unordered(parse_batch_worker, batches):
+                        for rel_path, fingerprint, content_hash, symbol_tuples, text_tuples in batch_results:
+                            if symbol_tuples is None:
+                                symbols = texts = None
+                            else:
+                                symbols = [Symbol.from_tuple(t, rel_path) for t in symbol_tuples]
+                                texts = [TextElement.from_tuple(t, rel_path) for t in text_tuples]
+                            handle_result(rel_path, fingerprint, content_hash, symbols, texts)
+                        completed += len(batch_results)
+                        if completed >= next_update or completed == len(files_to_parse):
+                            next_update = completed + update_interval
+                            cache.save_if_needed()
+                            update_progress("parsing", completed, len(files_to_parse), symbols_parsed)
+                            print(f"  Parsed {completed}/{len(files_to_parse)} files...")
+            elif num_workers > 1 and len(files_to_parse) > 10:
                 # Parallel parsing with threads (shares memory, safe for large codebases)
                 print(f"Parsing {len(files_to_parse)} files with {num_workers} threads...")
                 with ThreadPoolExecutor(max_workers=num_workers) as executor:
@@ -1108,31 +3273,24 @@ def main():
                     completed = 0
                     for future in as_completed(futures):
                         try:
-                            rel_path, mtime, content_hash, symbol_dicts, lang = future.result()
-                            symbols = [Symbol.from_dict(d) for d in symbol_dicts]
-                            all_symbols.extend(symbols)
-                            if mtime > 0:  # Valid result
-                                cache.update(rel_path, mtime, content_hash, symbols)
+                            handle_result(*future.result())
                             completed += 1
                             if completed % update_interval == 0 or completed == len(files_to_parse):
                                 cache.save_if_needed()
-                                update_progress("parsing", completed, len(files_to_parse), len(all_symbols))
+                                update_progress("parsing", completed, len(files_to_parse), symbols_parsed)
                                 print(f"  Parsed {completed}/{len(files_to_parse)} files...")
                         except Exception as e:
                             print(f"  Error parsing file: {e}")
+                            cache.remove(futures[future][1])
             else:
                 # Sequential parsing for small number of files
                 completed = 0
                 for args in files_to_parse:
-                    rel_path, mtime, content_hash, symbol_dicts, lang = parse_file_worker(args)
-                    symbols = [Symbol.from_dict(d) for d in symbol_dicts]
-                    all_symbols.extend(symbols)
-                    if mtime > 0:
-                        cache.update(rel_path, mtime, content_hash, symbols)
+                    handle_result(*parse_file_worker(args))
                     cache.save_if_needed()
                     completed += 1
                     if completed % update_interval == 0 or completed == len(files_to_parse):
-                        update_progress("parsing", completed, len(files_to_parse), len(all_symbols))
+                        update_progress("parsing", completed, len(files_to_parse), symbols_parsed)
 
         # Remove deleted files from cache
         cache.remove_stale(all_rel_paths)
@@ -1140,22 +3298,29 @@ def main():
         # Save final cache state
         cache.save()
 
-        # Write to SQLite database for MCP server queries
-        write_symbols_to_sqlite(all_symbols, db_path)
-
-        similar_classes = find_similar_classes(all_symbols)
-        similar_functions = find_similar_functions(all_symbols)
-        doc_coverage = analyze_documentation_coverage(all_symbols)
+        # Commit the database; only changed files were written
+        db_written, db_removed = writer.finish()
 
-        repo_map = format_repo_map(all_symbols, similar_classes, similar_functions, doc_coverage, root)
+        # Analysis passes read back from SQLite rather than from memory; similar
+        # pairs are stored there and only recomputed for changed files
+        similarity_files = update_similar_pairs(db_path, doc_similarity, similar_candidates)
+        similar_classes = read_similar_pairs(db_path, "class")
+        similar_functions = read_similar_pairs(db_path, "function")
+        doc_coverage = cache.documentation_coverage()
+        symbol_count = count_symbols(db_path)
 
         claude_dir.mkdir(exist_ok=True)
 
-        # Write to .in-progress first, then rename atomically
+        # Stream to .in-progress first, then rename atomically. Per-file sections
+        # come from the cache, rendered when each file was last parsed
         in_progress_path = claude_dir / "repo-map.md.in-progress"
         final_path = claude_dir / "repo-map.md"
-        in_progress_path.write_text(repo_map)
+        with open(in_progress_path, "w", encoding="utf-8", buffering=REPO_MAP_BUFFER_SIZE) as out:
+            write_repo_map(out, cache.sections(), similar_classes, similar_functions, doc_coverage, root,
+                           symbol_count)
         in_progress_path.rename(final_path)
+        if owns_cache:
+            cache.close()
 
         # Write final progress status
         progress_path = claude_dir / "repo-map-progress.json"
@@ -1165,27 +3330,27 @@ def main():
             "files_cached": cached_count,
             "files_to_parse": parsed_count,
             "files_parsed": parsed_count,
-            "symbols_found": len(all_symbols),
+            "symbols_found": symbol_count,
             "timestamp": time.time(),
         }
         progress_path.write_text(json.dumps(progress_data))
 
-        print(repo_map)
-        print("\n---")
         print(f"Repo map saved to: {claude_dir / 'repo-map.md'}")
 
         # Show file counts by language
         file_counts = []
-        if python_files:
-            file_counts.append(f"{len(python_files)} Python")
-        if cpp_files:
-            file_counts.append(f"{len(cpp_files)} C++")
-        if rust_files:
-            file_counts.append(f"{len(rust_files)} Rust")
+        if language_counts["python"]:
+            file_counts.append(f"{language_counts['python']} Python")
+        if language_counts["cpp"]:
+            file_counts.append(f"{language_counts['cpp']} C++")
+        if language_counts["rust"]:
+            file_counts.append(f"{language_counts['rust']} Rust")
         print(f"Files: {total_files} ({', '.join(file_counts)})")
         print(f"Cache: {cached_count} cached, {parsed_count} parsed")
+        print(f"Database: {db_written} files written, {db_removed} removed")
+        print(f"Similarity: {similarity_files} files rescanned")
 
-        print(f"Symbols found: {len(all_symbols)}")
+        print(f"Symbols found: {symbol_count}")
         if similar_classes:
             print(f"Similar classes found: {len(similar_classes)}")
         if similar_functions:
@@ -1197,6 +3362,9 @@ def main():
                 print(f"{kind.title()} documented: {stats['documented']}/{stats['total']} ({stats['documented']/stats['total']*100:.0f}%)")
 
     except Exception as e:
+        # Release the write transaction before recording the failure
+        if writer:
+            writer.abort()
         # Set status to 'failed' on error
         if db_path.exists():
             try:
@@ -1216,5 +3384,159 @@ def main():
         raise  # Re-raise the exception
 
 
+def reindex_files(root: Path, paths: Iterable[str], cache: SymbolCache | None = None) -> bool:
+    """
+    Reindex just the given files and directories (relative to root, or
+    absolute inside it), so queries reflect a file as soon as it is written:
+    changed files are extracted again and their rows replaced in one
+    transaction, and files deleted or now ignored are dropped. Similar pairs,
+    repo-map.md and the directory summary are left to the next index_repo(),
+    so the index still counts as stale (see find_tree_changes()) until then.
+
+    Returns False, doing nothing, if there is no index of the current
+    versions to update (or root itself is given); index_repo() it instead.
+    """
+    changed = set()
+    for path in paths:
+        rel_path = os.path.normpath(os.path.relpath(path, root) if os.path.isabs(path) else path)
+        if rel_path == os.pardir or rel_path.startswith(f"{os.pardir}{os.sep}"):
+            raise ValueError(f"{path} is outside {root}")
+        changed.add("" if rel_path == os.curdir else rel_path.replace(os.sep, "/"))
+
+    claude_dir = root / ".claude"
+    db_path = claude_dir / "repo-map.db"
+    if "" in changed or not db_path.exists():
+        return False
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        current_versions = (get_metadata(conn, 'db_version') == str(DB_VERSION)
+                            and get_metadata(conn, 'extractor_version') == str(CACHE_VERSION))
+    except sqlite3.Error:
+        current_versions = False
+    finally:
+        conn.close()
+    if not current_versions:
+        return False
+
+    owns_cache = cache is None
+    if owns_cache:
+        cache = SymbolCache(claude_dir / "repo-map-cache.db")
+    else:
+        cache.refresh()
+    try:
+        current = discover_changed_files(root, changed)
+        # Directories (and deleted paths) may hold files that are gone now
+        prefixes = tuple(f"{rel_path}/" for rel_path in changed if rel_path not in current)
+        known = {rel_path for rel_path in changed if rel_path in cache.files} | current.keys()
+        if prefixes:
+            known.update(rel_path for rel_path in cache.files if rel_path.startswith(prefixes))
+
+        writer = SymbolWriter(db_path, known)
+        parsed = 0
+        try:
+            for rel_path in sorted(current):
+                source = current[rel_path]
+                if not submit_if_cached(cache, writer, source):
+                    record_parse_result(cache, writer, *parse_file_worker(parse_worker_args(source, cache)))
+                    parsed += 1
+        except BaseException:
+            writer.abort()
+            raise
+        for rel_path in known - current.keys():
+            cache.remove(rel_path)
+        cache.save()
+        written, removed = writer.finish()
+    finally:
+        if owns_cache:
+            cache.close()
+
+    print(f"Files: {len(current)} reindexed ({parsed} parsed)")
+    print(f"Database: {written} files written, {removed} removed")
+    return True
+
+
+def parse_files_option(args: list[str]) -> list[str] | None:
+    """The paths given with --files=PATH[,PATH...] (may be repeated), or None if there are none."""
+    files = [path for arg in args if arg.startswith("--files=") for path in arg.split("=", 1)[1].split(",") if path]
+    return files or None
+
+
+def serve_worker() -> None:
+    """
+    Run as a long-lived indexer (--worker), so parsers and symbol caches stay warm.
+
+    Reads one JSON job per line from stdin, {"root": "...", "args": [...]} with
+    args as on the command line, plus "paths" if only those (relative to root)
+    changed since the last job, or "files" to reindex just those (see
+    reindex_files()), and answers each with one JSON line on
+    stdout: {"status": "complete" | "failed", "seconds": ..., "output": ...,
+    "error": ...}. Jobs run one at a time; the worker exits at end of input.
+    The CPU time limit, if any, applies to each job rather than to the worker's
+    lifetime. C++ and Rust files are reparsed incrementally from their previous
+    trees (see extract_with_tree_sitter).
+    """
+    # stdout carries replies only: anything else written to fd 1 (including by
+    # parse processes) goes to stderr, and the indexer's output is captured
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    cpu_budget, cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    caches: dict[Path, SymbolCache] = {}
+    enable_tree_cache()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        start = time.perf_counter()
+        output = io.StringIO()
+        reply = {"status": "complete"}
+        root = None
+        try:
+            job = json.loads(line)
+            root = Path(job["root"]).resolve()
+            if not root.is_dir():
+                raise FileNotFoundError(f"No such directory: {root}")
+            if cpu_budget != resource.RLIM_INFINITY:
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                cpu_limit = int(usage.ru_utime + usage.ru_stime) + cpu_budget
+                if cpu_hard_limit != resource.RLIM_INFINITY:
+                    cpu_limit = min(cpu_limit, cpu_hard_limit)
+                resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_hard_limit))
+            if root not in caches:
+                caches[root] = SymbolCache(root / ".claude" / "repo-map-cache.db")
+            with redirect_stdout(output):
+                files = job.get("files")
+                if not files or not reindex_files(root, files, cache=caches[root]):
+                    index_repo(root, *parse_options(job.get("args", [])), cache=caches[root], paths=job.get("paths"))
+        except Exception as e:
+            reply = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            # The cache may hold unsaved state from the failed job; start over next time
+            if root in caches:
+                try:
+                    caches.pop(root).close()
+                except sqlite3.Error:
+                    pass
+        reply["seconds"] = round(time.perf_counter() - start, 3)
+        reply["output"] = output.getvalue()
+        replies.write(json.dumps(reply) + "\n")
+
+    for cache in caches.values():
+        cache.close()
+
+
+def main():
+    if sys.argv[1:2] == ["--worker"]:
+        serve_worker()
+        return
+    args = sys.argv[1:]
+    root = Path(args.pop(0)).resolve() if args and not args[0].startswith("--") else Path.cwd()
+    files = parse_files_option(args)
+    try:
+        if files and reindex_files(root, files):
+            return
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    index_repo(root, *parse_options(args))
+
+
 if __name__ == "__main__":
     main()
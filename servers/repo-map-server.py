@@ -10,17 +10,23 @@
 # ///
 """
 MCP server for querying repo-map symbol data.
-Spawns indexing subprocess - watchdog can kill hung processes.
+Indexes in a long-lived worker subprocess that keeps parsers and the symbol
+cache warm - watchdog can kill a hung worker, and the next reindex respawns it.
+On Linux an inotify watcher hands just the changed paths to each reindex;
+elsewhere, or when out of watches, the tree is polled for staleness instead.
 
 Exposes tools to search symbols by name/pattern, get file symbols, and trigger reindex.
 """
 
 import asyncio
+import bisect
 import fnmatch
+import functools
 import hashlib
 import json
 import logging
 import os
+import re
 import resource
 import signal
 import sqlite3
@@ -28,6 +34,8 @@ import subprocess
 import sys
 import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -41,25 +49,45 @@ sys.path.insert(0, str(SCRIPT_DIR))
 
 # Lazy import to avoid loading tree-sitter until needed
 _indexer_module = None
+_indexer_lock = threading.Lock()  # Tool threads and the maintenance thread may load it at once
 
 
 def get_indexer():
     """Lazy-load the indexer module to defer tree-sitter initialization."""
     global _indexer_module
-    if _indexer_module is None:
-        import importlib.util
-        spec = importlib.util.spec_from_file_location(
-            "generate_repo_map",
-            SCRIPT_DIR / "generate-repo-map.py"
-        )
-        _indexer_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(_indexer_module)
+    with _indexer_lock:
+        if _indexer_module is None:
+            import importlib.util
+            spec = importlib.util.spec_from_file_location(
+                "generate_repo_map",
+                SCRIPT_DIR / "generate-repo-map.py"
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _indexer_module = module
     return _indexer_module
 
 
 # Configuration
 SESSION_START_DIR = Path(os.environ.get("PROJECT_ROOT", os.getcwd()))
-STALENESS_CHECK_INTERVAL = 60  # seconds between automatic staleness checks
+STALENESS_CHECK_INTERVAL = 60  # seconds between automatic staleness checks, without a file watcher
+WATCH_INTERVAL = 1  # seconds between handing watched changes to the indexer
+WATCHDOG_INTERVAL = 60  # seconds between checks for a hung or killed indexer
+EXTERNAL_INDEX_POLL = 1  # seconds between status checks while an index this server didn't start is building
+TOOL_WORKERS = 4  # threads running tool calls, so the event loop only does protocol I/O
+TOOL_CONCURRENCY = {  # calls of one tool that may run at once; tools not listed may use every worker
+    "repo_map_status": 1,  # walks the tree for staleness
+    "reindex_repo_map": 1,
+    "get_clashes": 1,
+    "search_text": 2,
+}
+RESULT_CACHE_BYTES = 16 * 1024 * 1024  # rendered query results kept for repeated calls (see ResultCache)
+TRIGRAM_CANDIDATE_CAP = 2000  # Globs with more trigram candidates than this walk idx_name instead
+FUZZY_TOKEN_CANDIDATES = 20  # closest index tokens looked up per query word (see closest_tokens)
+FUZZY_SYMBOL_CANDIDATES = 200  # symbols sharing the most query words that are ranked in full
+READ_POOL_SIZE = 4  # idle read-only database connections kept open (see ReadPool)
+READ_CACHE_KB = 32 * 1024  # page cache per read connection
+READ_MMAP_BYTES = 1024 * 1024 * 1024  # database bytes each read connection may memory-map
 
 # Dynamic paths based on current working directory
 def get_project_root() -> Path:
@@ -76,7 +104,7 @@ def get_db_path() -> Path:
 
 def get_cache_path() -> Path:
     """Get cache path for current project."""
-    return get_claude_dir() / "repo-map-cache.json"
+    return get_claude_dir() / "repo-map-cache.db"
 
 def get_progress_path() -> Path:
     """Get progress file path for current project."""
@@ -116,11 +144,17 @@ except Exception as e:
 
 app = Server("context-tools-repo-map")
 
-# Indexing state - now using subprocess instead of threads
+# Indexing state - jobs are sent to a warm worker (generate-repo-map.py --worker)
 _indexing_lock = threading.Lock()
-_indexing_process: subprocess.Popen | None = None  # Current indexing subprocess
+_indexing_process: subprocess.Popen | None = None  # Indexer worker, respawned when it has exited
+_indexing_job_started: float | None = None  # Set while the worker runs a job
+_indexing_job_paths: list[str] | None = None  # The changed paths the running job was given, if any
+_tree_watcher = None  # Indexer's TreeWatcher for the current project, if one could be started
 _last_index_time = 0
+_last_reply: dict | None = None  # The worker's reply to its last job
 _index_error: str | None = None
+_index_state_changes = 0  # Bumped when a job starts or ends, see index_state_changed()
+_index_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
 
 
 def set_subprocess_limits():
@@ -138,21 +172,97 @@ def set_subprocess_limits():
         pass
 
     try:
-        # Limit CPU time to 20 minutes (watchdog catches at 10 min wall-clock time)
+        # Limit CPU time to 20 minutes per job (watchdog catches at 10 min wall-clock time).
+        # Only the soft limit: the worker raises it before each job
         cpu_time_limit = 1200  # 20 minutes in seconds
-        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit, cpu_time_limit))
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit, resource.RLIM_INFINITY))
     except (ValueError, OSError, AttributeError):
         pass
 
 
+@functools.lru_cache(maxsize=256)
+def compile_glob(pattern: str, ignore_case: bool):
+    """The match function of a regex for a glob pattern, with fnmatch's syntax."""
+    return re.compile(fnmatch.translate(pattern), re.IGNORECASE if ignore_case else 0).match
+
+
+def sql_glob_match(pattern: str, ignore_case: int, value: str | None) -> bool:
+    """SQL function glob_match(pattern, ignore_case, value): whether value matches the glob pattern."""
+    return value is not None and compile_glob(pattern, bool(ignore_case))(value) is not None
+
+
+class ReadConnection(sqlite3.Connection):
+    """A pooled read-only connection, tagged with the database file it was opened on."""
+    identity: tuple | None = None
+
+
+class ReadPool:
+    """
+    Long-lived read-only connections to the project database, so a tool call
+    doesn't reconnect, re-read the schema and start from a cold page cache.
+    In WAL mode each query already sees the latest commit, and SQLite
+    re-prepares cached statements itself after a schema change; connections
+    are only reopened once the file they were opened on has been replaced
+    (another project, or the index deleted and rebuilt).
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._identity: tuple | None = None  # (path, st_dev, st_ino) of the database the idle connections read
+        self._idle: list[ReadConnection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, db_path: Path) -> ReadConnection:
+        """An idle connection to db_path, or a new one."""
+        st = os.stat(db_path)
+        identity = (str(db_path), st.st_dev, st.st_ino)
+        stale = []
+        with self._lock:
+            if identity != self._identity:
+                stale, self._idle = self._idle, []
+                self._identity = identity
+            conn = self._idle.pop() if self._idle else None
+        for old in stale:
+            old.close()
+        if conn is None:
+            conn = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True, timeout=5.0, factory=ReadConnection,
+                                   check_same_thread=False, cached_statements=256)
+            conn.identity = identity
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute(f"PRAGMA cache_size = -{READ_CACHE_KB}")
+            conn.execute(f"PRAGMA mmap_size = {READ_MMAP_BYTES}")
+            conn.create_function("glob_match", 3, sql_glob_match, deterministic=True)
+        return conn
+
+    def release(self, conn: ReadConnection) -> None:
+        """Hand a connection back: kept if its database is still current and the pool has room, else closed."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if conn.identity == self._identity and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+_read_pool = ReadPool(READ_POOL_SIZE)
+
+
 def get_db() -> sqlite3.Connection:
-    """Get a database connection with row factory."""
+    """Get a pooled read-only database connection with row factory; hand it back with release_db()."""
     db_path = get_db_path()
-    if not db_path.exists():
-        raise FileNotFoundError(f"Repo map database not found at {db_path}. Use reindex_repo_map tool.")
-    conn = sqlite3.connect(db_path, timeout=5.0)
-    conn.row_factory = sqlite3.Row
-    return conn
+    try:
+        return _read_pool.acquire(db_path)
+    except (FileNotFoundError, sqlite3.OperationalError):
+        if db_path.exists():
+            raise
+        raise FileNotFoundError(f"Repo map database not found at {db_path}. Use reindex_repo_map tool.") from None
+
+
+def release_db(conn: sqlite3.Connection) -> None:
+    """Return a connection from get_db() to the pool."""
+    _read_pool.release(conn)
 
 
 def row_to_dict(row: sqlite3.Row) -> dict:
@@ -160,12 +270,194 @@ def row_to_dict(row: sqlite3.Row) -> dict:
     return {key: row[key] for key in row.keys()}
 
 
+class ResultCache:
+    """
+    Rendered results of read-only query tools, least recently used evicted
+    first once their total size passes max_bytes. Entries belong to one index
+    generation - the database file and its metadata 'generation', which the
+    indexer bumps on each commit that changes rows - and are all dropped as
+    soon as a lookup names another one.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = self.misses = 0
+        self._generation = None
+        self._results: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, generation: tuple, key: tuple) -> str | None:
+        """A cached result for key in this generation, if any, now the most recently used."""
+        with self._lock:
+            if generation != self._generation:
+                self._results.clear()
+                self.total_bytes = 0
+                self._generation = generation
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, generation: tuple, key: tuple, result: str) -> None:
+        """Cache a result computed in this generation, evicting the least recently used over max_bytes."""
+        with self._lock:
+            if generation != self._generation or key in self._results:
+                return  # Reindexed meanwhile, or computed twice
+            self._results[key] = result
+            self.total_bytes += sys.getsizeof(result)
+            while self.total_bytes > self.max_bytes and self._results:
+                _, evicted = self._results.popitem(last=False)
+                self.total_bytes -= sys.getsizeof(evicted)
+
+    def stats(self) -> dict:
+        """Entry count, size, and hits and misses since the server started."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_result_cache = ResultCache(RESULT_CACHE_BYTES)
+
+
+def cached_result(generation: tuple | None, tool: str, fn, **kwargs) -> str:
+    """fn(**kwargs), a tool's rendered result, from _result_cache when this generation already has it."""
+    if generation is None:
+        return fn(**kwargs)
+    key = (tool, json.dumps(kwargs, sort_keys=True))
+    result = _result_cache.get(generation, key)
+    if result is None:
+        result = fn(**kwargs)
+        _result_cache.put(generation, key, result)
+    return result
+
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="repo-map-tool")
+_tool_slots: dict[str, asyncio.Semaphore] = {}
+
+
+async def run_blocking(tool: str, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) on a tool worker thread, once fewer than
+    TOOL_CONCURRENCY[tool] calls of this tool are running. The event loop
+    keeps reading and answering other requests meanwhile.
+    """
+    slots = _tool_slots.get(tool)
+    if slots is None:
+        slots = _tool_slots[tool] = asyncio.Semaphore(TOOL_CONCURRENCY.get(tool, TOOL_WORKERS))
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(_tool_executor, functools.partial(fn, *args, **kwargs))
+
+
+def indexing_in_progress() -> bool:
+    """Whether the indexer worker is running a job."""
+    return (_indexing_job_started is not None
+            and _indexing_process is not None and _indexing_process.poll() is None)
+
+
+def start_indexer_worker() -> subprocess.Popen:
+    """
+    Spawn the indexer worker and a thread that reads its replies. Call with
+    _indexing_lock held. The worker runs in the project directory, which is
+    how /status and /repo-map tell it from other projects' workers.
+    """
+    proc = subprocess.Popen(
+        ["uv", "run", str(SCRIPT_DIR / "generate-repo-map.py"), "--worker"],
+        cwd=get_project_root(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        bufsize=1,  # Line buffered: one job per line
+        preexec_fn=set_subprocess_limits,  # Set resource limits (Unix only)
+    )
+    threading.Thread(target=read_worker_replies, args=(proc,), daemon=True).start()
+    logger.info(f"Indexer worker started (PID: {proc.pid})")
+    return proc
+
+
+def read_worker_replies(proc: subprocess.Popen):
+    """Record the outcome of each job the worker finishes, until it exits."""
+    global _indexing_job_started, _last_reply, _index_error
+
+    for line in proc.stdout:
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            continue
+        with _indexing_lock:
+            if proc is not _indexing_process:
+                continue
+            _indexing_job_started = None
+            _last_reply = reply
+            if reply.get("status") == "complete":
+                logger.info(f"Indexing completed in {reply.get('seconds')}s (worker PID: {proc.pid})")
+            else:
+                _index_error = reply.get("error", "unknown error")
+                logger.error(f"Indexing failed: {_index_error}")
+                changed_paths_lost()
+            index_state_changed()
+
+    with _indexing_lock:
+        if proc is _indexing_process and _indexing_job_started is not None:
+            _indexing_job_started = None
+            _index_error = "indexer worker exited during a job"
+            changed_paths_lost()
+            index_state_changed()
+
+
+def index_state_changed():
+    """Wake everything in wait_for_index_change(): a job started or ended. Call with _indexing_lock held."""
+    global _index_state_changes
+    _index_state_changes += 1
+    for loop, event in _index_waiters:
+        loop.call_soon_threadsafe(event.set)
+    _index_waiters.clear()
+
+
+async def wait_for_index_change(seen: int, timeout: float) -> bool:
+    """
+    Wait until a job has started or ended since _index_state_changes was
+    seen, without polling. Returns False on timeout.
+    """
+    event = asyncio.Event()
+    with _indexing_lock:
+        if _index_state_changes != seen:
+            return True
+        waiter = (asyncio.get_running_loop(), event)
+        _index_waiters.append(waiter)
+    try:
+        await asyncio.wait_for(event.wait(), max(timeout, 0))
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        with _indexing_lock:
+            if waiter in _index_waiters:
+                _index_waiters.remove(waiter)
+
+
+def changed_paths_lost():
+    """A job given changed paths didn't finish: have the watcher ask for a full reindex. Call with _indexing_lock held."""
+    if _indexing_job_paths is not None and _tree_watcher is not None:
+        _tree_watcher.add_changes(None)
+
+
 def check_subprocess_exit_status():
     """
-    Check if indexing subprocess has exited and log resource limit issues.
+    Check if the indexer worker has exited and log resource limit issues.
     Called periodically to detect and log resource limit exceeded conditions.
     """
-    global _indexing_process
+    global _indexing_process, _indexing_job_started, _index_error
 
     with _indexing_lock:
         if _indexing_process is None:
@@ -176,12 +468,16 @@ def check_subprocess_exit_status():
             # Still running
             return
 
-        # Process has exited - check exit status
+        # Process has exited - check exit status; the next reindex respawns it
         returncode = proc.returncode
+        if _indexing_job_started is not None:
+            _indexing_job_started = None
+            _index_error = f"indexer worker exited during a job (exit code {returncode})"
+            changed_paths_lost()
+            index_state_changed()
 
-        # Exit code 0 = success (or concurrent indexer - SQLite handles concurrency)
         if returncode == 0:
-            logger.info(f"Indexing subprocess completed successfully (PID: {proc.pid})")
+            logger.info(f"Indexer worker exited (PID: {proc.pid})")
             _indexing_process = None
             return
 
@@ -189,34 +485,35 @@ def check_subprocess_exit_status():
         if returncode < 0:
             signal_num = -returncode
             if signal_num == signal.SIGXCPU:
-                logger.error(f"Indexing subprocess (PID: {proc.pid}) exceeded CPU time limit (SIGXCPU)")
+                logger.error(f"Indexer worker (PID: {proc.pid}) exceeded CPU time limit (SIGXCPU)")
             elif signal_num == signal.SIGSEGV:
                 # SIGSEGV can be caused by RLIMIT_AS exceeded
-                logger.error(f"Indexing subprocess (PID: {proc.pid}) crashed (SIGSEGV) - possibly memory limit exceeded")
+                logger.error(f"Indexer worker (PID: {proc.pid}) crashed (SIGSEGV) - possibly memory limit exceeded")
             elif signal_num == signal.SIGKILL:
-                logger.warning(f"Indexing subprocess (PID: {proc.pid}) was killed (SIGKILL)")
+                logger.warning(f"Indexer worker (PID: {proc.pid}) was killed (SIGKILL)")
             else:
-                logger.warning(f"Indexing subprocess (PID: {proc.pid}) exited with signal {signal_num}")
+                logger.warning(f"Indexer worker (PID: {proc.pid}) exited with signal {signal_num}")
         elif returncode > 0:
-            logger.error(f"Indexing subprocess (PID: {proc.pid}) exited with error code {returncode}")
+            logger.error(f"Indexer worker (PID: {proc.pid}) exited with error code {returncode}")
 
         # Clean up reference
         _indexing_process = None
 
 
 def check_indexing_watchdog():
-    """Check if indexing is stuck and KILL the hung subprocess."""
-    global _indexing_process
+    """Check if indexing is stuck and KILL the hung worker (the next reindex respawns it)."""
+    global _indexing_process, _indexing_job_started
 
     db_path = get_db_path()
     if not db_path.exists():
         return
 
     try:
-        conn = sqlite3.connect(db_path, timeout=5.0)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.execute("SELECT key, value FROM metadata")
-        metadata = {row["key"]: row["value"] for row in cursor.fetchall()}
+        conn = get_db()
+        try:
+            metadata = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM metadata")}
+        finally:
+            release_db(conn)
 
         status = metadata.get("status")
         if status == "indexing":
@@ -232,10 +529,14 @@ def check_indexing_watchdog():
                         logger.warning(f"Indexing stuck for {elapsed}s, killing subprocess")
 
                         # Mark database as failed
-                        conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", ["status", "failed"])
-                        conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-                                   ["error_message", f"Watchdog killed hung indexer after {elapsed:.0f}s"])
-                        conn.commit()
+                        conn = sqlite3.connect(db_path, timeout=5.0)
+                        try:
+                            conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", ["status", "failed"])
+                            conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+                                       ["error_message", f"Watchdog killed hung indexer after {elapsed:.0f}s"])
+                            conn.commit()
+                        finally:
+                            conn.close()
 
                         # KILL the hung subprocess (key improvement!)
                         with _indexing_lock:
@@ -250,10 +551,11 @@ def check_indexing_watchdog():
                                     pass  # Already dead or still zombie
                                 finally:
                                     _indexing_process = None
+                                    _indexing_job_started = None
+                                    changed_paths_lost()
+                                    index_state_changed()
                 except ValueError:
                     pass  # Invalid timestamp format
-
-        conn.close()
     except Exception as e:
         logger.error(f"Watchdog check failed: {e}")
 
@@ -276,82 +578,92 @@ def is_stale() -> tuple[bool, str]:
     if not cache_path.exists():
         return True, "cache file missing"
 
-    # Check cache version
+    # Check cache version (read-only, no symbols loaded)
     try:
-        cache_data = json.loads(cache_path.read_text())
-        if cache_data.get("version") != indexer.CACHE_VERSION:
-            return True, f"cache version mismatch"
-    except (json.JSONDecodeError, IOError):
+        conn = sqlite3.connect(f"{cache_path.as_uri()}?mode=ro", uri=True, timeout=5.0)
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if version != (str(indexer.CACHE_VERSION),):
+                return True, "cache version mismatch"
+        finally:
+            conn.close()
+    except sqlite3.Error:
         return True, "cache file corrupt"
 
-    # Count files in cache vs current
-    cached_count = len(cache_data.get("files", {}))
-
-    # Quick file count check
-    current_files = []
-    for ext in [".py", ".rs", ".cpp", ".cc", ".cxx", ".hpp", ".h", ".hxx"]:
-        current_files.extend(indexer.find_files(project_root, {ext}))
-    current_count = len(current_files)
-
-    if current_count != cached_count:
-        return True, f"file count changed ({cached_count} cached, {current_count} found)"
-
-    # Check if any file is newer than DB
-    db_mtime = db_path.stat().st_mtime
-    for f in current_files[:100]:  # Sample check for speed
-        if f.stat().st_mtime > db_mtime:
-            return True, "files modified since last index"
+    # Check database version (an older layout lacks tables queries need)
+    try:
+        conn = get_db()
+        try:
+            version = conn.execute("SELECT value FROM metadata WHERE key = 'db_version'").fetchone()
+        finally:
+            release_db(conn)
+        if version is None or version[0] != str(indexer.DB_VERSION):
+            return True, "database version mismatch"
+    except sqlite3.Error:
+        return True, "database corrupt"
+
+    # Exact check against the directory summary stored by the last index:
+    # every known file is stat'ed, only directories that changed are listed
+    reason = indexer.find_tree_changes(project_root, db_path)
+    if reason:
+        return True, reason
 
     return False, "up to date"
 
 
-def do_index() -> tuple[bool, str]:
+def do_index(paths: list[str] | None = None, files: list[str] | None = None) -> tuple[bool, str]:
     """
-    Spawn subprocess to perform indexing.
+    Send an index job for the current project to the indexer worker,
+    spawning it first if it isn't running. paths, if given, are all that
+    changed (relative to the project root) since the last index; files, if
+    given, are all that is reindexed (see reindex_paths()).
     Returns (success, message).
     """
-    global _indexing_process, _last_index_time, _index_error
+    global _indexing_process, _indexing_job_started, _indexing_job_paths, _last_index_time, _index_error
 
+    project_root = get_project_root()
+    job = {"root": str(project_root)}
+    if paths is not None:
+        job["paths"] = paths
+    if files is not None:
+        job["files"] = files
+    job = json.dumps(job) + "\n"
     with _indexing_lock:
-        if _indexing_process and _indexing_process.poll() is None:
+        if indexing_in_progress():
             return False, "indexing already in progress"
         _index_error = None
 
-    try:
-        project_root = get_project_root()
-        claude_dir = get_claude_dir()
-        logger.info(f"Starting index subprocess for {project_root}")
-
-        # Ensure .claude directory exists
-        claude_dir.mkdir(exist_ok=True)
-
-        # Spawn subprocess to run the indexer with resource limits
-        proc = subprocess.Popen(
-            ["uv", "run", str(SCRIPT_DIR / "generate-repo-map.py"), str(project_root)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            preexec_fn=set_subprocess_limits,  # Set resource limits (Unix only)
-        )
-
-        with _indexing_lock:
-            _indexing_process = proc
-
-        _last_index_time = time.time()
-        logger.info(f"Indexing subprocess started (PID: {proc.pid})")
-
-        return True, f"indexing started in subprocess (PID: {proc.pid})"
+        try:
+            # Ensure .claude directory exists
+            get_claude_dir().mkdir(exist_ok=True)
+            logger.info(f"Starting index job for {project_root}")
+            for attempt in range(2):
+                if _indexing_process is None or _indexing_process.poll() is not None:
+                    _indexing_process = start_indexer_worker()
+                try:
+                    _indexing_process.stdin.write(job)
+                    _indexing_process.stdin.flush()
+                    break
+                except BrokenPipeError:
+                    # Exited since it was last checked; respawn once
+                    _indexing_process.wait()
+                    if attempt:
+                        raise
+            _indexing_job_started = time.time()
+            _indexing_job_paths = paths
+            _last_index_time = _indexing_job_started
+            index_state_changed()
+            return True, f"indexing started in worker (PID: {_indexing_process.pid})"
 
-    except Exception as e:
-        logger.exception("Failed to start indexing subprocess")
-        with _indexing_lock:
+        except Exception as e:
+            logger.exception("Failed to start indexing")
             _index_error = str(e)
-        return False, f"failed to start indexing: {e}"
+            return False, f"failed to start indexing: {e}"
 
 
 def index_in_background():
-    """Start indexing in a background subprocess."""
-    do_index()  # Spawns subprocess, no thread needed
+    """Start indexing in the background worker."""
+    do_index()  # Hands the job to the worker process, no thread needed
 
 
 @app.list_tools()
@@ -360,13 +672,13 @@ async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="search_symbols",
-            description="Search for symbols (functions, classes, methods) by name pattern. Supports glob patterns like 'get_*' or '*Config*'. FASTER than Grep/Search for symbol lookups - uses pre-built SQLite index.",
+            description="Search for symbols (functions, classes, methods) by name pattern. Supports glob patterns like 'get_*' or '*Config*', and typo-tolerant ranked search with fuzzy (e.g. 'parse_cfg' finds parse_config). FASTER than Grep/Search for symbol lookups - uses pre-built SQLite index.",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "pattern": {
                         "type": "string",
-                        "description": "Name pattern to search for. Supports glob wildcards (* and ?). Examples: 'get_*', '*Handler', 'parse_*_file'"
+                        "description": "Name pattern to search for. Supports glob wildcards (*, ? and [...]); a pattern with a '.' matches qualified names (Class.method). Examples: 'get_*', '*Handler', 'parse_*_file', 'Config.*'"
                     },
                     "kind": {
                         "type": "string",
@@ -377,11 +689,65 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "default": 20,
                         "description": "Maximum number of results to return (default: 20)"
+                    },
+                    "fuzzy": {
+                        "type": "boolean",
+                        "default": False,
+                        "description": "Rank symbols by how closely their names match the pattern's words, allowing typos and abbreviations, instead of glob matching. A glob search that finds nothing falls back to this."
                     }
                 },
                 "required": ["pattern"]
             }
         ),
+        Tool(
+            name="search_text",
+            description="Full-text search over comments, docstrings and string literals, ranked by relevance (BM25). FASTER than Grep for error messages, TODOs and documentation - uses a pre-built FTS5 index.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "FTS5 query. Words are ANDed; supports \"exact phrases\", OR, NOT and prefix* terms. Examples: 'connection refused', 'retry OR backoff', 'TODO'"
+                    },
+                    "element_type": {
+                        "type": "string",
+                        "enum": ["comment", "docstring", "string_literal", "all"],
+                        "default": "all",
+                        "description": "Optional: Restrict results to one kind of text"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "default": 20,
+                        "description": "Maximum number of results to return (default: 20)"
+                    }
+                },
+                "required": ["query"]
+            }
+        ),
+        Tool(
+            name="get_clashes",
+            description="List potentially similar (duplicate or overlapping) classes and functions found by the indexer. Reads the stored similarity results directly - no need to regenerate or parse repo-map.md.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "path_prefix": {
+                        "type": "string",
+                        "description": "Optional: Only pairs with at least one symbol under this path prefix. Example: 'src/models/'"
+                    },
+                    "kind": {
+                        "type": "string",
+                        "enum": ["class", "function"],
+                        "description": "Optional: Only similar classes or only similar functions"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "default": 50,
+                        "description": "Maximum number of pairs to return (default: 50)"
+                    }
+                },
+                "required": []
+            }
+        ),
         Tool(
             name="get_file_symbols",
             description="Get all symbols defined in a specific file.",
@@ -417,7 +783,7 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="reindex_repo_map",
-            description="Trigger a reindex of the repository symbols. Use when files have changed or index seems stale.",
+            description="Trigger a reindex of the repository symbols. Use when files have changed or index seems stale. Pass paths right after editing files to have just those reindexed, waiting until their symbols can be queried (usually well under a second).",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -425,6 +791,11 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "default": False,
                         "description": "Force reindex even if cache seems fresh"
+                    },
+                    "paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional: reindex just these files or directories (relative to the project root) and wait for it. Similar-symbol results and repo-map.md catch up with the next full reindex."
                     }
                 }
             }
@@ -555,21 +926,141 @@ async def wait_for_indexing(timeout_seconds: int = 60) -> tuple[bool, str]:
     """
     Wait for indexing to complete.
     Returns (success, message).
+
+    Woken by the indexer worker's reply rather than polling: while the
+    worker runs a job this costs no I/O, and the index status is read once
+    per job start or end. Only an index built by another process (the
+    status says indexing, but the worker isn't running a job) is polled,
+    every EXTERNAL_INDEX_POLL seconds, and only its status is read.
     """
-    start = time.time()
-    while time.time() - start < timeout_seconds:
-        status = repo_map_status()
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        seen = _index_state_changes  # Before looking, so a change meanwhile isn't missed
+        if indexing_in_progress():
+            wait = deadline - time.monotonic()
+        else:
+            status, error = await run_blocking("wait_for_index", read_index_status)
+
+            if status == "completed":
+                return True, "indexing completed"
 
-        if status.get("index_status") == "completed":
-            return True, "indexing completed"
+            if status == "failed":
+                return False, f"indexing failed: {error or 'unknown error'}"
 
-        if status.get("index_status") == "failed":
-            error = status.get("error", "unknown error")
-            return False, f"indexing failed: {error}"
+            if status == "indexing" and _index_error:
+                return False, f"indexing failed: {_index_error}"  # The worker died mid-job
 
-        await asyncio.sleep(1)  # Poll every second
+            wait = deadline - time.monotonic()
+            if status == "indexing":
+                wait = min(wait, EXTERNAL_INDEX_POLL)
+        if time.monotonic() >= deadline:
+            return False, "timeout waiting for indexing"
+        await wait_for_index_change(seen, wait)
 
-    return False, "timeout waiting for indexing"
+
+def read_index_status() -> tuple[str | None, str | None]:
+    """The index status and error message from the project database's metadata, None for either it lacks."""
+    if not get_db_path().exists():
+        return None, None
+    try:
+        conn = get_db()
+        try:
+            metadata = {row[0]: row[1] for row in conn.execute(
+                "SELECT key, value FROM metadata WHERE key IN ('status', 'error_message')")}
+        finally:
+            release_db(conn)
+    except (FileNotFoundError, sqlite3.Error):
+        return None, None
+    return metadata.get("status"), metadata.get("error_message")
+
+
+def read_index_state(project_root: Path, db_path: Path) -> tuple[tuple | None, str | None]:
+    """The index generation (see ResultCache) and status, or None for either the database doesn't have yet."""
+    try:
+        if db_path.exists():
+            conn = get_db()
+            try:
+                metadata = {row[0]: row[1] for row in conn.execute(
+                    "SELECT key, value FROM metadata WHERE key IN ('status', 'generation')")}
+                generation = None
+                if "generation" in metadata:
+                    generation = (str(project_root), os.stat(db_path).st_ino, metadata["generation"])
+                return generation, metadata.get("status")
+            except sqlite3.OperationalError:
+                pass  # Metadata table doesn't exist yet
+            finally:
+                release_db(conn)
+    except Exception:
+        pass  # DB doesn't exist yet
+    return None, None
+
+
+def run_tool(name: str, arguments: dict, generation: tuple | None):
+    """Run a tool that doesn't wait on the indexer. Returns markdown or a JSON-able result."""
+    if name == "search_symbols":
+        result = cached_result(
+            generation, name, search_symbols,
+            pattern=arguments["pattern"],
+            kind=arguments.get("kind"),
+            limit=arguments.get("limit", 20),
+            fuzzy=arguments.get("fuzzy", False)
+        )
+    elif name == "search_text":
+        result = cached_result(
+            generation, name, search_text,
+            query=arguments["query"],
+            element_type=arguments.get("element_type"),
+            limit=arguments.get("limit", 20)
+        )
+    elif name == "get_clashes":
+        result = get_clashes(
+            path_prefix=arguments.get("path_prefix"),
+            kind=arguments.get("kind"),
+            limit=arguments.get("limit", 50)
+        )
+    elif name == "get_file_symbols":
+        result = cached_result(generation, name, get_file_symbols, file=arguments["file"])
+    elif name == "get_symbol_content":
+        result = get_symbol_content(arguments["name"], arguments.get("kind"), generation)
+    elif name == "reindex_repo_map":
+        result = reindex_repo_map(force=arguments.get("force", False))
+    elif name == "repo_map_status":
+        result = repo_map_status()
+    elif name == "list_files":
+        result = cached_result(
+            generation, name, list_files,
+            pattern=arguments.get("pattern"),
+            limit=arguments.get("limit", 100)
+        )
+    elif name == "md_outline":
+        result = md_outline(file_path=arguments["file_path"])
+    elif name == "md_get_section":
+        result = md_get_section(
+            file_path=arguments["file_path"],
+            heading=arguments["heading"]
+        )
+    elif name == "md_list_tables":
+        result = md_list_tables(file_path=arguments["file_path"])
+    elif name == "md_get_table":
+        result = md_get_table(
+            file_path=arguments["file_path"],
+            index=arguments["index"]
+        )
+    elif name == "md_list_figures":
+        result = md_list_figures(file_path=arguments["file_path"])
+    else:
+        result = {"error": f"Unknown tool: {name}"}
+        logger.error(f"Unknown tool: {name}")
+    return result
+
+
+def index_if_stale() -> bool:
+    """Start indexing in the background if the index is stale. Returns whether indexing was already in progress."""
+    stale, reason = is_stale()
+    is_indexing = indexing_in_progress()
+    if stale and not is_indexing:
+        index_in_background()
+    return is_indexing
 
 
 @app.call_tool()
@@ -586,86 +1077,41 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
 
     # Auto-wait for indexing if needed (reduced timeout for better UX)
     # Markdown tools don't need indexing
+    # Query results are cached per index generation (see ResultCache)
+    generation = None
     if name not in ["repo_map_status", "reindex_repo_map", "wait_for_index",
                      "md_outline", "md_get_section", "md_list_tables", "md_get_table", "md_list_figures"]:
-        try:
-            if db_path.exists():
-                conn = sqlite3.connect(db_path, timeout=5.0)
-                try:
-                    cursor = conn.execute("SELECT value FROM metadata WHERE key = 'status'")
-                    row = cursor.fetchone()
-                    if row and row[0] == "indexing":
-                        logger.info("Indexing in progress, waiting up to 15 seconds...")
-                        success, msg = await wait_for_indexing(timeout_seconds=15)
-                        if not success:
-                            # Don't return error - return progress information instead
-                            progress = get_indexing_progress()
-                            if progress:
-                                return [TextContent(type="text", text=json.dumps({
-                                    "status": "indexing_in_progress",
-                                    "message": "Index is building. Try again in a moment or use repo_map_status to check progress.",
-                                    "progress": progress,
-                                    "partial_results": []
-                                }, indent=2))]
-                            else:
-                                return [TextContent(type="text", text=json.dumps({
-                                    "status": "indexing_in_progress",
-                                    "message": "Index is building. Try again in a moment or use repo_map_status to check progress.",
-                                    "partial_results": []
-                                }, indent=2))]
-                except sqlite3.OperationalError:
-                    pass  # Metadata table doesn't exist yet
-                finally:
-                    conn.close()
-        except Exception:
-            pass  # DB doesn't exist yet
+        generation, status = await run_blocking(name, read_index_state, project_root, db_path)
+        if status == "indexing":
+            logger.info("Indexing in progress, waiting up to 15 seconds...")
+            success, msg = await wait_for_indexing(timeout_seconds=15)
+            if not success:
+                # Don't return error - return progress information instead
+                progress = get_indexing_progress()
+                if progress:
+                    return [TextContent(type="text", text=json.dumps({
+                        "status": "indexing_in_progress",
+                        "message": "Index is building. Try again in a moment or use repo_map_status to check progress.",
+                        "progress": progress,
+                        "partial_results": []
+                    }, indent=2))]
+                else:
+                    return [TextContent(type="text", text=json.dumps({
+                        "status": "indexing_in_progress",
+                        "message": "Index is building. Try again in a moment or use repo_map_status to check progress.",
+                        "partial_results": []
+                    }, indent=2))]
 
     try:
-        if name == "search_symbols":
-            result = search_symbols(
-                pattern=arguments["pattern"],
-                kind=arguments.get("kind"),
-                limit=arguments.get("limit", 20)
-            )
-        elif name == "get_file_symbols":
-            result = get_file_symbols(file=arguments["file"])
-        elif name == "get_symbol_content":
-            result = get_symbol_content(
-                name=arguments["name"],
-                kind=arguments.get("kind")
-            )
-        elif name == "reindex_repo_map":
-            result = reindex_repo_map(force=arguments.get("force", False))
-        elif name == "repo_map_status":
-            result = repo_map_status()
-        elif name == "wait_for_index":
+        # Tools that wait stay on the event loop; all others run on a tool worker thread
+        if name == "wait_for_index":
             timeout = arguments.get("timeout_seconds", 60)
             success, msg = await wait_for_indexing(timeout_seconds=timeout)
             result = {"success": success, "message": msg}
-        elif name == "list_files":
-            result = list_files(
-                pattern=arguments.get("pattern"),
-                limit=arguments.get("limit", 100)
-            )
-        elif name == "md_outline":
-            result = md_outline(file_path=arguments["file_path"])
-        elif name == "md_get_section":
-            result = md_get_section(
-                file_path=arguments["file_path"],
-                heading=arguments["heading"]
-            )
-        elif name == "md_list_tables":
-            result = md_list_tables(file_path=arguments["file_path"])
-        elif name == "md_get_table":
-            result = md_get_table(
-                file_path=arguments["file_path"],
-                index=arguments["index"]
-            )
-        elif name == "md_list_figures":
-            result = md_list_figures(file_path=arguments["file_path"])
+        elif name == "reindex_repo_map" and arguments.get("paths"):
+            result = await reindex_paths(arguments["paths"])
         else:
-            result = {"error": f"Unknown tool: {name}"}
-            logger.error(f"Unknown tool: {name}")
+            result = await run_blocking(name, run_tool, name, arguments, generation)
 
         # Log result summary
         if isinstance(result, dict) and "error" in result:
@@ -685,10 +1131,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     except FileNotFoundError as e:
         # DB doesn't exist - trigger indexing
         logger.info(f"DB not found, triggering indexing for tool {name}")
-        stale, reason = is_stale()
-        is_indexing = _indexing_process is not None and _indexing_process.poll() is None
-        if stale and not is_indexing:
-            index_in_background()
+        is_indexing = await run_blocking("reindex_repo_map", index_if_stale)
         return [TextContent(type="text", text=json.dumps({
             "error": str(e),
             "status": "indexing started in background" if not is_indexing else "indexing in progress"
@@ -698,64 +1141,360 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         return [TextContent(type="text", text=json.dumps({"error": f"Tool error: {e}"}))]
 
 
-def search_symbols(pattern: str, kind: str | None = None, limit: int = 20) -> str:
-    """Search for symbols by name pattern. Returns markdown."""
+def glob_literals(pattern: str) -> tuple[str | None, list[str]]:
+    """
+    The literal text of a glob pattern: the prefix before its first wildcard
+    (None if it has none), and the runs of text between wildcards and [...]
+    classes. A "[" without a closing "]" is literal, as in fnmatch.
+    """
+    prefix = None
+    runs = [""]
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        end = i
+        if char == "[":
+            end = i + 1
+            if end < len(pattern) and pattern[end] == "!":
+                end += 1
+            if end < len(pattern) and pattern[end] == "]":
+                end += 1
+            end = pattern.find("]", end)
+        if char in "*?" or (char == "[" and end >= 0):
+            if prefix is None:
+                prefix = runs[-1]
+            runs.append("")
+            i = end + 1
+        else:
+            runs[-1] += char
+            i += 1
+    return prefix, [run for run in runs if run]
+
+
+def find_symbols(conn: sqlite3.Connection, pattern: str, kind: str | None, limit: int,
+                 ignore_case: bool) -> list[sqlite3.Row]:
+    """
+    Symbols whose name - or qualified name, parent.name, if the pattern has a
+    "." - matches a glob pattern, ordered by name. The pattern's literal text
+    narrows the candidates first: an exact name or a prefix to a range of
+    idx_name, or runs of 3+ characters to the symbol_names_fts trigram index
+    (which ignores case), as long as that finds at most
+    TRIGRAM_CANDIDATE_CAP symbols. Text that common, or none long enough,
+    means walking idx_name in order until limit symbols match, filtered
+    first by SQLite's own GLOB (LIKE ignoring case) on the literal runs.
+    Every candidate is then matched exactly, before the limit is applied,
+    so no match is lost to it.
+    """
+    column = "qualified" if "." in pattern else "name"
+    target = get_indexer().qualified_name_sql() if column == "qualified" else "name"
+    prefix, runs = glob_literals(pattern)
+    trigram_runs = [run for run in runs if len(run) >= 3]  # Shorter runs have no trigram
+
+    conditions = []
+    params: list = []
+    indexed = True
+    if column == "name" and not ignore_case and prefix is None:
+        conditions.append("name = ?")
+        params.append(pattern)
+    elif column == "name" and not ignore_case and prefix and (len(prefix) >= 3 or not trigram_runs):
+        conditions.append("name >= ? AND name < ?")
+        params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    else:
+        candidates = []
+        if trigram_runs:
+            # Trigrams covering each run, without overlap: fewer doclists to read than its phrase
+            grams = [run[i:i + 3] for run in trigram_runs for i in [*range(0, len(run) - 3, 3), len(run) - 3]]
+            match = f"{column} : (" + " AND ".join('"' + gram.replace('"', '""') + '"' for gram in grams) + ")"
+            candidates = [rowid for (rowid,) in conn.execute(
+                "SELECT rowid FROM symbol_names_fts WHERE symbol_names_fts MATCH ? LIMIT ?",
+                [match, TRIGRAM_CANDIDATE_CAP + 1])]
+            if not candidates:
+                return []
+        if 0 < len(candidates) <= TRIGRAM_CANDIDATE_CAP:
+            conditions.append(f"id IN ({','.join('?' * len(candidates))})")
+            params += candidates
+        else:
+            # Every name in order, until limit match: the literal runs in order
+            # are a cheap test in C that every match passes
+            indexed = False
+            if runs and not ignore_case:
+                conditions.append(f"{target} GLOB ?")
+                params.append("*" + "*".join(run.replace("[", "[[]") for run in runs) + "*")
+            elif runs and all(run.isascii() for run in runs):  # LIKE only ignores the case of ASCII letters
+                conditions.append(f"{target} LIKE ? ESCAPE '\\'")
+                params.append("%" + "%".join(re.sub(r"([%_\\])", r"\\\1", run) for run in runs) + "%")
+
+    if kind:
+        # With the name narrowed already, don't let idx_kind drive the query instead
+        conditions.append("+kind = ?" if indexed else "kind = ?")
+        params.append(kind)
+    conditions.append(f"glob_match(?, ?, {target})")
+    params += [pattern, ignore_case]
+
+    query = f"SELECT * FROM symbols WHERE {' AND '.join(conditions)} ORDER BY name LIMIT ?"
+    params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    The fewest single-character insertions, deletions, substitutions and
+    swaps of adjacent characters that turn a into b (optimal string
+    alignment distance).
+    """
+    before_previous, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b and char_a != char_b:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def token_similarity(word: str, token: str) -> float:
+    """
+    How well an index token stands for a query word, from 0 to 1: 1 when
+    equal, less for a prefix or abbreviation ("conf" or "cfg" for "config")
+    or a typo within edit distance 1 (2 for words over 4 letters).
+    """
+    if word == token:
+        return 1.0
+    similarity = 0.0
+    if token.startswith(word):
+        similarity = 0.8 + 0.1 * len(word) / len(token)
+    elif len(word) > 1 and word[0] == token[0] and compile_abbreviation(word)(token):
+        similarity = 0.6 + 0.2 * len(word) / len(token)
+    max_distance = 1 if len(word) <= 4 else 2
+    if abs(len(word) - len(token)) <= max_distance:
+        distance = edit_distance(word, token)
+        if distance <= max_distance:
+            similarity = max(similarity, 0.9 - 0.45 * distance / max(len(word), len(token)))
+    return similarity
+
+
+@functools.lru_cache(maxsize=256)
+def compile_abbreviation(word: str):
+    """The match function of a regex for tokens containing word's letters in order."""
+    return re.compile(".*?".join(map(re.escape, word))).match
+
+
+def closest_tokens(conn: sqlite3.Connection, word: str) -> dict[str, float]:
+    """
+    The FUZZY_TOKEN_CANDIDATES index tokens most similar to a query word,
+    with their similarity. Candidates are the tokens sharing its first
+    letter that contain its letters in order (prefixes and abbreviations),
+    found with a range of name_tokens, and those sharing enough of its
+    bigrams in token_grams to be within the allowed edit distance.
+    """
+    max_distance = 1 if len(word) <= 4 else 2
+    grams = get_indexer().token_bigrams(word)
+    candidates = {token for (token,) in conn.execute(
+        "SELECT token FROM name_tokens WHERE token >= ? AND token < ?", [word[0], chr(ord(word[0]) + 1)])
+        if compile_abbreviation(word)(token)}
+    # Each edit changes at most two bigrams
+    candidates.update(token for (token,) in conn.execute(f"""
+        SELECT token FROM token_grams
+        WHERE gram IN ({','.join('?' * len(grams))}) AND length(token) BETWEEN ? AND ?
+        GROUP BY token HAVING count(*) >= ?
+    """, [*grams, len(word) - max_distance, len(word) + max_distance, max(1, len(grams) - 2 * max_distance)]))
+    # A swap changes three ("laod" for "load" loses lo, oa and ad), so look those up as they are
+    swaps = {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1)} - {word}
+    candidates.update(token for (token,) in conn.execute(
+        f"SELECT token FROM name_tokens WHERE token IN ({','.join('?' * len(swaps))})", list(swaps)))
+    scored = sorted(((token_similarity(word, token), token) for token in candidates), reverse=True)
+    return {token: similarity for similarity, token in scored[:FUZZY_TOKEN_CANDIDATES] if similarity > 0}
+
+
+def fuzzy_find_symbols(conn: sqlite3.Connection, query: str, kind: str | None, limit: int) -> list[tuple[float, sqlite3.Row]]:
+    """
+    Symbols ranked by how closely their names match query, best first, as
+    (score, row). The query is split into words like indexed names (see
+    split_identifier()), each word matched to its closest index tokens, and
+    the FUZZY_SYMBOL_CANDIDATES symbols sharing the most of them through
+    symbol_tokens are scored: mostly by how well their tokens cover the
+    query's words, then by how much of their name the query accounts for
+    and by the edit distance between the two names.
+    """
+    indexer = get_indexer()
+    words = indexer.split_identifier(query)
+    closest = [closest_tokens(conn, word) for word in words]
+    matches = [(token, i, similarity) for i, tokens in enumerate(closest) for token, similarity in tokens.items()]
+    if not matches:
+        return []
+
+    kind_join = "JOIN symbols s ON s.id = st.symbol_id AND s.kind = ?" if kind else ""
+    candidates = conn.execute(f"""
+        WITH matches(token, word, similarity) AS (VALUES {', '.join(['(?, ?, ?)'] * len(matches))})
+        SELECT symbol_id FROM (
+            SELECT st.symbol_id, max(m.similarity) AS best
+            FROM matches m JOIN symbol_tokens st ON st.token = m.token {kind_join}
+            GROUP BY st.symbol_id, m.word
+        )
+        GROUP BY symbol_id ORDER BY sum(best) DESC LIMIT ?
+    """, [value for match in matches for value in match] + ([kind] if kind else []) + [FUZZY_SYMBOL_CANDIDATES]).fetchall()
+    rows = conn.execute(f"SELECT * FROM symbols WHERE id IN ({','.join('?' * len(candidates))})",
+                        [symbol_id for (symbol_id,) in candidates]).fetchall()
+
+    scored = []
+    for row in rows:
+        tokens = indexer.split_identifier(row["name"])
+        coverage = sum(max((similar.get(token, 0.0) for token in tokens), default=0.0) for similar in closest) / len(words)
+        if coverage >= 0.4:
+            matched = sum(1 for token in tokens if any(token in similar for similar in closest))
+            scored.append((0.6 * coverage + 0.2 * matched / len(tokens), tokens, row))
+    if not scored:
+        return []
+
+    # Spelling adds up to 0.2, less the names' difference in length, so rows
+    # that can't reach the limit-th best score so far skip the edit distance
+    compact_query = "".join(words)
+    ranked = []
+    for score, tokens, row in sorted(scored, key=lambda entry: -entry[0]):
+        compact_name = "".join(tokens)
+        longest = max(len(compact_query), len(compact_name))
+        if len(ranked) >= limit and score + 0.2 * (1 - abs(len(compact_query) - len(compact_name)) / longest) < ranked[limit - 1][0]:
+            continue
+        spelling = 1 - edit_distance(compact_query, compact_name) / longest
+        bisect.insort(ranked, (round(score + 0.2 * max(spelling, 0.0), 3), row), key=lambda pair: -pair[0])
+    ranked.sort(key=lambda pair: (-pair[0], pair[1]["name"], pair[1]["file_path"]))
+    return ranked[:limit]
+
+
+def format_symbol(row: sqlite3.Row, score: float | None = None) -> str:
+    """A search result line for a symbol, with the first line of its docstring."""
+    name = row["name"]
+    if row["parent"]:
+        name = f"{row['parent']}.{name}"
+    md = f"- **{name}** ({row['kind']}) - `{row['file_path']}:{row['line_number']}`"
+    md += f" (score {score})\n" if score is not None else "\n"
+
+    if row["docstring"]:
+        # First line of docstring only
+        first_line = row["docstring"].split("\n")[0]
+        if len(first_line) > 80:
+            first_line = first_line[:77] + "..."
+        md += f"  _{first_line}_\n"
+    return md
+
+
+def search_symbols(pattern: str, kind: str | None = None, limit: int = 20, fuzzy: bool = False) -> str:
+    """
+    Search for symbols by name pattern, or with fuzzy, rank them by how
+    closely their names match it. A glob search that finds nothing returns
+    the closest names instead. Returns markdown.
+    """
     conn = get_db()
     try:
-        # Convert glob pattern to SQL LIKE pattern
-        sql_pattern = pattern.replace("*", "%").replace("?", "_")
+        if not fuzzy:
+            # Glob matches, or if there are none, matches ignoring case
+            results = (find_symbols(conn, pattern, kind, limit, ignore_case=False)
+                       or find_symbols(conn, pattern, kind, limit, ignore_case=True))
+            if results:
+                md = f"## Found {len(results)} symbol(s) matching `{pattern}`\n\n"
+                return md + "".join(format_symbol(row) for row in results)
+
+        ranked = fuzzy_find_symbols(conn, pattern, kind, limit)
+        if not ranked:
+            return f"No symbols found matching pattern: `{pattern}`"
+        if fuzzy:
+            md = f"## {len(ranked)} symbol(s) closest to `{pattern}`\n\n"
+        else:
+            md = f"## No symbols match `{pattern}`; {len(ranked)} closest name(s)\n\n"
+        return md + "".join(format_symbol(row, score) for score, row in ranked)
+    finally:
+        release_db(conn)
 
-        query = "SELECT * FROM symbols WHERE name LIKE ?"
-        params: list = [sql_pattern]
 
-        if kind:
-            query += " AND kind = ?"
-            params.append(kind)
+def quote_fts_query(query: str) -> str:
+    """Quote each word of a query as an FTS5 phrase, so punctuation is matched literally."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
 
-        query += " ORDER BY name LIMIT ?"
-        params.append(limit)
 
-        cursor = conn.execute(query, params)
-        rows = cursor.fetchall()
+def search_text(query: str, element_type: str | None = None, limit: int = 20) -> str:
+    """Full-text search over comments, docstrings and string literals. Returns markdown."""
+    conn = get_db()
+    try:
+        sql = """
+            SELECT file_path, line_number, element_type, symbol_name,
+                   snippet(code_text_fts, 4, '**', '**', '…', 16) AS snippet
+            FROM code_text_fts WHERE code_text_fts MATCH ?
+        """
+        params: list = [query]
+        if element_type and element_type != "all":
+            sql += " AND element_type = ?"
+            params.append(element_type)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
 
-        # If SQL LIKE didn't match well, fall back to fnmatch for proper glob
-        results = []
-        for row in rows:
-            if fnmatch.fnmatch(row["name"], pattern):
-                results.append(row)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                raise
+            # Not valid FTS5 syntax (e.g. "can't open" or "foo.bar()") - search the words literally
+            params[0] = quote_fts_query(query)
+            rows = conn.execute(sql, params).fetchall() if params[0] else []
 
-        # If no results with strict fnmatch, return SQL results
-        if not results:
-            results = list(rows)
+        if not rows:
+            return f"No text found matching: `{query}`"
 
-        results = results[:limit]
+        md = f"## Found {len(rows)} match(es) for `{query}`\n\n"
+        for row in rows:
+            location = f"`{row['file_path']}:{row['line_number']}`"
+            owner = f" in **{row['symbol_name']}**" if row["symbol_name"] else ""
+            md += f"- {location} ({row['element_type']}){owner}\n"
+            snippet = " ".join(row["snippet"].split())
+            md += f"  {snippet}\n"
 
-        if not results:
-            return f"No symbols found matching pattern: `{pattern}`"
+        return md
+    finally:
+        release_db(conn)
 
-        # Format as markdown
-        md = f"## Found {len(results)} symbol(s) matching `{pattern}`\n\n"
-        for row in results:
-            name = row["name"]
-            kind_str = row["kind"]
-            path = row["file_path"]
-            line = row["line_number"]
 
-            if row["parent"]:
-                name = f"{row['parent']}.{name}"
+def get_clashes(path_prefix: str | None = None, kind: str | None = None, limit: int = 50) -> str:
+    """Similar class/function pairs stored by the indexer, optionally filtered. Returns markdown."""
+    conn = get_db()
+    try:
+        conditions = []
+        params: list = []
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if path_prefix:
+            conditions.append("(substr(file1, 1, ?) = ? OR substr(file2, 1, ?) = ?)")
+            params.extend([len(path_prefix), path_prefix] * 2)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        total = conn.execute("SELECT COUNT(*) FROM similar_pairs" + where, params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT * FROM similar_pairs" + where + " ORDER BY kind, file1, line1, file2, line2 LIMIT ?",
+            params + [limit]
+        ).fetchall()
+
+        scope = f" under `{path_prefix}`" if path_prefix else ""
+        if not rows:
+            kinds = {"class": "classes", "function": "functions"}.get(kind, "classes or functions")
+            return f"No similar {kinds} found{scope}"
 
-            md += f"- **{name}** ({kind_str}) - `{path}:{line}`\n"
+        md = f"## {total} potentially similar pair(s){scope}\n"
+        current_kind = None
+        for row in rows:
+            if row["kind"] != current_kind:
+                current_kind = row["kind"]
+                md += f"\n### Similar {'Classes' if current_kind == 'class' else 'Functions'}\n\n"
+            md += f"- **{row['name1']}** (`{row['file1']}:{row['line1']}`)\n"
+            md += f"  ↔ **{row['name2']}** (`{row['file2']}:{row['line2']}`)\n"
+            md += f"  Reason: {row['reason']}\n"
 
-            if row["docstring"]:
-                # First line of docstring only
-                first_line = row["docstring"].split("\n")[0]
-                if len(first_line) > 80:
-                    first_line = first_line[:77] + "..."
-                md += f"  _{first_line}_\n"
+        if total > len(rows):
+            md += f"\n*Showing first {len(rows)} of {total} pairs. Use `path_prefix`, `kind` or `limit` to see more.*\n"
 
         return md
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def get_file_symbols(file: str) -> str:
@@ -797,11 +1536,15 @@ def get_file_symbols(file: str) -> str:
 
         return md
     finally:
-        conn.close()
+        release_db(conn)
 
 
-def get_symbol_content(name: str, kind: str | None = None) -> str:
-    """Get the source code content of a symbol by exact name. Returns markdown."""
+def get_symbol_content(name: str, kind: str | None = None, generation: tuple | None = None) -> str:
+    """
+    Get the source code content of a symbol by exact name. Returns markdown.
+    The symbol is looked up and its file stat'ed on every call; only the
+    rendered source is cached, for that version of the file.
+    """
     conn = get_db()
     project_root = get_project_root()
     try:
@@ -833,55 +1576,64 @@ def get_symbol_content(name: str, kind: str | None = None) -> str:
                 md += f"- **{display_name}** ({row['kind']}) - `{row['file_path']}:{row['line_number']}`\n"
             return md
 
-        row = rows[0]
-        file_path = project_root / row["file_path"]
-
-        if not file_path.exists():
+        row = dict(rows[0])
+        try:
+            st = (project_root / row["file_path"]).stat()
+        except OSError:
             return f"❌ File not found: `{row['file_path']}`"
+    finally:
+        release_db(conn)
 
-        # Read file content
-        try:
-            lines = file_path.read_text(encoding="utf-8").splitlines()
-        except (IOError, UnicodeDecodeError) as e:
-            return f"❌ Could not read file: {e}"
+    # Edited files are read again before the reindex catches up
+    return cached_result(generation, "get_symbol_content", render_symbol_content,
+                         row=row, source=[st.st_size, st.st_mtime_ns])
 
-        start_line = row["line_number"]
-        end_line = row["end_line_number"]
 
-        if end_line is None:
-            # Fallback: return just the start line and a few following lines
-            end_line = min(start_line + 20, len(lines))
+def render_symbol_content(row: dict, source: list[int]) -> str:
+    """A symbols row's source code and documentation as markdown; source (the file's size and mtime) only keys the cache."""
+    file_path = get_project_root() / row["file_path"]
 
-        # Extract content (convert to 0-indexed)
-        content_lines = lines[start_line - 1:end_line]
-        content = "\n".join(content_lines)
+    # Read file content
+    try:
+        lines = file_path.read_text(encoding="utf-8").splitlines()
+    except (IOError, UnicodeDecodeError) as e:
+        return f"❌ Could not read file: {e}"
 
-        # Detect language for syntax highlighting
-        file_ext = Path(row["file_path"]).suffix.lstrip(".")
-        lang_map = {"py": "python", "js": "javascript", "ts": "typescript", "rs": "rust", "c": "c", "cpp": "cpp", "h": "c", "hpp": "cpp"}
-        lang = lang_map.get(file_ext, file_ext)
+    start_line = row["line_number"]
+    end_line = row["end_line_number"]
 
-        # Build markdown
-        display_name = f"{row['parent']}.{row['name']}" if row["parent"] else row["name"]
-        md = f"## {display_name} ({row['kind']})\n\n"
-        md += f"**Location:** `{row['file_path']}:{start_line}-{end_line}`\n\n"
+    if end_line is None:
+        # Fallback: return just the start line and a few following lines
+        end_line = min(start_line + 20, len(lines))
 
-        if row["signature"]:
-            md += f"**Signature:** `{row['signature']}`\n\n"
+    # Extract content (convert to 0-indexed)
+    content_lines = lines[start_line - 1:end_line]
+    content = "\n".join(content_lines)
 
-        if row["docstring"]:
-            md += f"**Documentation:**\n```\n{row['docstring']}\n```\n\n"
+    # Detect language for syntax highlighting
+    file_ext = Path(row["file_path"]).suffix.lstrip(".")
+    lang_map = {"py": "python", "js": "javascript", "ts": "typescript", "rs": "rust", "c": "c", "cpp": "cpp", "h": "c", "hpp": "cpp"}
+    lang = lang_map.get(file_ext, file_ext)
 
-        md += f"**Source Code:**\n```{lang}\n{content}\n```\n"
+    # Build markdown
+    display_name = f"{row['parent']}.{row['name']}" if row["parent"] else row["name"]
+    md = f"## {display_name} ({row['kind']})\n\n"
+    md += f"**Location:** `{row['file_path']}:{start_line}-{end_line}`\n\n"
 
-        return md
-    finally:
-        conn.close()
+    if row["signature"]:
+        md += f"**Signature:** `{row['signature']}`\n\n"
+
+    if row["docstring"]:
+        md += f"**Documentation:**\n```\n{row['docstring']}\n```\n\n"
+
+    md += f"**Source Code:**\n```{lang}\n{content}\n```\n"
+
+    return md
 
 
 def reindex_repo_map(force: bool = False) -> dict:
     """Trigger a reindex of the repository."""
-    is_indexing = _indexing_process is not None and _indexing_process.poll() is None
+    is_indexing = indexing_in_progress()
 
     if is_indexing:
         return {"status": "indexing already in progress"}
@@ -896,15 +1648,45 @@ def reindex_repo_map(force: bool = False) -> dict:
     return {"status": "indexing started in background"}
 
 
+async def reindex_paths(paths: list[str], timeout_seconds: int = 60) -> dict:
+    """
+    Reindex just these files or directories (relative to the project root)
+    in the worker, after any job it is running, and wait for it: only they
+    are extracted again, and similar pairs and repo-map.md are left to the
+    next full reindex. Without an index to update, this is a full reindex.
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        seen = _index_state_changes
+        started, message = await run_blocking("reindex_repo_map", do_index, files=paths)
+        if started:
+            break
+        if message != "indexing already in progress" or time.monotonic() > deadline:
+            return {"status": message}
+        await wait_for_index_change(seen, deadline - time.monotonic())
+
+    while True:
+        seen = _index_state_changes
+        if not indexing_in_progress():
+            break
+        if not await wait_for_index_change(seen, deadline - time.monotonic()):
+            return {"status": "reindex still running"}
+    if _index_error or not _last_reply:
+        return {"status": "failed", "error": _index_error or "unknown error"}
+    return {"status": "reindexed", "seconds": _last_reply.get("seconds"), "output": _last_reply.get("output", "").strip()}
+
+
 def repo_map_status() -> dict:
     """Get current index status."""
-    is_indexing = _indexing_process is not None and _indexing_process.poll() is None
+    is_indexing = indexing_in_progress()
     project_root = get_project_root()
     db_path = get_db_path()
     status = {
         "project_root": str(project_root),
         "database_exists": db_path.exists(),
         "is_indexing": is_indexing,
+        "watching_changes": _tree_watcher is not None and _tree_watcher.root == project_root and not _tree_watcher.failed,
+        "result_cache": _result_cache.stats(),
     }
 
     if _index_error:
@@ -953,7 +1735,7 @@ def repo_map_status() -> dict:
                 status["symbol_count"] = cursor.fetchone()[0]
                 status["index_status"] = "unknown (old DB format)"
 
-            conn.close()
+            release_db(conn)
         except Exception as e:
             status["db_error"] = str(e)
 
@@ -1075,7 +1857,7 @@ def list_files(pattern: str | None = None, limit: int = 100) -> str:
 
         return md
     finally:
-        conn.close()
+        release_db(conn)
 
 
 # ============================================================================
@@ -1322,42 +2104,71 @@ def md_list_figures(file_path: str) -> str:
     return md
 
 
-async def periodic_staleness_check():
-    """Periodically check if reindexing is needed."""
-    while True:
-        await asyncio.sleep(STALENESS_CHECK_INTERVAL)
-        try:
-            is_indexing = _indexing_process is not None and _indexing_process.poll() is None
-            if not is_indexing:
-                stale, reason = is_stale()
-                if stale:
-                    logger.info(f"Index is stale ({reason}), starting background reindex")
-                    index_in_background()
-        except Exception as e:
-            logger.warning(f"Staleness check failed: {e}")
+def watch_project():
+    """
+    Start a file watcher for the current project (replacing one for a project
+    the server has moved away from), then reindex if the index is stale.
+    Returns the watcher, or None if the tree has to be polled instead.
+    """
+    global _tree_watcher
 
+    project_root = get_project_root()
+    if _tree_watcher is not None and _tree_watcher.root == project_root:
+        return None if _tree_watcher.failed else _tree_watcher
+    if _tree_watcher is not None:
+        _tree_watcher.close()
+    _tree_watcher = get_indexer().TreeWatcher(project_root)
+    if _tree_watcher.start():
+        logger.info(f"Watching {project_root} for changes")
+    else:
+        logger.warning(f"Can't watch {project_root} for changes (no inotify, or out of watches - "
+                       f"see fs.inotify.max_user_watches); polling every {STALENESS_CHECK_INTERVAL}s")
+
+    # Changes from before the watch started
+    if not indexing_in_progress():
+        stale, reason = is_stale()
+        if stale:
+            logger.info(f"Index is stale ({reason}), starting background reindex")
+            index_in_background()
+    return None if _tree_watcher.failed else _tree_watcher
 
-async def periodic_watchdog_check():
-    """Run watchdog every 60 seconds to detect hung indexing and resource limit issues."""
-    while True:
-        await asyncio.sleep(60)
-        try:
-            # Check for completed subprocess and log resource limit issues
-            check_subprocess_exit_status()
-            # Check for hung processes
-            check_indexing_watchdog()
-        except Exception as e:
-            logger.warning(f"Watchdog check failed: {e}")
 
+def check_staleness(last_poll: float) -> float:
+    """
+    Hand the paths the file watcher saw change to the indexer, or without a
+    watcher, check if reindexing is needed once STALENESS_CHECK_INTERVAL has
+    passed since last_poll. Returns the time of the last poll.
+    """
+    watcher = watch_project()
+    if indexing_in_progress():
+        return last_poll  # Changes keep accumulating until the job is done
+    if watcher is not None:
+        changed = watcher.take_changes()
+        if changed is None:
+            logger.info("File watcher needs a full rescan, starting background reindex")
+            started, _ = do_index()
+        elif changed:
+            logger.info(f"{len(changed)} path(s) changed, starting background reindex")
+            started, _ = do_index(sorted(changed))
+        else:
+            return last_poll
+        if not started:
+            watcher.add_changes(changed)
+    elif time.monotonic() - last_poll >= STALENESS_CHECK_INTERVAL:
+        last_poll = time.monotonic()
+        stale, reason = is_stale()
+        if stale:
+            logger.info(f"Index is stale ({reason}), starting background reindex")
+            index_in_background()
+    return last_poll
 
-async def main():
-    """Run the MCP server."""
-    logger.info("=" * 60)
-    logger.info(f"MCP Server starting in directory: {SESSION_START_DIR}")
-    logger.info(f"MCP tools will dynamically query current working directory")
-    logger.info(f"Python: {sys.version}")
-    logger.info("=" * 60)
 
+def run_maintenance():
+    """
+    Background thread for everything that walks the tree or the indexer's
+    state outside tool calls: the startup checks, then handing changes to
+    the indexer every WATCH_INTERVAL and the watchdog every WATCHDOG_INTERVAL.
+    """
     # Run watchdog on startup to detect any stuck state
     try:
         check_subprocess_exit_status()
@@ -1365,18 +2176,41 @@ async def main():
     except Exception as e:
         logger.warning(f"Startup watchdog check failed: {e}")
 
-    # Check if indexing needed on startup
+    # Watch for changes, and check if indexing is needed on startup
     try:
-        stale, reason = is_stale()
-        if stale:
-            logger.info(f"Index is stale on startup ({reason}), starting background reindex")
-            index_in_background()
+        watch_project()
     except Exception as e:
         logger.warning(f"Startup staleness check failed: {e}")
 
-    # Start periodic checks
-    asyncio.create_task(periodic_staleness_check())
-    asyncio.create_task(periodic_watchdog_check())
+    last_poll = last_watchdog = time.monotonic()
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        try:
+            last_poll = check_staleness(last_poll)
+        except Exception as e:
+            logger.warning(f"Staleness check failed: {e}")
+
+        if time.monotonic() - last_watchdog >= WATCHDOG_INTERVAL:
+            last_watchdog = time.monotonic()
+            try:
+                # Check for completed subprocess and log resource limit issues
+                check_subprocess_exit_status()
+                # Check for hung processes
+                check_indexing_watchdog()
+            except Exception as e:
+                logger.warning(f"Watchdog check failed: {e}")
+
+
+async def main():
+    """Run the MCP server."""
+    logger.info("=" * 60)
+    logger.info(f"MCP Server starting in directory: {SESSION_START_DIR}")
+    logger.info(f"MCP tools will dynamically query current working directory")
+    logger.info(f"Python: {sys.version}")
+    logger.info("=" * 60)
+
+    # Startup and periodic checks, off the event loop
+    threading.Thread(target=run_maintenance, name="repo-map-maintenance", daemon=True).start()
 
     logger.info("MCP Server ready, waiting for tool calls...")
 
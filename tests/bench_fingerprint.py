@@ -0,0 +1,119 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""
+Benchmark the symbol cache after a mass touch (e.g. `git checkout`).
+
+Builds a synthetic tree, indexes it, bumps every mtime, then times:
+  - the old per-file check (read + sha256 on the main thread, every run)
+  - the first run after the touch (read + hash once, no re-parse)
+  - the next run (fingerprints refreshed: one stat per file)
+
+Usage: uv run tests/bench_fingerprint.py [num_files]   (default 20000)
+"""
+
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+TEMPLATE = '''"""Module {n}."""
+
+
+class Handler{n}:
+    """Handles request type {n}."""
+
+    def handle(self, request):
+        """Process one request."""
+        return request * {n}
+
+
+def helper_{n}(value: int) -> int:
+    """Scale a value."""
+    return value + {n}
+'''
+
+
+def make_tree(root: Path, num_files: int) -> None:
+    """Create num_files Python modules, 100 per directory."""
+    for n in range(num_files):
+        directory = root / f"pkg{n // 100}"
+        if n % 100 == 0:
+            directory.mkdir()
+        (directory / f"mod{n}.py").write_text(TEMPLATE.format(n=n))
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<44} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+def run_cache_pass(root: Path, cache) -> tuple[int, int]:
+    """One indexer cache pass: discover, then check or extract each file."""
+    hits = misses = 0
+    for source in indexer.discover_source_files(root):
+        _, was_cached = indexer.extract_with_cache(source, cache)
+        if was_cached:
+            hits += 1
+        else:
+            misses += 1
+    return hits, misses
+
+
+def sha256_every_file(root: Path) -> int:
+    """The previous behaviour for a changed mtime: full read + sha256 on the main thread."""
+    for source in indexer.discover_source_files(root):
+        hashlib.sha256(source.path.read_bytes()).hexdigest()
+    return 0
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Building {num_files} files...")
+        make_tree(root, num_files)
+        cache = indexer.SymbolCache(root / ".claude" / "repo-map-cache.db")
+
+        print("Timings:")
+        timed("cold index (parse everything)", lambda: run_cache_pass(root, cache))
+        timed("warm, nothing changed", lambda: run_cache_pass(root, cache))
+
+        # Mass touch: same content, new mtime/ctime
+        bumped = time.time_ns() + 10**9
+        for source in indexer.discover_source_files(root):
+            os.utime(source.path, ns=(bumped, bumped))
+
+        timed("old check: read + sha256 of every file", lambda: sha256_every_file(root))
+        hits, misses = timed("after touch: hash once, no re-parse", lambda: run_cache_pass(root, cache))
+        assert misses == 0, f"{misses} touched files were re-parsed"
+        hits, misses = timed("next run: fingerprint hit (one stat)", lambda: run_cache_pass(root, cache))
+        assert hits == num_files and misses == 0
+
+
+if __name__ == "__main__":
+    main()
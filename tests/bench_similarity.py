@@ -0,0 +1,139 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""
+Benchmark similar-function detection on synthetic symbol sets.
+
+Generates public functions with names and docstrings drawn from real words,
+plus a few copy-and-tweak near-duplicates, then times
+find_similar_functions() at each size. The previous all-pairs scan is timed
+on a sample and extrapolated (it grows with n^2); on that sample both
+candidate filters are timed too, the exact one must find every pair and the
+ngram one's recall is reported. The sizes are run with the ngram filter by
+default: the exact one is quadratic in docstrings.
+
+Usage: uv run tests/bench_similarity.py [size ...] [--doc-similarity=tfidf] [--similar-candidates=exact]
+       (default 10000 50000 100000; the tfidf engine needs NumPy: uv run --with numpy ...)
+"""
+
+import difflib
+import importlib.util
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+VERBS = ["get", "set", "load", "save", "parse", "read", "write", "build", "make", "create", "update", "delete",
+         "find", "check", "validate", "compute", "render", "format", "convert", "resolve", "fetch", "send"]
+NEAR_DUPLICATE_RATE = 0.03  # Real trees copy-and-tweak a few helpers
+SAMPLE_SIZE = 1500
+
+
+def make_vocabulary() -> list[str]:
+    """Real identifier and prose words: every distinct lowercase word in difflib's source."""
+    return sorted(set(re.findall(r"[a-z]{3,}", Path(difflib.__file__).read_text())))
+
+
+def make_functions(count: int, seed: int = 0) -> list:
+    """Synthetic public functions, 20 per file, about two thirds documented."""
+    rng = random.Random(seed)
+    words = make_vocabulary()
+    functions = []
+    for n in range(count):
+        file_path = f"pkg{n // 2000}/mod{n // 20}.py"
+        line = n % 20 * 10 + 1
+        if functions and rng.random() < NEAR_DUPLICATE_RATE:
+            original = rng.choice(functions)
+            name = original.name + rng.choice(["s", "_v2", "_impl", "2"])
+            docstring = original.docstring and original.docstring.replace(".", " and the cache.", 1)
+        else:
+            name = "_".join([rng.choice(VERBS)] + rng.sample(words, rng.randint(2, 3)))
+            docstring = None
+            if rng.random() < 0.66:
+                docstring = " ".join(rng.sample(words, rng.randint(4, 12))).capitalize() + "."
+        functions.append(indexer.Symbol(name, "function", f"{name}()", docstring, file_path, line))
+    return functions
+
+
+def all_pairs_similar_functions(symbols: list, name_threshold: float = 0.75, doc_threshold: float = 0.65) -> list:
+    """The previous implementation: score every pair of functions."""
+    similar = []
+    functions = [s for s in symbols if s.kind == "function" and not s.name.startswith(('_', 'test_'))]
+    for i, fn1 in enumerate(functions):
+        for fn2 in functions[i + 1:]:
+            if fn1.file_path == fn2.file_path:
+                continue
+            reasons = []
+            name_sim = indexer.similarity(fn1.name, fn2.name)
+            if name_sim >= name_threshold:
+                reasons.append(f"similar names ({name_sim:.0%})")
+            if fn1.docstring and fn2.docstring and len(fn1.docstring) >= 20 and len(fn2.docstring) >= 20:
+                doc_sim = indexer.similarity(fn1.docstring, fn2.docstring)
+                if doc_sim >= doc_threshold:
+                    reasons.append(f"similar docstrings ({doc_sim:.0%})")
+            if reasons:
+                similar.append((fn1, fn2, ", ".join(reasons)))
+    return similar
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:] if not arg.startswith("--")] or [10000, 50000, 100000]
+    doc_similarity = indexer.DEFAULT_DOC_SIMILARITY
+    candidates = "ngram"
+    for arg in sys.argv[1:]:
+        if arg.startswith("--doc-similarity="):
+            doc_similarity = arg.split("=")[1]
+        elif arg.startswith("--similar-candidates="):
+            candidates = arg.split("=")[1]
+    sample_size = min(SAMPLE_SIZE, min(sizes))
+
+    sample = make_functions(sample_size)
+    start = time.perf_counter()
+    expected = all_pairs_similar_functions(sample)
+    all_pairs_seconds = time.perf_counter() - start
+    expected_keys = {(a.location, b.location) for a, b, _ in expected}
+    print(f"All-pairs scan on {sample_size} functions: {all_pairs_seconds:.2f}s, {len(expected)} pairs")
+    for sample_candidates in indexer.SIMILAR_CANDIDATE_FILTERS:
+        start = time.perf_counter()
+        found = indexer.find_similar_functions(sample, doc_similarity=doc_similarity, candidates=sample_candidates)
+        elapsed = time.perf_counter() - start
+        found_keys = {(a.location, b.location) for a, b, _ in found}
+        if doc_similarity == "ratio":
+            assert found_keys <= expected_keys, "candidate scoring reported a pair the all-pairs scan rejects"
+            if sample_candidates == "exact":
+                assert found == expected, "exact candidates missed a pair the all-pairs scan reports"
+        recall = len(found_keys & expected_keys) / len(expected_keys) if expected_keys else 1.0
+        print(f"  {sample_candidates} candidates: {elapsed:.2f}s, found {recall:.2%}")
+
+    print(f"{'functions':>10} {candidates + ' candidates':>18} {'all-pairs (est.)':>18} {'pairs found':>12}")
+    for size in sizes:
+        functions = make_functions(size)
+        start = time.perf_counter()
+        similar = indexer.find_similar_functions(functions, doc_similarity=doc_similarity, candidates=candidates)
+        elapsed = time.perf_counter() - start
+        estimate = all_pairs_seconds * (size / sample_size) ** 2
+        print(f"{size:>10} {elapsed:>17.2f}s {estimate:>17.0f}s {len(similar):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""
+Benchmark the server's staleness check on a large unchanged tree.
+
+Builds a synthetic tree (source files plus docs, data files and a
+.gitignore'd build directory in every package), stores its directory
+summary as an index would, then times:
+  - the old check: full discovery, a file count and 100 sampled mtimes
+  - find_tree_changes(): every known file stat'ed, no directory listed
+  - the same after touching every directory (each one listed again)
+  - the same after editing one file in place
+
+Usage: uv run tests/bench_staleness.py [num_files]   (default 50000)
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def make_tree(root: Path, num_files: int) -> None:
+    """Create num_files source files, 50 per package, each package with some files discovery skips."""
+    (root / ".gitignore").write_text("build/\n*.log\n")
+    for n in range(num_files):
+        directory = root / f"pkg{n // 1000}" / f"sub{n // 50}"
+        if n % 50 == 0:
+            (directory / "build").mkdir(parents=True)
+            for i in range(20):
+                (directory / "build" / f"out{i}.py").write_text("")
+                (directory / f"notes{i}.md").write_text("")
+            (directory / "run.log").write_text("")
+        (directory / f"mod{n}.py").write_text("")
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<44} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+def old_check(root: Path, db_path: Path, indexed: int) -> bool:
+    """The previous check: discover everything, compare the count, sample 100 mtimes."""
+    files = indexer.discover_source_files(root)
+    if len(files) != indexed:
+        return True
+    db_mtime_ns = db_path.stat().st_mtime_ns
+    return any(f.mtime_ns > db_mtime_ns for f in files[:100])
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Building {num_files} files...")
+        make_tree(root, num_files)
+        (root / ".claude").mkdir()
+        # Trusted (not racily recent) directory mtimes
+        old = time.time() - 3600
+        for dir_path, _, _ in os.walk(root):
+            os.utime(dir_path, (old, old))
+
+        # Store the summary as index_repo() does, without parsing anything
+        dirs = {}
+        files = indexer.discover_source_files(root, dirs=dirs)
+        db_path = root / ".claude" / "repo-map.db"
+        writer = indexer.SymbolWriter(db_path)
+        writer.update_dirs(indexer.summarize_dirs(root, dirs, {f.rel_path: f for f in files}), complete=True)
+        writer.finish()
+        os.utime(root, (old, old))
+
+        print(f"Timings ({len(files)} source files, {len(dirs)} directories):")
+        timed("old check: discovery + count + 100 mtimes", lambda: old_check(root, db_path, len(files)))
+        reason = timed("directory summary, nothing changed", lambda: indexer.find_tree_changes(root, db_path))
+        assert reason is None, reason
+
+        for rel_dir in dirs:
+            os.utime(root / rel_dir)
+        reason = timed("directory summary, every directory touched", lambda: indexer.find_tree_changes(root, db_path))
+        assert reason is None, reason
+
+        for rel_dir in dirs:
+            os.utime(root / rel_dir, (old, old))
+        (root / files[-1].rel_path).write_text("x = 1\n")  # In place: no directory mtime changes
+        reason = timed("directory summary, last file edited", lambda: indexer.find_tree_changes(root, db_path))
+        assert reason == f"files modified in {os.path.dirname(files[-1].rel_path)}/", reason
+
+
+if __name__ == "__main__":
+    main()
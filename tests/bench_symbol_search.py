@@ -0,0 +1,147 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "mcp>=1.0.0",
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""
+Benchmark search_symbols glob patterns on a large index.
+
+Fills a query database with synthetic symbols (snake_case and CamelCase
+names made of words with a skewed frequency, a quarter of them methods),
+then times each pattern with:
+  - the old query: name LIKE, ORDER BY name LIMIT, then fnmatch on those rows
+  - find_symbols(): an idx_name range, up to TRIGRAM_CANDIDATE_CAP trigram
+    candidates, or an in-order idx_name walk, all matched before LIMIT
+and reports how many true matches the old query lost to its LIMIT. Then
+times fuzzy_find_symbols() on misspelled and abbreviated names.
+
+Usage: uv run tests/bench_symbol_search.py [num_symbols]   (default 1000000)
+"""
+
+import fnmatch
+import importlib.util
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SERVER = Path(__file__).parent.parent / "servers" / "repo-map-server.py"
+LIMIT = 20
+
+
+def load_server(project: Path):
+    """Load repo-map-server.py as a module, logging and querying in project."""
+    os.environ["PROJECT_ROOT"] = str(project)
+    os.chdir(project)
+    spec = importlib.util.spec_from_file_location("repo_map_server", SERVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_names(num_symbols: int) -> list[tuple[str, str | None]]:
+    """(name, parent) pairs; a few hundred words make up most names, as in real code."""
+    rng = random.Random(1)
+    syllables = ["ba", "co", "de", "fi", "gu", "ha", "jo", "ke", "li", "mo", "nu", "pa", "qui", "ro", "sa",
+                 "te", "vi", "wo", "xa", "ze", "str", "pl", "tr", "an", "er", "in", "on", "ul", "ex", "ch"]
+    words = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(6000)})
+    words += ["get", "set", "handler", "request", "manager", "config", "parse", "load", "event", "cache"]
+    rng.shuffle(words)
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(words))]
+
+    def name(i: int) -> str:
+        parts = rng.choices(words, weights, k=rng.randint(1, 4))
+        return "".join(p.capitalize() for p in parts) if i % 3 == 0 else "_".join(parts)
+
+    return [(name(i), name(i + 7) if i % 4 == 0 else None) for i in range(num_symbols)]
+
+
+def old_search(conn: sqlite3.Connection, pattern: str) -> list:
+    """The previous search_symbols query."""
+    rows = conn.execute("SELECT * FROM symbols WHERE name LIKE ? ORDER BY name LIMIT ?",
+                        [pattern.replace("*", "%").replace("?", "_"), LIMIT]).fetchall()
+    return [row for row in rows if fnmatch.fnmatch(row["name"], pattern)] or rows
+
+
+def best_of(fn, runs: int = 3) -> tuple[float, list]:
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    num_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp:
+        project = Path(tmp)
+        server = load_server(project)
+        indexer = server.get_indexer()
+
+        print(f"Building {num_symbols} symbols...")
+        names = make_names(num_symbols)
+        db_path = project / ".claude" / "repo-map.db"
+        conn = sqlite3.connect(db_path)
+        indexer.ensure_schema(conn)
+        start = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO symbols (name, kind, file_path, line_number, parent) VALUES (?, ?, ?, ?, ?)",
+            ((name, "method" if parent else "function", f"src/mod{i // 50}.py", i % 50 + 1, parent)
+             for i, (name, parent) in enumerate(names)))
+        conn.execute(f"""INSERT INTO symbol_names_fts (rowid, name, qualified)
+                         SELECT id, name, {indexer.qualified_name_sql()} FROM symbols""")
+        conn.executemany("INSERT INTO symbol_tokens (token, symbol_id) VALUES (?, ?)",
+                         ((token, i + 1) for i, (name, _) in enumerate(names) for token in indexer.split_identifier(name)))
+        conn.execute("INSERT INTO name_tokens SELECT DISTINCT token FROM symbol_tokens")
+        conn.executemany("INSERT INTO token_grams (gram, token) VALUES (?, ?)",
+                         ((gram, token) for (token,) in conn.execute("SELECT token FROM name_tokens").fetchall()
+                          for gram in indexer.token_bigrams(token)))
+        conn.commit()
+        conn.close()
+        print(f"  inserted with the trigram and token indexes in {time.perf_counter() - start:.1f}s, "
+              f"database {db_path.stat().st_size / 1e6:.0f} MB")
+
+        sample = [name for name, _ in names[::max(1, num_symbols // 4)]][:4]
+        words = [max(name.replace("_", " ").split() or [name], key=len)[:8] for name in sample]
+        patterns = ["get_*", "Get*Handler*", "*handler*", "*Handler", "*_config_*", "*.get_*",
+                    *(f"*{word}*" for word in words), "*xyzzy*", "cache?load*"]
+
+        conn = server.get_db()
+        print(f"{'pattern':<20} {'old':>9} {'new':>9}  matches  lost by old LIMIT")
+        for pattern in patterns:
+            old_seconds, old_rows = best_of(lambda: old_search(conn, pattern))
+            new_seconds, new_rows = best_of(lambda: server.find_symbols(conn, pattern, None, LIMIT, False))
+            exact_old = [row for row in old_rows if fnmatch.fnmatch(row["name"], pattern)]
+            lost = max(0, min(len(new_rows), LIMIT) - len(exact_old)) if "." not in pattern else "-"
+            print(f"{pattern:<20} {old_seconds * 1000:7.1f}ms {new_seconds * 1000:7.1f}ms  {len(new_rows):7}  {lost}")
+
+        # Drop a letter from a long word, swap two in the next, abbreviate the last
+        queries = ["parse_cfg", "get_hndlr", "RequestManger", "confg_laod", "evnet_handler"]
+        for name in sample:
+            parts = indexer.split_identifier(name)
+            parts[0] = parts[0][:2] + parts[0][3:] if len(parts[0]) > 4 else parts[0]
+            if len(parts) > 1:
+                parts[1] = parts[1][1] + parts[1][0] + parts[1][2:]
+            if len(parts) > 2:
+                parts[-1] = parts[-1][:3]
+            queries.append("_".join(parts))
+        print(f"\n{'fuzzy query':<28} {'time':>9}  best match")
+        for query in queries:
+            seconds, ranked = best_of(lambda: server.fuzzy_find_symbols(conn, query, None, LIMIT))
+            best = f"{ranked[0][1]['name']} ({ranked[0][0]})" if ranked else "-"
+            print(f"{query:<28} {seconds * 1000:7.1f}ms  {best}")
+        server.release_db(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test single-pass source discovery and .gitignore handling in generate-repo-map.py."""
+
+import importlib.util
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def make_tree(root: Path, files: dict[str, str]) -> None:
+    """Create files (relative path -> content) under root."""
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def discovered(root: Path) -> set[str]:
+    return {f.rel_path for f in indexer.discover_source_files(root)}
+
+
+def test_discovery_classifies_and_prunes():
+    """One walk finds every language and skips EXCLUDE_DIRS."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            "app.py": "", "lib/core.cpp": "", "lib/core.h": "", "src/main.rs": "",
+            "README.md": "", "node_modules/pkg/index.py": "", ".venv/lib/site.py": "",
+        })
+        files = indexer.discover_source_files(root)
+        assert [f.rel_path for f in files] == ["app.py", "lib/core.cpp", "lib/core.h", "src/main.rs"]
+        assert {f.rel_path: f.language for f in files}["src/main.rs"] == "rust"
+        core = next(f for f in files if f.rel_path == "lib/core.cpp")
+        assert core.mtime_ns == (root / "lib/core.cpp").stat().st_mtime_ns
+        assert core.size == 0
+
+
+def test_gitignore_prunes_directories_and_files():
+    """Root .gitignore, dir-only patterns, anchoring and negation."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            ".gitignore": "# generated\ngen/\n/top_only.py\n*_pb2.py\n!keep_pb2.py\n",
+            "gen/out.py": "", "src/gen/out.py": "", "top_only.py": "", "src/top_only.py": "",
+            "api_pb2.py": "", "keep_pb2.py": "", "main.py": "",
+        })
+        assert discovered(root) == {"keep_pb2.py", "main.py", "src/top_only.py"}
+
+
+def test_nested_gitignore_and_double_star():
+    """Nested .gitignore applies relative to its own directory; ** spans directories."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            ".gitignore": "third_party/**/tests/\n",
+            "pkg/.gitignore": "fixtures/\n!fixtures/\n*.h\n",
+            "pkg/fixtures/data.py": "", "pkg/a.h": "", "pkg/a.cpp": "", "other/a.h": "",
+            "third_party/lib/tests/t.py": "", "third_party/lib/x/tests/t.py": "", "third_party/lib/x.py": "",
+        })
+        assert discovered(root) == {"pkg/fixtures/data.py", "pkg/a.cpp", "other/a.h", "third_party/lib/x.py"}
+
+
+def test_trailing_double_star_ignores_contents_only():
+    """"foo/**" matches what is inside foo/ but not foo/ itself, so a negation can bring a file back."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            ".gitignore": "foo/**\n!foo/keep.py\n",
+            "foo/keep.py": "", "foo/drop.py": "", "foo/sub/deep.py": "", "foo.py": "",
+        })
+        assert discovered(root) == {"foo.py", "foo/keep.py"}
+
+
+def test_info_exclude_and_project_ignore_file():
+    """.git/info/exclude and .repomapignore are honoured without a git binary."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            ".git/info/exclude": "scratch.py\n",
+            indexer.PROJECT_IGNORE_FILE: "vendor/big/\n",
+            "scratch.py": "", "vendor/big/huge.cpp": "", "vendor/small/tiny.cpp": "", "main.py": "",
+        })
+        assert discovered(root) == {"main.py", "vendor/small/tiny.cpp"}
+        all_files = {f.rel_path for f in indexer.discover_source_files(root, respect_ignore_files=False)}
+        assert "vendor/big/huge.cpp" in all_files and "scratch.py" in all_files
+
+
+def test_rediscovery_from_changed_paths_matches_full_discovery():
+    """Cached files plus the changed files and directories give what a full walk finds."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {
+            "pkg/.gitignore": "gen_*.py\n", "pkg/a.py": "", "pkg/b.py": "", "old/c.rs": "", "keep/d.h": "",
+        })
+        cached = {f.rel_path: indexer.FileCache(f.fingerprint, "", None) for f in indexer.discover_source_files(root)}
+
+        (root / "pkg/a.py").write_text("x = 1\n")
+        (root / "pkg/b.py").unlink()
+        make_tree(root, {"pkg/gen_e.py": "", "pkg/f.cpp": "", "new/sub/g.rs": "", "node_modules/h.py": ""})
+        os.rename(root / "old", root / "moved")
+        changed = ["pkg/a.py", "pkg/b.py", "pkg/gen_e.py", "pkg/f.cpp", "new", "old", "moved", "node_modules/h.py"]
+
+        rediscovered = indexer.rediscover_source_files(root, cached, changed)
+        assert [(f.rel_path, f.fingerprint) for f in rediscovered] == [
+            (f.rel_path, f.fingerprint) for f in indexer.discover_source_files(root)
+        ]
+        assert [f.rel_path for f in rediscovered] == ["keep/d.h", "moved/c.rs", "new/sub/g.rs", "pkg/a.py", "pkg/f.cpp"]
+
+
+def test_tree_changes_are_found_exactly():
+    """The stored directory summary catches every change discovery would see, and nothing else."""
+    def index(root: Path, paths: list[str] | None = None) -> None:
+        with redirect_stdout(io.StringIO()):
+            indexer.index_repo(root, paths=paths)
+
+    def summary(root: Path) -> list[tuple]:
+        conn = sqlite3.connect(root / ".claude" / "repo-map.db")
+        try:
+            return conn.execute("SELECT path, names, digest FROM dirs ORDER BY path").fetchall()
+        finally:
+            conn.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {"pkg/.gitignore": "gen_*.py\n", "pkg/a.py": "x = 1\n", "pkg/sub/b.rs": "", "c.h": ""})
+        index(root)
+        # Old enough mtimes to be trusted: unchanged directories aren't listed
+        old = time.time() - 3600
+        for path in (root, root / "pkg", root / "pkg/sub", root / ".claude"):
+            os.utime(path, (old, old))
+        assert indexer.find_tree_changes(root, root / ".claude" / "repo-map.db") is None
+
+        changes = [
+            (lambda: (root / "pkg/a.py").write_text("x = 2\n"), "files modified in pkg/", ["pkg/a.py"]),
+            (lambda: (root / "pkg/gen_d.py").write_text(""), None, None),  # Ignored
+            (lambda: (root / "pkg/sub/e.rs").write_text(""), "files added or removed in pkg/sub/", ["pkg/sub/e.rs"]),
+            (lambda: make_tree(root, {"new/f.cpp": ""}), "files added or removed in .", ["new"]),
+            (lambda: (root / "pkg/.gitignore").write_text(""), "files added or removed in pkg/", ["pkg/.gitignore"]),
+            (lambda: (root / "pkg/sub/b.rs").unlink(), "files added or removed in pkg/sub/", ["pkg/sub/b.rs"]),
+            (lambda: os.rename(root / "new", root / "node_modules"), "files added or removed in .", ["new", "node_modules"]),
+        ]
+        for change, reason, paths in changes:
+            change()
+            assert indexer.find_tree_changes(root, root / ".claude" / "repo-map.db") == reason, reason
+            if paths:
+                index(root, paths)
+                assert indexer.find_tree_changes(root, root / ".claude" / "repo-map.db") is None, paths
+                updated = summary(root)
+                index(root)
+                assert summary(root) == updated, paths
+
+
+def test_tree_watcher_reports_changed_paths():
+    """Source files and directories discovery walks are reported, as ignore files change; excluded and other files aren't."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, {".gitignore": "generated/\n", ".git/info/exclude": "", "pkg/a.py": "", "node_modules/b.py": ""})
+        watcher = indexer.TreeWatcher(root)
+        if not watcher.start():
+            raise unittest.SkipTest("inotify not available")
+        try:
+            (root / "pkg/a.py").write_text("x = 1\n")
+            make_tree(root, {"node_modules/b.py": "x", "notes.txt": "", "generated/c.py": ""})
+            (root / "src").mkdir()
+            time.sleep(0.1)
+            (root / "src/d.rs").write_text("fn d() {}\n")  # Inside a directory watched since it appeared
+            time.sleep(0.2)
+            assert watcher.take_changes() == {"pkg/a.py", "src", "src/d.rs"}
+            assert watcher.take_changes() == set()
+
+            (root / ".gitignore").write_text("")
+            time.sleep(0.2)
+            assert watcher.take_changes() == {".gitignore"}
+            watcher.add_changes(None)
+            assert watcher.take_changes() is None
+
+            # Watches follow the ignore files: generated/ is walked now, pkg/ no longer
+            (root / "generated/c.py").write_text("x = 1\n")
+            time.sleep(0.2)
+            assert watcher.take_changes() == {"generated/c.py"}
+            (root / ".gitignore").write_text("pkg/\n")
+            time.sleep(0.2)
+            assert watcher.take_changes() == {".gitignore"}
+            (root / "pkg/a.py").write_text("x = 2\n")
+            time.sleep(0.2)
+            assert watcher.take_changes() == set()
+
+            (root / ".git/info/exclude").write_text("generated/\n")
+            time.sleep(0.2)
+            assert watcher.take_changes() is None
+            (root / "generated/c.py").write_text("x = 2\n")
+            time.sleep(0.2)
+            assert watcher.take_changes() == set()
+        finally:
+            watcher.close()
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_discovery_classifies_and_prunes,
+        test_gitignore_prunes_directories_and_files,
+        test_nested_gitignore_and_double_star,
+        test_trailing_double_star_ignores_contents_only,
+        test_info_exclude_and_project_ignore_file,
+        test_rediscovery_from_changed_paths_matches_full_discovery,
+        test_tree_changes_are_found_exactly,
+        test_tree_watcher_reports_changed_paths,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except unittest.SkipTest as e:
+            print(f"⏭️  SKIP: {test.__name__}: {e}")
+            skipped += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
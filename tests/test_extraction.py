@@ -0,0 +1,254 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test the single-read extraction path in generate-repo-map.py."""
+
+import hashlib
+import importlib.util
+import os
+import random
+import tempfile
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+PYTHON_SOURCE = b'class Config:\n    """Settings."""\n\n    def load(self):\n        pass\n'
+CPP_SOURCE = b"/// A widget.\nclass Widget {\npublic:\n    void draw();\n};\n"
+RUST_SOURCE = b"/// A point.\npub struct Point { x: i32 }\n\nfn origin() -> Point { Point { x: 0 } }\n"
+
+
+def test_extractors_take_bytes():
+    """Every registered extractor parses source bytes and tags symbols with rel_path."""
+    for language, source, expected in [
+        ("python", PYTHON_SOURCE, {"Config", "load"}),
+        ("cpp", CPP_SOURCE, {"Widget"}),
+        ("rust", RUST_SOURCE, {"Point", "origin"}),
+    ]:
+        symbols, texts = indexer.EXTRACTORS[language](source, f"src/file.{language}")
+        names = {s.name for s in symbols}
+        assert expected <= names, f"{language}: {names}"
+        assert all(s.file_path == f"src/file.{language}" for s in symbols + texts)
+    assert indexer.EXTRACTORS["python"](b"def broken(:\n", "bad.py") == ([], [])
+    assert indexer.EXTRACTORS["cpp"](b"class \xff\xfe {};\n", "bad.cpp") == ([], [])
+
+
+def test_text_elements():
+    """Comments, docstrings and string literals are extracted for full-text search."""
+    python_source = (
+        b'#!/usr/bin/env python\n'
+        b'# Retry policy\n# for flaky uploads\n'
+        b'class Uploader:\n    """Uploads files."""\n\n'
+        b'    def send(self):\n        return "connection refused"  # give up\n'
+    )
+    _, texts = indexer.EXTRACTORS["python"](python_source, "up.py")
+    assert [(t.line_number, t.element_type, t.content, t.symbol_name) for t in texts] == [
+        (2, "comment", "Retry policy\nfor flaky uploads", None),
+        (5, "docstring", "Uploads files.", "Uploader"),
+        (8, "string_literal", "connection refused", None),
+        (8, "comment", "give up", None),
+    ]
+
+    # A "#" in a string isn't a comment, but one between implicitly concatenated pieces is; columns of a
+    # non-UTF-8 file are found through its coding cookie
+    python_source = (
+        '# -*- coding: latin-1 -*-\r\n'
+        'def f(s):\r\n'
+        '    """Example:\r\n\r\n    x = 1  # not a comment\r\n    """\r\n'
+        '    s = "a#b" + f"{s}#"  # after strings\r\n'
+        '    return ("caf\xe9 #1"  # between pieces\r\n'
+        '            "tail")\r\n'
+    ).encode("latin-1")
+    _, texts = indexer.EXTRACTORS["python"](python_source, "f.py")
+    assert [(t.line_number, t.content) for t in texts if t.element_type == "comment"] == [
+        (1, "-*- coding: latin-1 -*-"), (7, "after strings"), (8, "between pieces"),
+    ]
+
+    cpp_source = b'/// A widget.\nclass Widget {\n    // draw it\n    const char* name = "widget name";\n};\n'
+    _, texts = indexer.EXTRACTORS["cpp"](cpp_source, "w.cpp")
+    assert {(t.element_type, t.content) for t in texts} == {
+        ("docstring", "A widget."), ("comment", "draw it"), ("string_literal", "widget name"),
+    }
+
+    rust_source = b'//! Geometry.\nfn origin() { panic!("not implemented yet"); }\n'
+    _, texts = indexer.EXTRACTORS["rust"](rust_source, "g.rs")
+    assert {(t.element_type, t.content) for t in texts} == {
+        ("docstring", "Geometry."), ("string_literal", "not implemented yet"),
+    }
+
+
+def test_extract_file_mmap_matches_read():
+    """Memory-mapped and read paths produce the same hash and symbols."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "big.py"
+        padding = b"# padding\n" * (indexer.MMAP_THRESHOLD // 10 + 1)
+        path.write_bytes(padding + PYTHON_SOURCE)
+        size = path.stat().st_size
+        assert size >= indexer.MMAP_THRESHOLD
+
+        mapped_hash, mapped, _ = indexer.extract_file(path, "big.py", "python", size)
+        read_hash, read, _ = indexer.extract_file(path, "big.py", "python", 0)
+        assert mapped_hash == read_hash == hashlib.sha256(path.read_bytes()).hexdigest()
+        assert [s.to_tuple() for s in mapped] == [s.to_tuple() for s in read]
+
+
+def test_known_hash_skips_parse():
+    """A touched but unchanged file is not re-parsed and keeps its cached symbols."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "app.py").write_bytes(PYTHON_SOURCE)
+        cache = indexer.SymbolCache(root / "cache.db")
+        [source] = indexer.discover_source_files(root)
+
+        symbols, was_cached = indexer.extract_with_cache(source, cache)
+        assert not was_cached and symbols
+        content_hash = cache.known_hash("app.py")
+        assert indexer.extract_file(source.path, "app.py", "python", source.size, content_hash) == (content_hash, None, None)
+
+        os.utime(source.path, ns=(source.mtime_ns + 10**9, source.mtime_ns + 10**9))
+        [touched] = indexer.discover_source_files(root)
+        assert touched.fingerprint != source.fingerprint
+        symbols_again, was_cached = indexer.extract_with_cache(touched, cache)
+        assert was_cached and symbols_again == symbols
+        assert cache.files["app.py"].fingerprint == touched.fingerprint
+
+        # The refreshed fingerprint makes the next check a pure stat comparison
+        assert cache.get_symbols(touched) == (symbols, True)
+
+
+def make_cpp_source(count: int) -> bytes:
+    """A header with an include guard, a namespace, doc comments, classes and free functions."""
+    parts = [b"#ifndef SHAPES_H\n#define SHAPES_H\n// Shapes.\nnamespace shapes {\n"]
+    for n in range(count):
+        parts.append(
+            b"/// Shape %d.\n// Not final.\nclass Shape%d {\npublic:\n    /// Area.\n    double area() const;\n"
+            b"    const char* name = \"shape number %d\";\n};\n\n/// Scale %d.\nint scale%d(int x) { return x * %d; }\n\n"
+            % ((n,) * 6))
+    parts.append(b"}  // namespace shapes\n#endif\n")
+    return b"".join(parts)
+
+
+def make_rust_source(count: int) -> bytes:
+    """A module with doc comments, structs, impl blocks and free functions."""
+    parts = [b"//! Shapes.\nmod shapes {\n"]
+    for n in range(count):
+        parts.append(
+            b"/// Shape %d.\n#[derive(Debug)]\npub struct Shape%d { x: i32 }\n\nimpl Shape%d {\n"
+            b"    /// Area.\n    pub fn area(&self) -> i32 { self.x * %d }\n}\n\n"
+            b"// Helper.\n/// Scale %d.\nfn scale%d(x: i32) -> i32 { println!(\"scaling by %d\"); x }\n\n"
+            % ((n,) * 7))
+    parts.append(b"}\n")
+    return b"".join(parts)
+
+
+EDIT_SNIPPETS = [b"\n", b"}", b"{", b"/// Doc.\n", b"// note\n", b"//", b"\"", b" ", b"x",
+                 b"fn extra() {}\n", b"class Extra { void f(); };\n", b"impl Extra { fn g(&self) {} }\n"]
+
+
+def test_incremental_reparse_matches_full_parse():
+    """After any sequence of edits, reparsing from the previous tree gives a fresh parse's results."""
+    rng = random.Random(16)
+    try:
+        for language, source in [("cpp", make_cpp_source(12)), ("rust", make_rust_source(12))]:
+            extract = indexer.EXTRACTORS[language]
+            indexer.enable_tree_cache()
+            extract(source, "shapes")
+            for step in range(150):
+                edited = bytearray(source)
+                start = rng.randrange(len(edited) + 1)
+                end = min(len(edited), start + rng.choice([0, 0, 1, 5, 40]))
+                edited[start:end] = rng.choice(EDIT_SNIPPETS) if rng.random() < 0.8 else b""
+                if step % 10 == 9:
+                    edited = bytearray(make_rust_source(12) if language == "rust" else make_cpp_source(12))
+                source = bytes(edited)
+
+                incremental = extract(source, "shapes")
+                cache, indexer._tree_cache = indexer._tree_cache, None
+                try:
+                    assert incremental == extract(source, "shapes"), f"{language} step {step}"
+                finally:
+                    indexer._tree_cache = cache
+    finally:
+        indexer._tree_cache = None
+
+
+def test_incremental_reparse_reuses_unchanged_units():
+    """A one-line edit walks only the declaration it's in; later declarations move down a line."""
+    walked = []
+    walk_rust = indexer._walk_rust
+
+    def counting_walk(node, *args):
+        walked.append(node.type)
+        walk_rust(node, *args)
+
+    source = make_rust_source(20)
+    edited = source.replace(b"self.x * 10 }", b"self.x * 10\n    }")
+    indexer.enable_tree_cache()
+    indexer._walk_rust = counting_walk
+    try:
+        indexer.EXTRACTORS["rust"](source, "shapes.rs")
+        walked.clear()
+        symbols, texts = indexer.EXTRACTORS["rust"](edited, "shapes.rs")
+    finally:
+        indexer._walk_rust = walk_rust
+        indexer._tree_cache = None
+    assert walked == ["impl_item"]
+    assert symbols == indexer.EXTRACTORS["rust"](edited, "shapes.rs")[0]
+    scale_19 = next(s for s in symbols if s.name == "scale19")
+    assert edited.count(b"\n", 0, edited.index(b"fn scale19")) + 1 == scale_19.line_number
+
+
+def test_tree_cache_is_bounded_by_source_size():
+    """The least recently used trees are dropped once the cached source passes the limit."""
+    cache = indexer.TreeCache(max_bytes=100)
+    parser = indexer.get_rust_parser()
+    for name in ("a", "b", "c"):
+        source = (b"fn %s() {}" % name.encode()).ljust(40)
+        cache.put(name, indexer.ParsedFile(source, parser.parse(source), {}))
+    assert cache.total_bytes == 80 and cache.take("a") is None
+    assert cache.take("b") is not None and cache.total_bytes == 40
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_extractors_take_bytes,
+        test_text_elements,
+        test_extract_file_mmap_matches_read,
+        test_known_hash_skips_parse,
+        test_incremental_reparse_matches_full_parse,
+        test_incremental_reparse_reuses_unchanged_units,
+        test_tree_cache_is_bounded_by_source_size,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test the warm indexer worker (generate-repo-map.py --worker)."""
+
+import json
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+TEST_CODEBASE = Path(__file__).parent / "test_codebase"
+
+
+def symbol_names(root: Path) -> set[str]:
+    conn = sqlite3.connect(root / ".claude" / "repo-map.db")
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM symbols")}
+    finally:
+        conn.close()
+
+
+def test_worker_runs_jobs_until_end_of_input():
+    """Each job line gets one reply line; edits between jobs are picked up and a failed job doesn't end the worker."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        shutil.copytree(TEST_CODEBASE, root, ignore=shutil.ignore_patterns(".claude", "__pycache__"))
+        worker = subprocess.Popen([sys.executable, str(SCRIPT), "--worker"],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+        def run_job(job_root: Path, **job) -> dict:
+            worker.stdin.write(json.dumps({"root": str(job_root), **job}) + "\n")
+            worker.stdin.flush()
+            return json.loads(worker.stdout.readline())
+
+        try:
+            reply = run_job(root)
+            assert reply["status"] == "complete", reply
+            assert "Cache: 0 cached, 3 parsed" in reply["output"]
+            assert "setup_model" in symbol_names(root)
+
+            with open(root / "utils.py", "a") as f:
+                f.write("\n\ndef added_while_warm():\n    pass\n")
+            reply = run_job(root)
+            assert reply["status"] == "complete", reply
+            assert "Cache: 2 cached, 1 parsed" in reply["output"]
+            assert "added_while_warm" in symbol_names(root)
+
+            # Given the changed paths, only those are looked at
+            (root / "utils.py").rename(root / "helpers.py")
+            (root / "new").mkdir()
+            (root / "new" / "extra.py").write_text("def in_new_directory():\n    pass\n")
+            reply = run_job(root, paths=["utils.py", "helpers.py", "new"])
+            assert reply["status"] == "complete", reply
+            assert "Cache: 2 cached, 2 parsed" in reply["output"]
+            names = symbol_names(root)
+            assert "added_while_warm" in names and "in_new_directory" in names
+
+            # Given files, just those are reindexed and the global passes skipped
+            repo_map_mtime = (root / ".claude" / "repo-map.md").stat().st_mtime_ns
+            with open(root / "helpers.py", "a") as f:
+                f.write("\n\ndef added_by_files_job():\n    pass\n")
+            (root / "new" / "extra.py").unlink()
+            reply = run_job(root, files=["helpers.py", "new"])
+            assert reply["status"] == "complete", reply
+            assert "Files: 1 reindexed (1 parsed)" in reply["output"]
+            assert "Database: 1 files written, 1 removed" in reply["output"]
+            names = symbol_names(root)
+            assert "added_by_files_job" in names and "in_new_directory" not in names
+            assert (root / ".claude" / "repo-map.md").stat().st_mtime_ns == repo_map_mtime
+            reply = run_job(root, files=["../elsewhere.py"])
+            assert reply["status"] == "failed" and "is outside" in reply["error"], reply
+
+            reply = run_job(root / "missing")
+            assert reply["status"] == "failed" and "No such directory" in reply["error"], reply
+            assert not (root / "missing").exists()
+
+            assert run_job(root)["status"] == "complete"
+        finally:
+            worker.stdin.close()
+            assert worker.wait(timeout=30) == 0
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_worker_runs_jobs_until_end_of_input,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
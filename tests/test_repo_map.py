@@ -0,0 +1,128 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test the streaming, per-file cached repo-map.md renderer in generate-repo-map.py."""
+
+import importlib.util
+import io
+import tempfile
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def symbol(name: str, kind: str, file_path: str, line: int, docstring: str | None = None, parent: str | None = None):
+    return indexer.Symbol(name, kind, f"{name}()", docstring, file_path, line, parent=parent)
+
+
+def test_file_sections_group_methods_under_classes():
+    """Methods follow their class in line order, whatever order they're read in; private ones are left out."""
+    symbols = [
+        symbol("Reader", "class", "a.py", 1, "Reads things."),
+        symbol("read", "method", "a.py", 2, "Read one.", parent="Reader"),
+        symbol("Writer", "class", "a.py", 10),
+        symbol("close", "method", "a.py", 11, parent="Reader"),  # Same name as Writer.close
+        symbol("_flush", "method", "a.py", 12, parent="Writer"),
+        symbol("close", "method", "a.py", 13, parent="Writer"),
+        symbol("open_file", "function", "a.py", 20, "Open a file."),
+        symbol("_helper", "function", "a.py", 30),
+    ]
+    assert indexer.render_file_section("a.py", symbols) == (
+        "### a.py\n\n"
+        "**class Reader()**\n  Reads things.\n  - read()\n      Read one.\n  - close() ❌\n\n"
+        "**class Writer()** ❌\n  - close() ❌\n\n"
+        "**open_file()**\n  Open a file.\n\n"
+    )
+    assert indexer.render_file_section("b.py", [symbol("_main", "function", "b.py", 1)]) == "### b.py\n\n"
+    assert indexer.render_file_section("c.py", []) == ""
+
+
+def test_sections_are_cached_per_file():
+    """Only updated files are re-rendered; the map concatenates the stored sections in path order."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "cache.db"
+        cache = indexer.SymbolCache(cache_path)
+        cache.update("b.py", (1, 1, 1, 1), "h1", [symbol("beta", "function", "b.py", 1, "Beta.")])
+        cache.update("a.py", (2, 2, 2, 2), "h2", [symbol("alpha", "function", "a.py", 1)])
+        cache.update("empty.py", (3, 3, 3, 3), "h3", [])
+        cache.close()
+
+        cache = indexer.SymbolCache(cache_path)
+        cache.update("b.py", (1, 2, 1, 2), "h4", [symbol("gamma", "function", "b.py", 5)])
+        out = io.StringIO()
+        coverage = {kind: {"total": 0, "documented": 0, "undocumented": []}
+                    for kind in ("classes", "functions", "methods")}
+        indexer.write_repo_map(out, cache.sections(), [], [], coverage, Path("/repo"), 2)
+        cache.close()
+        assert out.getvalue().endswith(
+            "## Code Structure\n\n"
+            "### a.py\n\n**alpha()** ❌\n\n"
+            "### b.py\n\n**gamma()** ❌\n\n"
+        ), out.getvalue()
+
+
+def test_documentation_coverage_is_summed_from_cache():
+    """Private functions and methods don't count; only the first few undocumented symbols are kept and listed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = indexer.SymbolCache(Path(tmp) / "cache.db")
+        for n in range(5):
+            path = f"m{n}.py"
+            cache.update(path, (n, n, n, n), f"h{n}", [symbol(f"fn{n}_{i}", "function", path, i) for i in range(1, 6)]
+                         + [symbol("_private", "function", path, 30), symbol("Documented", "class", path, 40, "Doc.")])
+        coverage = cache.documentation_coverage()
+        cache.close()
+    assert (coverage["functions"]["total"], coverage["functions"]["documented"]) == (25, 0)
+    assert (coverage["classes"]["total"], coverage["classes"]["documented"]) == (5, 5)
+    assert [s.location for s in coverage["functions"]["undocumented"]] == [
+        f"m{n}.py:{i}" for n in range(2) for i in range(1, 6)
+    ]
+
+    out = io.StringIO()
+    indexer.write_repo_map(out, [], [], [], coverage, Path("/repo"), 35)
+    text = out.getvalue()
+    assert "- **Classes**: 5/5 (100% documented)\n- **Functions**: 0/25 (0% documented)\n\n" in text
+    assert "**Undocumented functions:**\n- fn0_1 (m0.py:1)\n" in text
+    assert "- fn1_5 (m1.py:5)\n- ... and 15 more\n\n" in text
+    assert "Undocumented classes" not in text
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_file_sections_group_methods_under_classes,
+        test_sections_are_cached_per_file,
+        test_documentation_coverage_is_summed_from_cache,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
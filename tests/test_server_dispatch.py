@@ -0,0 +1,248 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "mcp>=1.0.0",
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test the MCP server end to end, over stdio: tool dispatch and symbol search."""
+
+import json
+import queue
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+SERVER = Path(__file__).parent.parent / "servers" / "repo-map-server.py"
+TEST_CODEBASE = Path(__file__).parent / "test_codebase"
+
+
+class ServerClient:
+    """Minimal MCP client speaking newline-delimited JSON-RPC to the server over stdio."""
+
+    def __init__(self, root: Path):
+        self.proc = subprocess.Popen([sys.executable, str(SERVER)], cwd=root,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     text=True, bufsize=1)
+        self.replies: queue.Queue = queue.Queue()
+        self.next_id = 0
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        self.request("initialize", {"protocolVersion": "2025-06-18", "capabilities": {},
+                                    "clientInfo": {"name": "test", "version": "0"}})
+        self.wait(0)
+        self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            message = json.loads(line)
+            if "id" in message:
+                self.replies.put((message["id"], time.perf_counter(), message))
+
+    def _send(self, message: dict):
+        self.proc.stdin.write(json.dumps(message) + "\n")
+        self.proc.stdin.flush()
+
+    def request(self, method: str, params: dict) -> int:
+        request_id = self.next_id
+        self.next_id += 1
+        self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        return request_id
+
+    def call_tool(self, name: str, arguments: dict) -> int:
+        return self.request("tools/call", {"name": name, "arguments": arguments})
+
+    def wait(self, request_id: int, pending: dict | None = None, timeout: float = 60) -> tuple[float, dict]:
+        """(arrival time, reply) for request_id; other replies read meanwhile go into pending."""
+        pending = {} if pending is None else pending
+        deadline = time.monotonic() + timeout
+        while request_id not in pending:
+            reply_id, arrived, message = self.replies.get(timeout=max(0.0, deadline - time.monotonic()))
+            pending[reply_id] = (arrived, message)
+        return pending.pop(request_id)
+
+    def close(self):
+        self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def test_tool_latency_stays_flat_during_staleness_scan():
+    """search_symbols keeps answering in milliseconds while repo_map_status walks a large tree."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        shutil.copytree(TEST_CODEBASE, root, ignore=shutil.ignore_patterns(".claude", "__pycache__"))
+        for n in range(20000):
+            directory = root / f"pkg{n // 1000}" / f"sub{n // 50}"
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"mod{n}.py").write_text("")
+        (root / ".claude" / "logs").mkdir(parents=True)  # The server's log directory, as if it had indexed
+        subprocess.run([sys.executable, str(SCRIPT), str(root)], check=True, stdout=subprocess.DEVNULL)
+
+        client = ServerClient(root)
+        try:
+            search = {"pattern": "setup_*"}
+            idle = []
+            for _ in range(5):
+                sent = time.perf_counter()
+                arrived, reply = client.wait(client.call_tool("search_symbols", search))
+                assert "setup_model" in reply["result"]["content"][0]["text"], reply
+                idle.append(arrived - sent)
+
+            # Searches sent one after another while the status call's staleness scan runs
+            pending = {}
+            scan_started = time.perf_counter()
+            status_id = client.call_tool("repo_map_status", {})
+            during = []
+            while status_id not in pending:
+                sent = time.perf_counter()
+                arrived, reply = client.wait(client.call_tool("search_symbols", search), pending)
+                assert "setup_model" in reply["result"]["content"][0]["text"], reply
+                during.append(arrived - sent)
+            scan_finished, status = client.wait(status_id, pending)
+            scan_seconds = scan_finished - scan_started
+            assert json.loads(status["result"]["content"][0]["text"])["is_stale"] is False, status
+
+            # Blocking the event loop, the first search would wait out the whole scan
+            assert len(during) >= 3, (len(during), scan_seconds)
+            assert max(during) < scan_seconds / 2, (max(during), scan_seconds)
+            assert sorted(during)[len(during) // 2] < max(10 * max(idle), 0.05), (during, idle)
+        finally:
+            client.close()
+
+
+def test_search_symbols_matches_before_limit():
+    """Globs match names exactly, qualified names when they have a ".", and no match is lost to the limit, however common."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        root.mkdir()
+        (root / "handlers.py").write_text(
+            "".join(f"def Handle_{i:02}():\n    pass\n\n" for i in range(30))
+            + "def handle_click():\n    pass\n\ndef handle_key():\n    pass\n\n"
+            + "class Widget:\n    def handle_resize(self):\n        pass\n")
+        (root / ".claude" / "logs").mkdir(parents=True)
+        subprocess.run([sys.executable, str(SCRIPT), str(root)], check=True, stdout=subprocess.DEVNULL)
+        # More symbols sharing text than the trigram index hands out (walked in name order instead),
+        # added directly: similarity detection on this many near-identical names takes a while
+        conn = sqlite3.connect(root / ".claude" / "repo-map.db")
+        for i in range(2100):
+            symbol_id = conn.execute("INSERT INTO symbols (name, kind, file_path, line_number) VALUES (?, 'function', 'widgets.py', ?)",
+                                     [f"on_widget_{i:04}", i + 1]).lastrowid
+            conn.execute("INSERT INTO symbol_names_fts (rowid, name, qualified) VALUES (?, ?, ?)",
+                         [symbol_id, f"on_widget_{i:04}", f"on_widget_{i:04}"])
+        conn.commit()
+        conn.close()
+
+        client = ServerClient(root)
+        try:
+            def search(pattern: str, **arguments) -> list[str]:
+                _, reply = client.wait(client.call_tool("search_symbols", {"pattern": pattern, **arguments}))
+                text = reply["result"]["content"][0]["text"]
+                return [line.split("**")[1] for line in text.splitlines() if line.startswith("- **")]
+
+            # The 30 Handle_ names sort first and match handle_* ignoring case
+            assert search("handle_*", limit=3) == ["handle_click", "handle_key", "Widget.handle_resize"]
+            assert search("*dle_k*", limit=1) == ["handle_key"]
+            assert search("Widget.*") == ["Widget.handle_resize"]
+            assert search("handle_[ck]*", kind="function") == ["handle_click", "handle_key"]
+            assert search("HANDLE_KEY") == ["handle_key"]  # Matches ignoring case when nothing matches exactly
+            assert search("*xyz*") == []
+            assert search("*widget_*", limit=2) == ["on_widget_0000", "on_widget_0001"]
+            assert search("*WIDGET_*2", limit=2) == ["on_widget_0002", "on_widget_0012"]
+        finally:
+            client.close()
+
+
+def test_search_symbols_fuzzy_ranks_closest_names():
+    """Fuzzy search ranks names by their words, tolerating typos and abbreviations; a glob with no match falls back to it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        root.mkdir()
+        (root / "app.py").write_text(
+            "class UserManager:\n    def load_user(self):\n        pass\n\n"
+            "def parse_config():\n    pass\n\ndef parse_config_file():\n    pass\n\n"
+            "def render_template():\n    pass\n\nclass ConfigParser:\n    pass\n")
+        (root / ".claude" / "logs").mkdir(parents=True)
+        subprocess.run([sys.executable, str(SCRIPT), str(root)], check=True, stdout=subprocess.DEVNULL)
+
+        client = ServerClient(root)
+        try:
+            def search(pattern: str, **arguments) -> tuple[str, list[str]]:
+                _, reply = client.wait(client.call_tool("search_symbols", {"pattern": pattern, **arguments}))
+                text = reply["result"]["content"][0]["text"]
+                return text.splitlines()[0], [line.split("**")[1] for line in text.splitlines() if line.startswith("- **")]
+
+            assert search("parse_cfg", fuzzy=True)[1][:3] == ["parse_config", "parse_config_file", "ConfigParser"]
+            assert search("UserMgr", fuzzy=True)[1][0] == "UserManager"
+            assert search("confg parser", fuzzy=True)[1][0] == "ConfigParser"
+            assert search("laod_user", fuzzy=True)[1][0] == "UserManager.load_user"
+            assert search("parse_config", fuzzy=True, kind="class")[1] == ["ConfigParser"]
+
+            heading, names = search("render_tempalte*")
+            assert "closest" in heading and names == ["render_template"], (heading, names)
+            heading, names = search("render_*")
+            assert "closest" not in heading and names == ["render_template"], (heading, names)
+            assert search("xyzzy", fuzzy=True)[1] == []
+        finally:
+            client.close()
+
+
+def test_symbol_content_follows_file_edits():
+    """get_symbol_content shows an edited body straight away, before any reindex, though results are cached."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        root.mkdir()
+        (root / "app.py").write_text("def answer():\n    return 41\n")
+        (root / ".claude" / "logs").mkdir(parents=True)
+        subprocess.run([sys.executable, str(SCRIPT), str(root)], check=True, stdout=subprocess.DEVNULL)
+
+        client = ServerClient(root)
+        try:
+            def content() -> str:
+                _, reply = client.wait(client.call_tool("get_symbol_content", {"name": "answer"}))
+                return reply["result"]["content"][0]["text"]
+
+            assert "return 41" in content()
+            assert "return 41" in content()
+            (root / "app.py").write_text("def answer():\n    return 42\n")
+            assert "return 42" in content()
+            (root / "app.py").unlink()
+            assert "File not found" in content()
+        finally:
+            client.close()
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_tool_latency_stays_flat_during_staleness_scan,
+        test_search_symbols_matches_before_limit,
+        test_search_symbols_fuzzy_ranks_closest_names,
+        test_symbol_content_follows_file_edits,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
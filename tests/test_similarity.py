@@ -0,0 +1,180 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test candidate-based similar class/function detection in generate-repo-map.py."""
+
+import importlib.util
+import random
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def function(name: str, file_path: str, docstring: str | None = None, line: int = 1):
+    return indexer.Symbol(name, "function", f"{name}()", docstring, file_path, line)
+
+
+def test_overlapping_partners_matches_brute_force():
+    """Prefix filtering reports exactly the pairs at or above the Jaccard threshold, each once, all or just the probes'."""
+    rng = random.Random(7)
+    token_sets = [set(rng.sample("abcdefghijklmnop", rng.randint(0, 10))) for _ in range(300)]
+
+    def overlapping_pairs(min_overlap: float, probes: set[int] | None = None) -> set[tuple[int, int]]:
+        found = [(min(i, j), max(i, j))
+                 for i, partners in indexer.overlapping_partners(token_sets, min_overlap, probes) for j in partners]
+        assert len(found) == len(set(found)), "a pair was reported twice"
+        return set(found)
+
+    for min_overlap in (0.15, 0.3, 0.4, 0.8):
+        expected = {
+            (i, j)
+            for i in range(len(token_sets)) for j in range(i + 1, len(token_sets))
+            if token_sets[i] and len(token_sets[i] & token_sets[j]) / len(token_sets[i] | token_sets[j]) >= min_overlap
+        }
+        assert overlapping_pairs(min_overlap) == expected, min_overlap
+        probes = set(range(0, len(token_sets), 7))
+        assert overlapping_pairs(min_overlap, probes) == {
+            pair for pair in expected if probes.intersection(pair)
+        }, min_overlap
+
+
+def test_similar_functions():
+    """Near-duplicates across files are reported in scan order; same-file and cross-language pairs are not."""
+    doc = "Load the user configuration from disk and validate it."
+    symbols = [
+        function("load_user_config", "a.py", doc),
+        function("render_template", "a.py", line=9),
+        function("load_user_configs", "a.py", line=20),  # Same file as load_user_config
+        function("load_user_config", "b.py"),
+        function("read_settings", "c.py", doc.replace("disk", "the network")),
+        function("load_user_config", "lib.rs"),  # Bindings in another language
+        function("_load_user_config", "d.py"),  # Private
+    ]
+    similar = indexer.find_similar_functions(symbols)
+    assert [(a.location, b.location, reason) for a, b, reason in similar] == [
+        ("a.py:1", "b.py:1", "similar names (100%)"),
+        ("a.py:1", "c.py:1", "similar docstrings (89%)"),
+        ("a.py:20", "b.py:1", "similar names (97%)"),
+    ]
+
+
+def test_exact_candidates_keep_pairs_sharing_few_ngrams():
+    """Transposed letters share no trigram: only the ngram filter drops the pair."""
+    symbols = [function("unzip", "a.py"), function("unizp", "b.py")]
+    exact = indexer.find_similar_functions(symbols)
+    assert [(a.location, b.location, reason) for a, b, reason in exact] == [("a.py:1", "b.py:1", "similar names (80%)")]
+    assert indexer.find_similar_functions(symbols, candidates="ngram") == []
+
+
+def test_tfidf_matches_dense_cosine():
+    """The blocked sparse TF-IDF product finds the same pairs and scores as a dense one."""
+    np = indexer.np
+    if np is None:
+        raise unittest.SkipTest("NumPy not installed")
+    rng = random.Random(3)
+    words = "parse load the config file from disk and return a dict of user settings values".split()
+    texts = [" ".join(rng.sample(words, rng.randint(3, 8))) for _ in range(200)]
+    texts = list(dict.fromkeys(texts))
+
+    grams = [Counter(f"^{t}$".encode()[i:i + 5] for i in range(len(t) - 2)) for t in texts]
+    vocabulary = sorted(set().union(*grams))
+    counts = np.array([[g[v] for v in vocabulary] for g in grams], dtype=float)
+    vectors = counts * (np.log((1 + len(texts)) / (1 + (counts > 0).sum(axis=0))) + 1)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosine = vectors @ vectors.T
+    expected = {(i, j): cosine[i, j] for i in range(len(texts)) for j in range(i + 1, len(texts)) if cosine[i, j] >= 0.4}
+
+    block_size, work = indexer.TFIDF_BLOCK_SIZE, indexer.TFIDF_WORK_PER_TEXT
+    indexer.TFIDF_BLOCK_SIZE, indexer.TFIDF_WORK_PER_TEXT = 500, len(texts) ** 2  # Many blocks, no stop n-grams
+    try:
+        pairs = indexer.tfidf_similar_pairs(texts, 0.4, 5)
+        probes = set(range(0, len(texts), 5))
+        probed = indexer.tfidf_similar_pairs(texts, 0.4, 5, probes)
+    finally:
+        indexer.TFIDF_BLOCK_SIZE, indexer.TFIDF_WORK_PER_TEXT = block_size, work
+    assert pairs.keys() == expected.keys()
+    assert all(abs(pairs[pair] - min(expected[pair], 1.0)) < 1e-9 for pair in pairs)
+    assert probed.keys() == {pair for pair in expected if probes.intersection(pair)}
+
+
+def test_similar_pairs_are_updated_incrementally():
+    """Only changed files are rescanned; the stored pairs always match a full scan."""
+    def files(tree: dict[str, list[str]]) -> dict:
+        return {path: indexer.FileCache(fingerprint=(1, 1, 1, 1), content_hash=str(names),
+                                        symbols=[function(name, path, line=i + 1) for i, name in enumerate(names)])
+                for path, names in tree.items()}
+
+    def stored(db_path: Path) -> list[tuple]:
+        return [(a.location, b.location, reason) for a, b, reason in indexer.read_similar_pairs(db_path, "function")]
+
+    def full_scan(tree: dict[str, list[str]]) -> list[tuple]:
+        symbols = [s for entry in files(tree).values() for s in entry.symbols]
+        return [(a.location, b.location, reason) for a, b, reason in indexer.find_similar_functions(symbols)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        tree = {"a.py": ["load_user_config"], "b.py": ["load_user_configs"], "c.py": ["render_template"]}
+        indexer.write_symbols_to_sqlite(files(tree), db_path)
+        assert indexer.update_similar_pairs(db_path) == 3
+        assert stored(db_path) == full_scan(tree) == [("a.py:1", "b.py:1", "similar names (97%)")]
+        assert indexer.update_similar_pairs(db_path) == 0  # Nothing changed
+
+        tree["c.py"] = ["render_template", "load_user_config2"]
+        indexer.write_symbols_to_sqlite(files(tree), db_path)
+        assert indexer.update_similar_pairs(db_path) == 1
+        assert stored(db_path) == full_scan(tree) and len(stored(db_path)) == 3
+
+        del tree["b.py"]
+        indexer.write_symbols_to_sqlite(files(tree), db_path)
+        indexer.update_similar_pairs(db_path)
+        assert stored(db_path) == full_scan(tree) == [("a.py:1", "c.py:2", "similar names (97%)")]
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_overlapping_partners_matches_brute_force,
+        test_similar_functions,
+        test_exact_candidates_keep_pairs_sharing_few_ngrams,
+        test_tfidf_matches_dense_cosine,
+        test_similar_pairs_are_updated_incrementally,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except unittest.SkipTest as e:
+            print(f"⏭️  SKIP: {test.__name__}: {e}")
+            skipped += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,258 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test incremental per-file database writes in generate-repo-map.py."""
+
+import importlib.util
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def entry(rel_path: str, content_hash: str, names: list[str], mtime_ns: int = 1):
+    """Build a cache entry with one function symbol per name."""
+    symbols = [indexer.Symbol(name, "function", f"{name}()", None, rel_path, i + 1) for i, name in enumerate(names)]
+    return indexer.FileCache(fingerprint=(10, mtime_ns, 1, mtime_ns), content_hash=content_hash, symbols=symbols)
+
+
+def rows(db_path: Path, sql: str) -> list[tuple]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_only_changed_files_are_rewritten():
+    """Unchanged files keep their rows; changed, added and removed files are synced."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        files = {"a.py": entry("a.py", "h1", ["alpha"]), "b.py": entry("b.py", "h2", ["beta", "gamma"])}
+        assert indexer.write_symbols_to_sqlite(files, db_path) == (2, 0)
+        assert len(rows(db_path, "SELECT id FROM symbols WHERE file_path = 'b.py'")) == 2
+
+        files["b.py"] = entry("b.py", "h3", ["beta2"])
+        files["c.py"] = entry("c.py", "h4", ["delta"])
+        del files["a.py"]
+        assert indexer.write_symbols_to_sqlite(files, db_path) == (2, 1)
+        assert sorted(r[0] for r in rows(db_path, "SELECT name FROM symbols")) == ["beta2", "delta"]
+        assert rows(db_path, "SELECT path, generation FROM files ORDER BY path") == [("b.py", 2), ("c.py", 2)]
+
+        # Nothing changed: no rows written, generation stays put
+        delta_id = rows(db_path, "SELECT id FROM symbols WHERE name = 'delta'")
+        assert indexer.write_symbols_to_sqlite(files, db_path) == (0, 0)
+        assert rows(db_path, "SELECT id FROM symbols WHERE name = 'delta'") == delta_id
+        assert rows(db_path, "SELECT value FROM metadata WHERE key = 'generation'") == [("2",)]
+
+
+def test_touched_file_updates_fingerprint_only():
+    """Same content with a new fingerprint refreshes the files row without rewriting symbols."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        files = {"a.py": entry("a.py", "h1", ["alpha"])}
+        indexer.write_symbols_to_sqlite(files, db_path)
+        symbol_ids = rows(db_path, "SELECT id FROM symbols")
+
+        files["a.py"] = entry("a.py", "h1", ["alpha"], mtime_ns=5)
+        assert indexer.write_symbols_to_sqlite(files, db_path) == (0, 0)
+        assert rows(db_path, "SELECT mtime_ns, generation FROM files") == [(5, 1)]
+        assert rows(db_path, "SELECT id FROM symbols") == symbol_ids
+
+
+def test_old_schema_is_rebuilt():
+    """A database from an older DB_VERSION is rebuilt rather than duplicated into."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("INSERT INTO metadata VALUES ('db_version', '1')")
+        conn.execute("CREATE TABLE symbols (id INTEGER PRIMARY KEY, name TEXT NOT NULL, kind TEXT NOT NULL, "
+                     "signature TEXT, docstring TEXT, file_path TEXT NOT NULL, line_number INTEGER NOT NULL, "
+                     "end_line_number INTEGER, parent TEXT)")
+        conn.execute("INSERT INTO symbols (name, kind, file_path, line_number) VALUES ('alpha', 'function', 'a.py', 1)")
+        conn.commit()
+        conn.close()
+
+        indexer.write_symbols_to_sqlite({"a.py": entry("a.py", "h1", ["alpha"])}, db_path)
+        assert rows(db_path, "SELECT COUNT(*) FROM symbols") == [(1,)]
+        assert rows(db_path, "SELECT value FROM metadata WHERE key = 'db_version'") == [(str(indexer.DB_VERSION),)]
+
+
+def test_streaming_writer_commits_once():
+    """SymbolWriter rows are invisible until finish(); abort() rolls everything back."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        writer = indexer.SymbolWriter(db_path)
+        for i in range(indexer.WRITE_QUEUE_SIZE * 2):  # More files than the queue holds
+            rel_path = f"m{i:03}.py"
+            writer.submit(rel_path, (1, 1, 1, 1), f"h{i}", entry(rel_path, "", ["zeta", "alpha"]).symbols)
+        assert writer.finish() == (indexer.WRITE_QUEUE_SIZE * 2, 0)
+
+        symbols = list(indexer.read_symbols(db_path))
+        assert len(symbols) == indexer.count_symbols(db_path) == indexer.WRITE_QUEUE_SIZE * 4
+        assert [(s.file_path, s.name) for s in symbols[:2]] == [("m000.py", "zeta"), ("m000.py", "alpha")]
+        assert [s.file_path for s in symbols] == sorted(s.file_path for s in symbols)
+
+        writer = indexer.SymbolWriter(db_path)
+        writer.submit("m000.py", (1, 1, 1, 1), "changed", [])
+        writer.abort()
+        assert indexer.count_symbols(db_path) == indexer.WRITE_QUEUE_SIZE * 4
+
+
+def test_failed_commit_is_raised_by_finish():
+    """An error after the finish message (here the commit) is raised by finish() instead of hanging it."""
+    class FullDiskConnection(sqlite3.Connection):
+        def commit(self):
+            raise sqlite3.OperationalError("database or disk is full")
+
+    def connect(*args, **kwargs):
+        if threading.current_thread().name == "symbol-writer":
+            kwargs["factory"] = FullDiskConnection
+        return real_connect(*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        indexer.write_symbols_to_sqlite({"a.py": entry("a.py", "h1", ["kept"])}, db_path)
+        real_connect = sqlite3.connect
+        sqlite3.connect = connect
+        try:
+            writer = indexer.SymbolWriter(db_path)
+            writer.submit("a.py", (1, 1, 1, 1), "h2", entry("a.py", "", ["lost"]).symbols)
+            outcome = []
+
+            def finish():
+                try:
+                    writer.finish()
+                except sqlite3.OperationalError as e:
+                    outcome.append(str(e))
+
+            finisher = threading.Thread(target=finish, daemon=True)
+            finisher.start()
+            finisher.join(timeout=10)
+            assert not finisher.is_alive(), "finish() hung"
+            assert outcome == ["database or disk is full"], outcome
+        finally:
+            sqlite3.connect = real_connect
+        assert rows(db_path, "SELECT name FROM symbols") == [("kept",)]
+
+
+def test_text_index_follows_file_changes():
+    """code_text_fts matches the current content of each file, via the code_text triggers."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+
+        def with_text(rel_path: str, content_hash: str, comment: str):
+            cached = entry(rel_path, content_hash, ["alpha"])
+            cached.texts = [indexer.TextElement(rel_path, 3, "comment", comment)]
+            return cached
+
+        def search(term: str) -> list[str]:
+            return [r[0] for r in rows(db_path, f"SELECT file_path FROM code_text_fts WHERE code_text_fts MATCH '{term}'")]
+
+        files = {"a.py": with_text("a.py", "h1", "retry the upload"), "b.py": with_text("b.py", "h2", "upload once")}
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert sorted(search("upload")) == ["a.py", "b.py"]
+
+        files["a.py"] = with_text("a.py", "h3", "give up immediately")
+        del files["b.py"]
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert search("upload") == []
+        assert search("immediately") == ["a.py"]
+        assert rows(db_path, "SELECT COUNT(*) FROM code_text") == [(1,)]
+
+
+def test_name_index_follows_file_changes():
+    """symbol_names_fts finds each current symbol by a substring of its name or qualified name."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+
+        def search(query: str) -> list[str]:
+            return sorted(r[0] for r in rows(db_path, f"""
+                SELECT name FROM symbols WHERE id IN
+                (SELECT rowid FROM symbol_names_fts WHERE symbol_names_fts MATCH '{query}')"""))
+
+        files = {"a.py": entry("a.py", "h1", ["load_config", "RequestHandler"]), "b.py": entry("b.py", "h2", ["reload"])}
+        files["b.py"].symbols[0].parent = "ConfigLoader"
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert search('name : "load"') == ["load_config", "reload"]
+        assert search('name : "handler"') == ["RequestHandler"]  # Trigrams ignore case
+        assert search('qualified : "loader.rel"') == ["reload"]
+        assert search('name : "loader"') == []
+
+        files["a.py"] = entry("a.py", "h3", ["save_config"])
+        del files["b.py"]
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert search('name : "load"') == []
+        assert search('name : "config"') == ["save_config"]
+        assert rows(db_path, "SELECT COUNT(*) FROM symbol_names_fts") == [(1,)]
+
+
+def test_token_index_follows_file_changes():
+    """Names are split into lowercase words, and words no symbol uses any more leave name_tokens and token_grams."""
+    assert indexer.split_identifier("parse_HTTPConfig2") == ["parse", "http", "config", "2"]
+    assert indexer.split_identifier("__init__") == ["init"]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "repo-map.db"
+        files = {"a.py": entry("a.py", "h1", ["load_config", "UserManager"]), "b.py": entry("b.py", "h2", ["loadUser"])}
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert sorted(rows(db_path, "SELECT s.name, t.token FROM symbols s JOIN symbol_tokens t ON t.symbol_id = s.id")) == [
+            ("UserManager", "manager"), ("UserManager", "user"), ("loadUser", "load"), ("loadUser", "user"),
+            ("load_config", "config"), ("load_config", "load")]
+        assert rows(db_path, "SELECT token FROM token_grams WHERE gram = 'r$' ORDER BY token") == [("manager",), ("user",)]
+
+        files["a.py"] = entry("a.py", "h3", ["save_config"])
+        del files["b.py"]
+        indexer.write_symbols_to_sqlite(files, db_path)
+        assert rows(db_path, "SELECT token FROM name_tokens ORDER BY token") == [("config",), ("save",)]
+        assert rows(db_path, "SELECT DISTINCT token FROM token_grams ORDER BY token") == [("config",), ("save",)]
+        assert rows(db_path, "SELECT COUNT(*) FROM symbol_tokens") == [(2,)]
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_only_changed_files_are_rewritten,
+        test_touched_file_updates_fingerprint_only,
+        test_old_schema_is_rebuilt,
+        test_streaming_writer_commits_once,
+        test_failed_commit_is_raised_by_finish,
+        test_text_index_follows_file_changes,
+        test_name_index_follows_file_changes,
+        test_token_index_follows_file_changes,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,138 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "tree-sitter>=0.23.0",
+#     "tree-sitter-cpp>=0.23.0",
+#     "tree-sitter-rust>=0.23.0",
+# ]
+# ///
+"""Test the SQLite-backed SymbolCache in generate-repo-map.py."""
+
+import importlib.util
+import sqlite3
+import tempfile
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "generate-repo-map.py"
+
+
+def load_indexer():
+    """Load generate-repo-map.py as a module (the file name isn't importable)."""
+    spec = importlib.util.spec_from_file_location("generate_repo_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indexer = load_indexer()
+
+
+def symbols_for(rel_path: str, *names: str) -> list:
+    return [indexer.Symbol(name, "function", f"{name}()", "Doc.", rel_path, i + 1, i + 2)
+            for i, name in enumerate(names)]
+
+
+def test_entries_persist_and_load_lazily():
+    """Reopened caches know fingerprints up front and read symbols on demand."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "cache.db"
+        cache = indexer.SymbolCache(cache_path)
+        cache.update("a.py", (1, 2, 3, 4), "h1", symbols_for("a.py", "alpha", "beta"))
+        cache.update("b.py", (5, 6, 7, 8), "h2", symbols_for("b.py", "gamma"))
+        cache.close()
+
+        cache = indexer.SymbolCache(cache_path)
+        assert cache.files["a.py"].fingerprint == (1, 2, 3, 4)
+        assert cache.files["a.py"].symbols is None  # Not loaded yet
+        assert cache.load_symbols("a.py") == symbols_for("a.py", "alpha", "beta")
+
+        cache.touch("b.py", (5, 9, 7, 9))
+        cache.remove("a.py")
+        cache.close()
+
+        cache = indexer.SymbolCache(cache_path)
+        assert set(cache.files) == {"b.py"}
+        assert cache.files["b.py"].fingerprint == (5, 9, 7, 9)
+        assert cache.load_symbols("b.py") == symbols_for("b.py", "gamma")
+        cache.close()
+
+
+def test_batched_writes_and_version_mismatch():
+    """Rows are flushed every SAVE_INTERVAL updates; another version starts empty."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "cache.db"
+        cache = indexer.SymbolCache(cache_path)
+        for i in range(cache.SAVE_INTERVAL - 1):
+            cache.update(f"f{i}.py", (i, i, i, i), f"h{i}", [])
+            cache.save_if_needed()
+
+        def rows_on_disk():
+            conn = sqlite3.connect(cache_path)
+            try:
+                return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            finally:
+                conn.close()
+
+        assert rows_on_disk() == 0
+        cache.update("last.py", (0, 0, 0, 0), "h", [])
+        cache.save_if_needed()
+        assert rows_on_disk() == cache.SAVE_INTERVAL
+        cache.close()
+
+        conn = sqlite3.connect(cache_path)
+        conn.execute("UPDATE meta SET value = '0' WHERE key = 'version'")
+        conn.commit()
+        conn.close()
+        assert indexer.SymbolCache(cache_path).files == {}
+
+
+def test_refresh_sees_other_writers():
+    """A warm cache reloads after another connection commits or the file is replaced, and only then."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "cache.db"
+        warm = indexer.SymbolCache(cache_path)
+        warm.update("a.py", (1, 1, 1, 1), "h1", symbols_for("a.py", "alpha"))
+        warm.refresh()  # Saves; nobody else wrote
+        assert set(warm.files) == {"a.py"}
+
+        other = indexer.SymbolCache(cache_path)
+        other.update("b.py", (2, 2, 2, 2), "h2", symbols_for("b.py", "beta"))
+        other.close()
+        warm.refresh()
+        assert set(warm.files) == {"a.py", "b.py"}
+        assert warm.load_symbols("b.py") == symbols_for("b.py", "beta")
+
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{cache_path}{suffix}").unlink(missing_ok=True)
+        other = indexer.SymbolCache(cache_path)
+        other.update("c.py", (3, 3, 3, 3), "h3", symbols_for("c.py", "gamma"))
+        other.close()
+        warm.refresh()
+        assert set(warm.files) == {"c.py"}
+        warm.close()
+
+
+def run_all_tests():
+    """Run all test cases."""
+    tests = [
+        test_entries_persist_and_load_lazily,
+        test_batched_writes_and_version_mismatch,
+        test_refresh_sees_other_writers,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS: {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ FAIL: {test.__name__}: {e}")
+    print(f"\nTotal: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    import sys
+    success = run_all_tests()
+    sys.exit(0 if success else 1)